@@ -1,7 +1,10 @@
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import planning_poker.routing
+import planning_poker_jira.routing
 
 application = ProtocolTypeRouter({
-    'websocket': AuthMiddlewareStack(URLRouter(planning_poker.routing.websocket_urlpatterns)),
+    # `planning_poker`'s pattern matches any path which ends with a number, so it has to come last.
+    'websocket': AuthMiddlewareStack(URLRouter(planning_poker_jira.routing.websocket_urlpatterns +
+                                               planning_poker.routing.websocket_urlpatterns)),
 })
@@ -18,6 +18,13 @@ TEMPLATE_DIRS = (
 
 ASGI_APPLICATION = 'example.routing.application'
 
+# This is not the optimal channel layer and should not be used for production.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+    }
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
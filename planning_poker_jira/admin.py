@@ -1,11 +1,12 @@
-from typing import Dict, Iterable, List, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 from django.contrib import messages
 from django.contrib.admin import ModelAdmin, helpers, register
 from django.contrib.admin.templatetags.admin_urls import admin_urlname
 from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.template.response import TemplateResponse
 from django.urls import URLPattern, URLResolver, path, reverse
 from django.utils.html import format_html
@@ -15,9 +16,11 @@ from requests.exceptions import ConnectionError, RequestException
 
 from planning_poker.admin import StoryAdmin
 
+from .clients import search_cache
 from .forms import ExportStoryPointsForm, ImportStoriesForm, JiraConnectionForm
-from .models import JiraConnection
-from .utils import get_error_text
+from .jobs import enqueue, get_executor, submit, sync_saved_query
+from .models import BackgroundJob, ExportJob, ImportJob, JiraConnection, SavedQuery
+from .utils import combine_jql_queries, get_error_text, split_jql_queries
 
 
 def export_story_points(modeladmin: ModelAdmin, request: HttpRequest, queryset: QuerySet) -> Union[HttpResponse, None]:
@@ -26,38 +29,23 @@ def export_story_points(modeladmin: ModelAdmin, request: HttpRequest, queryset:
     :param modeladmin: The current ModelAdmin.
     :param request: The current HTTP request.
     :param queryset: Containing the set of stories selected by the user.
-    :return: A http response which either redirects back to the changelist view on success or renders a template with
-             the `ExportStoryPointsForm`.
+    :return: A http response which either redirects to the progress page of the started export job or renders a template
+             with the `ExportStoryPointsForm`.
     """
     submit_button_name = 'export'
     if submit_button_name in request.POST:
         form = ExportStoryPointsForm(request.POST)
         if form.is_valid():
-            jira_connection = form.cleaned_data['jira_connection']
-            error_message = _('"{story}" could not be exported. {reason}')
-            num_exported_stories = 0
-            for story in queryset:
-                try:
-                    jira_story = form.client.issue(id=story.ticket_number, fields='')
-                    jira_story.update(fields={jira_connection.story_points_field: story.story_points})
-                except (JIRAError, ConnectionError, RequestException) as e:
-                    modeladmin.message_user(
-                        request,
-                        error_message.format(
-                            story=story,
-                            reason=get_error_text(e, api_url=jira_connection.api_url, connection=jira_connection)
-                        ),
-                        messages.ERROR
-                    )
-                else:
-                    num_exported_stories += 1
-            if num_exported_stories:
-                modeladmin.message_user(request, ngettext_lazy(
-                    '%d story was successfully exported.',
-                    '%d stories were successfully exported.',
-                    num_exported_stories,
-                ) % num_exported_stories, messages.SUCCESS)
-            return None
+            stories = list(queryset)
+            job = ExportJob.objects.create(
+                connection=form.cleaned_data['jira_connection'],
+                username=form.cleaned_data['username'],
+                password=form.cleaned_data['password'],
+                num_stories=len(stories)
+            )
+            job.stories.set(stories)
+            enqueue(job)
+            return HttpResponseRedirect(reverse(admin_urlname(ExportJob._meta, 'progress'), args=[job.pk]))
     else:
         form = ExportStoryPointsForm()
     admin_form = helpers.AdminForm(
@@ -86,6 +74,32 @@ def export_story_points(modeladmin: ModelAdmin, request: HttpRequest, queryset:
     return TemplateResponse(request, 'admin/planning_poker/story/export_story_points.html', context)
 
 
+def load_descriptions(modeladmin: ModelAdmin, request: HttpRequest, queryset: QuerySet):
+    """Load the descriptions of the stories in the queryset which were imported without them.
+
+    :param modeladmin: The current ModelAdmin.
+    :param request: The current HTTP request.
+    :param queryset: Containing the set of stories selected by the user.
+    """
+    num_loaded = num_failed = 0
+    # The descriptions are loaded for each connection, so the errors can explain which jira backend failed.
+    for connection in JiraConnection.objects.filter(deferred_descriptions__story__in=queryset).distinct():
+        stories = queryset.filter(jira_deferred_description__connection=connection)
+        try:
+            num_loaded += connection.load_descriptions(stories)
+        except (JIRAError, ConnectionError, RequestException) as e:
+            num_failed += 1
+            modeladmin.message_user(request, _('The descriptions could not be loaded. {reason}').format(
+                reason=get_error_text(e, api_url=connection.api_url, connection=connection)
+            ), messages.ERROR)
+    if num_loaded or not num_failed:
+        modeladmin.message_user(request, ngettext_lazy(
+            '%d description was loaded.',
+            '%d descriptions were loaded.',
+            num_loaded,
+        ) % num_loaded, messages.SUCCESS)
+
+
 @register(JiraConnection)
 class JiraConnectionAdmin(ModelAdmin):
     form = JiraConnectionForm
@@ -109,6 +123,24 @@ class JiraConnectionAdmin(ModelAdmin):
             fields = ('label', 'api_url', 'username', 'password', 'story_points_field', 'test_connection')
         return fields
 
+    def get_fieldsets(self, request: HttpRequest, obj: JiraConnection = None) -> List[Tuple[Optional[str], Dict]]:
+        return [
+            (None, {
+                'fields': self.get_fields(request, obj)
+            }),
+            (_('Import Options'), {
+                'fields': ('description_format', 'import_story_points')
+            }),
+            (_('Transport Options'), {
+                'classes': ('collapse',),
+                'fields': (*JiraConnection.TRANSPORT_FIELDS, 'num_workers')
+            }),
+            (_('Webhook'), {
+                'classes': ('collapse',),
+                'fields': ('webhook_secret',)
+            }),
+        ]
+
     def get_import_stories_url(self, obj: JiraConnection) -> str:
         """Create an anchor tag with the link to the object's import stories view.
 
@@ -123,38 +155,49 @@ class JiraConnectionAdmin(ModelAdmin):
     def import_stories_view(self, request: HttpRequest, object_id: int, extra_context: Dict = None) -> HttpResponse:
         """Render a view where the user can import stories from a jira connection.
 
+        Submitting the form with the ``_preview`` button lists a page of the matching issues instead of importing them.
+        The value of the button is the number of the page. Issues which are deselected in the preview are excluded from
+        the import.
+
         :param request: The current HTTPRequest.
         :param object_id: The id of the jira connection which should be used to import the stories.
         :param extra_context: Additional context which should be added to the view.
-        :return: A http response which either redirects back to the changelist view on success or renders a template
-                 with the `ImportStoriesForm`.
+        :return: A http response which either redirects to the progress page of the started import job or renders a
+                 template with the `ImportStoriesForm` and the preview.
         """
         obj = self.get_object(request, unquote(object_id))
 
         if obj is None:
             return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
 
+        preview = None
         if request.method == 'POST':
             form = ImportStoriesForm(obj, request.POST)
-            if form.is_valid():
+            if form.is_valid() and '_preview' in request.POST:
+                try:
+                    page = int(request.POST['_preview'])
+                except ValueError:
+                    page = 1
                 try:
-                    stories = obj.create_stories(form.cleaned_data['jql_query'],
-                                                 form.cleaned_data['poker_session'],
-                                                 form.client)
+                    preview = obj.preview_issues(combine_jql_queries(split_jql_queries(form.cleaned_data['jql_query'])),
+                                                 form.client, page)
                 except (JIRAError, ConnectionError, RequestException) as e:
-                    if isinstance(e, JIRAError):
-                        field = 'jql_query'
-                    else:
-                        field = None
-                    form.add_error(field, get_error_text(e, api_url=obj.api_url, connection=obj))
-                else:
-                    num_stories = len(stories)
-                    self.message_user(request, ngettext_lazy(
-                        '%d story was successfully imported.',
-                        '%d stories were successfully imported.',
-                        num_stories,
-                    ) % num_stories, messages.SUCCESS)
-                    return HttpResponseRedirect(reverse(admin_urlname(self.opts, 'changelist')))
+                    form.add_error(None, get_error_text(e, api_url=obj.api_url, connection=obj))
+            elif form.is_valid():
+                job = ImportJob.objects.create(
+                    connection=obj,
+                    poker_session=form.cleaned_data['poker_session'],
+                    jql_query=form.get_query_string(),
+                    username=form.cleaned_data['username'],
+                    password=form.cleaned_data['password'],
+                    description_format=form.cleaned_data['description_format'],
+                    import_story_points=form.cleaned_data['import_story_points'],
+                    upsert=form.cleaned_data['update_existing'],
+                    use_cache=not form.cleaned_data['bypass_cache'],
+                    atomic=form.cleaned_data['all_or_nothing']
+                )
+                enqueue(job)
+                return HttpResponseRedirect(reverse(admin_urlname(ImportJob._meta, 'progress'), args=[job.pk]))
         else:
             form = ImportStoriesForm(connection=obj)
         admin_form = helpers.AdminForm(
@@ -163,6 +206,10 @@ class JiraConnectionAdmin(ModelAdmin):
                 (None, {
                     'fields': ('poker_session', 'jql_query')
                 }),
+                (_('Import Options'), {
+                    'fields': ('description_format', 'import_story_points', 'update_existing', 'all_or_nothing',
+                               'bypass_cache'),
+                }),
                 (_('Override Options'), {
                     'fields': ('username', 'password'),
                 }),
@@ -176,9 +223,160 @@ class JiraConnectionAdmin(ModelAdmin):
             'title': _('Import stories from "{connection}"').format(connection=obj),
             'form': admin_form,
             'object_id': object_id,
+            'search_cache_stats': search_cache.get_stats(),
+            'preview': preview,
+            'excluded_keys': sorted(form.get_excluded_keys()) if preview else [],
         }
         context.update(extra_context or {})
         return TemplateResponse(request, 'admin/planning_poker_jira/jira_connection/import_stories.html', context)
 
 
+class BackgroundJobAdmin(ModelAdmin):
+    """Read-only admin for the background jobs which adds a progress page to each job."""
+    exclude = ('password',)
+    #: The template which renders the progress page.
+    progress_template = None
+    #: The title of the progress page. It is formatted with the job's connection.
+    progress_title = None
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        # Jobs are only created by the import and export views.
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: BackgroundJob = None) -> bool:
+        return False
+
+    def get_urls(self) -> List[Union[URLResolver, URLPattern]]:
+        urls = super().get_urls()
+        info = self.opts.app_label, self.opts.model_name
+        urls[0:0] = [
+            path('<path:object_id>/progress/', self.admin_site.admin_view(self.progress_view),
+                 name='%s_%s_progress' % info),
+            path('<path:object_id>/status/', self.admin_site.admin_view(self.status_view),
+                 name='%s_%s_status' % info),
+        ]
+        return urls
+
+    def get_progress_url(self, obj: BackgroundJob) -> str:
+        """Create an anchor tag with the link to the job's progress page.
+
+        :param obj: The job which should be used to determine the url.
+        :return: A string containing a html anchor tag where the href attribute points to the progress view.
+        """
+        return format_html('<a href="{}">{}</a>', reverse(admin_urlname(self.opts, 'progress'), args=[obj.pk]),
+                           _('Progress'))
+
+    get_progress_url.short_description = _('Progress')
+
+    def get_websocket_path(self, obj: BackgroundJob) -> str:
+        """Return the path of the websocket which streams the job's progress events. See `routing.py`.
+
+        :param obj: The job whose progress should be streamed.
+        :return: The absolute path of the websocket.
+        """
+        return '/jira/{}_jobs/{}/'.format(self.opts.model_name[:-len('job')], obj.pk)
+
+    def progress_view(self, request: HttpRequest, object_id: str) -> HttpResponse:
+        """Render a page which shows the progress of a job.
+
+        The page receives the progress events through a websocket and falls back to polling the `status_view()` if the
+        websocket is not available.
+
+        :param request: The current HTTPRequest.
+        :param object_id: The id of the job.
+        :return: A http response which renders the progress page.
+        """
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        if not self.has_view_permission(request, obj):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'title': self.progress_title.format(connection=obj.connection),
+            'job': obj,
+            'progress': obj.get_progress(include_details=True),
+            'status_url': reverse(admin_urlname(self.opts, 'status'), args=[obj.pk]),
+            'websocket_path': self.get_websocket_path(obj),
+        }
+        return TemplateResponse(request, self.progress_template, context)
+
+    def status_view(self, request: HttpRequest, object_id: str) -> HttpResponse:
+        """Return the current state of a job as JSON.
+
+        :param request: The current HTTPRequest.
+        :param object_id: The id of the job.
+        :return: A JSON response containing the job's state.
+        """
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None:
+            return JsonResponse({}, status=404)
+        if not self.has_view_permission(request, obj):
+            raise PermissionDenied
+        return JsonResponse(obj.get_progress(include_details=True))
+
+
+@register(ImportJob)
+class ImportJobAdmin(BackgroundJobAdmin):
+    list_display = ('__str__', 'connection', 'poker_session', 'status', 'num_imported', 'num_updated', 'total',
+                    'created_at', 'get_progress_url')
+    list_filter = ('status', 'connection')
+    progress_template = 'admin/planning_poker_jira/import_job/progress.html'
+    progress_title = _('Importing stories from "{connection}"')
+
+
+@register(ExportJob)
+class ExportJobAdmin(BackgroundJobAdmin):
+    list_display = ('__str__', 'status', 'num_exported', 'num_failed', 'num_stories', 'created_at',
+                    'get_progress_url')
+    list_filter = ('status', 'connection')
+    progress_template = 'admin/planning_poker_jira/export_job/progress.html'
+    progress_title = _('Exporting story points to "{connection}"')
+
+
+@register(SavedQuery)
+class SavedQueryAdmin(ModelAdmin):
+    list_display = ('__str__', 'connection', 'poker_session', 'last_synced_at', 'last_sync_duration')
+    list_filter = ('connection',)
+    readonly_fields = ('last_synced_at', 'last_sync_duration', 'last_sync_num_imported', 'last_sync_num_updated',
+                       'last_sync_num_removed', 'last_sync_error')
+    actions = ('sync_stories', 'sync_stories_and_remove_missing')
+
+    def _sync(self, request: HttpRequest, queryset: QuerySet, remove_missing: bool):
+        """Synchronize the stories of each saved query in the queryset in the background.
+
+        The synchronization can take longer than the HTTP request may, e.g. the first one or if the missing stories
+        are removed. Its outcome is shown on the admin page of each saved query once it finished.
+
+        :param request: The current HTTP request.
+        :param queryset: Containing the set of saved queries selected by the user.
+        :param remove_missing: Whether stories whose issues no longer match the query should be removed.
+        """
+        executor = get_executor()
+        if executor is None:
+            self.message_user(request, _('The saved queries can only be synchronized by the "jira_sync" management '
+                                         'command because the in-process workers are disabled.'), messages.ERROR)
+            return
+        saved_query_ids = list(queryset.values_list('pk', flat=True))
+        for saved_query_id in saved_query_ids:
+            submit(executor, sync_saved_query, saved_query_id, remove_missing)
+        self.message_user(request, ngettext_lazy(
+            '{count} saved query is being synchronized in the background. Reload this page to see its outcome.',
+            '{count} saved queries are being synchronized in the background. Reload this page to see their outcome.',
+            len(saved_query_ids)
+        ).format(count=len(saved_query_ids)), messages.SUCCESS)
+
+    def sync_stories(self, request: HttpRequest, queryset: QuerySet):
+        self._sync(request, queryset, remove_missing=False)
+
+    sync_stories.short_description = _('Synchronize stories')
+
+    def sync_stories_and_remove_missing(self, request: HttpRequest, queryset: QuerySet):
+        self._sync(request, queryset, remove_missing=True)
+
+    sync_stories_and_remove_missing.short_description = _('Synchronize stories and remove missing ones')
+
+
 StoryAdmin.add_action(export_story_points, _('Export Story Points to Jira'))
+StoryAdmin.add_action(load_descriptions, _('Load Descriptions from Jira'))
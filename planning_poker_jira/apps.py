@@ -7,3 +7,6 @@ class PlanningPokerJiraConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'planning_poker_jira'
     verbose_name = _('Planning Poker: Jira Extension')
+
+    def ready(self):
+        from . import receivers  # noqa
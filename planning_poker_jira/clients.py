@@ -0,0 +1,363 @@
+import functools
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from jira import JIRA, JIRAError
+from requests import Response, Session
+from requests.exceptions import RequestException
+
+#: The headers the `JIRA` client sends with every request unless they are overridden through its options.
+DEFAULT_HEADERS = dict(JIRA.DEFAULT_OPTIONS['headers'])
+
+
+def get_credentials_fingerprint(username: str, password: str) -> str:
+    """Create a fingerprint of the given credentials which can be used as part of a cache key without storing the
+    password in plain text.
+
+    The fingerprint is an HMAC keyed with the ``SECRET_KEY``, so the passwords can't be brute-forced from the keys of
+    a shared cache.
+
+    :param username: The username used for the authentication at the API.
+    :param password: The password used for the authentication at the API.
+    :return: A hex digest which identifies the credentials.
+    """
+    # Equivalent to `salted_hmac(..., algorithm='sha256')`, which is not available before Django 3.1.
+    key = hashlib.sha256(('planning_poker_jira.clients.get_credentials_fingerprint' + settings.SECRET_KEY).encode())
+    return hmac.new(key.digest(), '\0'.join((username or '', password or '')).encode(), hashlib.sha256).hexdigest()
+
+
+def get_client_fingerprint(client: JIRA) -> Optional[str]:
+    """Create a fingerprint of the credentials which the given client authenticates with.
+
+    :param client: A client which uses basic authentication.
+    :return: A hex digest which identifies the credentials or `None` if the client uses another kind of authentication.
+    """
+    auth = client._session.auth
+    if not isinstance(auth, tuple):
+        return None
+    return get_credentials_fingerprint(*auth)
+
+
+class ClientPool:
+    """Thread-safe cache of authenticated `JIRA` clients.
+
+    Creating a client is expensive because it requires a new TCP/TLS handshake and additional requests to the Jira
+    backend. The pool keeps the clients around for ``JIRA_CLIENT_POOL_TTL`` seconds and evicts the least recently used
+    ones once it holds more than ``JIRA_CLIENT_POOL_SIZE`` clients.
+    """
+
+    def __init__(self):
+        #: Maps the client keys to tuples containing the time of the client's creation and the client itself.
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return getattr(settings, 'JIRA_CLIENT_POOL_SIZE', 32)
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, 'JIRA_CLIENT_POOL_TTL', 300)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, key: Hashable, factory: Callable[[], JIRA]) -> JIRA:
+        """Return the pooled client for the given key or create a new one with the given factory.
+
+        The factory is called without holding the lock, so a slow authentication does not block other threads which
+        request clients for different keys.
+
+        :param key: The key which identifies the client. See `JiraConnection.get_client_key()`.
+        :param factory: A callable which creates a new client. Any exception raised by it is propagated and nothing
+                        will be cached.
+        :return: The pooled or newly created client.
+        """
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                created_at, client = entry
+                if time.monotonic() - created_at < self.ttl:
+                    self._clients.move_to_end(key)
+                    return client
+                del self._clients[key]
+
+        client = factory()
+        with self._lock:
+            self._clients[key] = (time.monotonic(), client)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return client
+
+    def invalidate(self, api_url: str):
+        """Remove all the clients which communicate with the given API URL.
+
+        :param api_url: The API URL of the clients which should be removed.
+        """
+        with self._lock:
+            for key in [key for key in self._clients if key[0] == api_url]:
+                del self._clients[key]
+
+    def clear(self):
+        """Remove all the clients from the pool."""
+        with self._lock:
+            self._clients.clear()
+
+
+class LazyClient:
+    """Proxy which postpones the creation of a `JIRA` client until one of its attributes is accessed for the first time.
+
+    This allows handing out a client without communicating with the jira backend at all. Any errors which occur while
+    creating the client (e.g. because of invalid credentials) are raised by the first real operation instead.
+    """
+
+    def __init__(self, factory: Callable[[], JIRA]):
+        """Initialize the proxy.
+
+        :param factory: A callable which creates the actual client.
+        """
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> JIRA:
+        """Create the actual client if necessary and return it.
+
+        :return: The client this proxy stands in for.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+            return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+
+class CircuitBreakerOpen(RequestException):
+    """Raised instead of sending a request to a jira backend whose circuit breaker is open."""
+
+    def __init__(self, api_url: str, retry_after: float):
+        """Initialize the exception.
+
+        :param api_url: The API URL of the jira backend which is considered to be unavailable.
+        :param retry_after: The number of seconds until the next request to the jira backend will be attempted.
+        """
+        self.api_url = api_url
+        self.retry_after = retry_after
+        super().__init__('The circuit breaker for "{}" is open'.format(api_url))
+
+
+class CircuitBreaker:
+    """Circuit breaker which stops sending requests to a jira backend after it failed repeatedly.
+
+    The breaker opens after ``JIRA_CIRCUIT_BREAKER_THRESHOLD`` failed requests within ``JIRA_CIRCUIT_BREAKER_COOLDOWN``
+    seconds. While it is open, every request fails immediately with a `CircuitBreakerOpen` exception. Once the
+    cooldown has passed, a single probe request is let through (half-open state). The breaker closes again if the probe
+    succeeds and reopens for another cooldown if it fails.
+
+    Connection errors, timeouts, ``429`` and ``5xx`` responses count as failures. Every other response proves that the
+    backend is alive and resets the breaker. The state is stored in Django's default cache, so all worker processes
+    which share the cache also share the breaker.
+    """
+
+    def __init__(self, api_url: str):
+        """Initialize the circuit breaker.
+
+        :param api_url: The API URL of the jira backend which should be guarded.
+        """
+        self.api_url = api_url
+        key_prefix = 'planning_poker_jira:circuit_breaker:{}'.format(hashlib.sha256(api_url.encode()).hexdigest())
+        self._failures_key = key_prefix + ':failures'
+        self._opened_at_key = key_prefix + ':opened_at'
+        self._probe_key = key_prefix + ':probe'
+
+    @property
+    def threshold(self) -> int:
+        return getattr(settings, 'JIRA_CIRCUIT_BREAKER_THRESHOLD', 5)
+
+    @property
+    def cooldown(self) -> float:
+        return getattr(settings, 'JIRA_CIRCUIT_BREAKER_COOLDOWN', 30)
+
+    @property
+    def is_open(self) -> bool:
+        return cache.get(self._opened_at_key) is not None
+
+    def before_request(self):
+        """Check whether a request may be sent to the jira backend.
+
+        :raises CircuitBreakerOpen: If the breaker is open or another request is already probing the backend.
+        """
+        opened_at = cache.get(self._opened_at_key)
+        if opened_at is None:
+            return
+        retry_after = opened_at + self.cooldown - time.time()
+        # `cache.add()` is atomic, so only a single request across all processes gets to probe the backend.
+        if retry_after > 0 or not cache.add(self._probe_key, True, timeout=self.cooldown):
+            raise CircuitBreakerOpen(self.api_url, max(retry_after, 0))
+
+    def record_success(self):
+        cache.delete_many([self._failures_key, self._opened_at_key, self._probe_key])
+
+    def record_failure(self):
+        if not self.threshold:
+            return
+        if self.is_open:
+            # The probe request failed, so the backend gets another cooldown.
+            cache.set(self._opened_at_key, time.time(), timeout=None)
+            cache.delete(self._probe_key)
+            return
+        cache.add(self._failures_key, 0, timeout=self.cooldown)
+        try:
+            failures = cache.incr(self._failures_key)
+        except ValueError:
+            # The counter expired in the meantime.
+            failures = 1
+            cache.set(self._failures_key, failures, timeout=self.cooldown)
+        if failures >= self.threshold:
+            cache.set(self._opened_at_key, time.time(), timeout=None)
+            cache.delete(self._probe_key)
+
+    def is_failure(self, response_or_exception: Any) -> bool:
+        """Determine whether the given response or exception indicates that the jira backend is unavailable."""
+        if isinstance(response_or_exception, (Response, JIRAError)) and response_or_exception.status_code:
+            return response_or_exception.status_code == 429 or response_or_exception.status_code >= 500
+        return isinstance(response_or_exception, (RequestException, JIRAError))
+
+    def call(self, function: Callable, *args, **kwargs) -> Any:
+        """Call the given function which communicates with the jira backend and record its outcome.
+
+        :param function: The function which should be called.
+        :param args: Additional arguments which will be passed to the function.
+        :param kwargs: Additional keyword arguments which will be passed to the function.
+        :return: The function's return value.
+        :raises CircuitBreakerOpen: If the breaker does not allow any requests at the moment.
+        """
+        self.before_request()
+        try:
+            result = function(*args, **kwargs)
+        except (RequestException, JIRAError) as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        if self.is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def guard(self, session: Session):
+        """Route every request the given session makes through this circuit breaker.
+
+        :param session: The session of a `JIRA` client. Since the resources returned by the client share its session,
+                        this also covers requests like `Issue.update()`.
+        """
+        session.request = functools.partial(self.call, session.request)
+
+
+class SearchCache:
+    """Cache of the pages returned by the JQL search of jira backends.
+
+    Each page is stored in Django's default cache for ``JIRA_SEARCH_CACHE_TTL`` seconds. The key consists of the API
+    URL, a fingerprint of the client's credentials, the normalized JQL query, the requested fields and the requested
+    page, so the same query with a different projection or page size is cached separately and users never get pages
+    which were fetched with credentials that may see other issues than theirs. The number of cache hits and misses is
+    counted in the cache as well, so it is shared by all the processes which share the cache.
+    """
+    key_prefix = 'planning_poker_jira:search_cache'
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, 'JIRA_SEARCH_CACHE_TTL', 300)
+
+    @staticmethod
+    def normalize_query(query_string: str) -> str:
+        """Collapse the whitespace of the given JQL query. The case is kept since it matters for the values."""
+        return ' '.join(query_string.split())
+
+    def get_key(self, api_url: str, credentials: str, jql_str: str, start_at: int, max_results: int,
+                fields: Optional[List[str]] = None, expand: Optional[str] = None) -> str:
+        """Return the cache key for a page of the search results.
+
+        :param api_url: The API URL of the jira backend.
+        :param credentials: The fingerprint of the credentials which are used to search the issues.
+        :param jql_str: The JQL query.
+        :param start_at: The index of the first issue of the page.
+        :param max_results: The requested page size.
+        :param fields: The requested fields.
+        :param expand: The requested expansions.
+        :return: The cache key.
+        """
+        key_data = json.dumps([api_url, credentials, self.normalize_query(jql_str), start_at, max_results,
+                               sorted(fields or []), expand])
+        return '{}:{}'.format(self.key_prefix, hashlib.sha256(key_data.encode()).hexdigest())
+
+    def search_issues(self, client: JIRA, api_url: str, jql_str: str, startAt: int, maxResults: int,
+                      **kwargs) -> Dict[str, Any]:
+        """Return the cached page of the search results or request it from the jira backend and cache it.
+
+        The pages of clients which do not use basic authentication are never cached since their credentials cannot be
+        told apart.
+
+        :param client: The client which is used to request the page if it is not cached.
+        :param api_url: The API URL of the jira backend.
+        :param jql_str: The JQL query.
+        :param startAt: The index of the first issue of the page.
+        :param maxResults: The requested page size.
+        :param kwargs: Additional keyword arguments which will be passed to `JIRA.search_issues()`.
+        :return: The JSON returned by the search.
+        """
+        credentials = get_client_fingerprint(client)
+        key = self.get_key(api_url, credentials, jql_str, startAt, maxResults, kwargs.get('fields'),
+                           kwargs.get('expand'))
+        use_cache = self.ttl and credentials is not None
+        data = cache.get(key) if use_cache else None
+        if data is not None:
+            self._count('hits')
+            return data
+        self._count('misses')
+        data = client.search_issues(jql_str, startAt=startAt, maxResults=maxResults, json_result=True, **kwargs)
+        if use_cache:
+            cache.set(key, data, timeout=self.ttl)
+        return data
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the number of cache hits and misses since the statistics were last reset.
+
+        :return: A dictionary containing the ``hits`` and ``misses``.
+        """
+        counters = cache.get_many([self._get_counter_key(name) for name in ('hits', 'misses')])
+        return {name: counters.get(self._get_counter_key(name), 0) for name in ('hits', 'misses')}
+
+    def reset_stats(self):
+        cache.delete_many([self._get_counter_key(name) for name in ('hits', 'misses')])
+
+    def _get_counter_key(self, name: str) -> str:
+        return '{}:{}'.format(self.key_prefix, name)
+
+    def _count(self, name: str):
+        key = self._get_counter_key(name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter was reset in the meantime.
+            cache.set(key, 1, timeout=None)
+
+
+#: The process-wide client pool which is used by `JiraConnection.get_client()`.
+client_pool = ClientPool()
+
+#: The cache which is used by `JiraConnection.iter_issue_pages()` unless it is bypassed.
+search_cache = SearchCache()
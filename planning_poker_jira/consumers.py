@@ -0,0 +1,55 @@
+from typing import Dict
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+from django.utils.functional import cached_property
+
+from .models import BackgroundJob, ExportJob, ImportJob
+
+
+class JobProgressConsumer(JsonWebsocketConsumer):
+    """Consumer which streams the progress events of a background job to its progress page in the admin."""
+    #: Maps the job types used in the websocket's url to the models of the jobs.
+    job_models = {'import': ImportJob, 'export': ExportJob}
+
+    @cached_property
+    def job(self) -> BackgroundJob:
+        """Return the job corresponding to the websocket's url.
+
+        :return: The job or `None` if it doesn't exist.
+        """
+        kwargs = self.scope['url_route']['kwargs']
+        return self.job_models[kwargs['job_type']].objects.select_related('connection').filter(
+            pk=kwargs['job_id']
+        ).first()
+
+    def has_permission(self) -> bool:
+        """Check whether the user may see the job's progress. The same permission is required as for its admin page."""
+        user = self.scope.get('user')
+        if user is None or not user.is_active or not user.is_staff:
+            return False
+        opts = self.job_models[self.scope['url_route']['kwargs']['job_type']]._meta
+        return user.has_perm('{}.view_{}'.format(opts.app_label, opts.model_name))
+
+    def connect(self):
+        """Accept the connection from the progress page and send it the current state of the job."""
+        self.group_name = None
+        if self.channel_layer is None or not self.has_permission() or self.job is None:
+            self.close()
+            return
+        self.group_name = self.job.get_progress_group_name()
+        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
+        self.accept()
+        self.send_json({'event': 'progress', 'data': self.job.get_progress(include_details=True)})
+
+    def disconnect(self, code: int):
+        """Remove self from the job's group."""
+        if self.group_name:
+            async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
+
+    def job_progress(self, message: Dict):
+        """Forward a progress event which was sent by `BackgroundJob.send_progress()` to the websocket.
+
+        :param message: The message containing the name of the event and its data.
+        """
+        self.send_json({'event': message['event'], 'data': message['data']})
@@ -1,14 +1,34 @@
-from typing import Any, Dict
+import re
+from typing import Any, Dict, List, Set
 
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from jira import JIRA, JIRAError
 from requests.exceptions import ConnectionError, RequestException
 
 from planning_poker.models import PokerSession
 
-from .models import JiraConnection
-from .utils import get_error_text
+from .models import DescriptionFormat, FieldProjection, JiraConnection
+from .utils import add_jql_condition, format_jql_list, get_error_text, split_jql_queries
+
+ISSUE_KEY_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9_]*-\d+$')
+
+
+class IssueKeysField(forms.Field):
+    """Field which holds a list of issue keys, e.g. the keys of the issues which were deselected in the preview."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value: Any) -> List[str]:
+        if not value:
+            return []
+        keys = [key.strip() for key in value if key.strip()]
+        invalid_keys = [key for key in keys if not ISSUE_KEY_PATTERN.match(key)]
+        if invalid_keys:
+            raise ValidationError(_('Invalid issue keys: %(keys)s'), code='invalid',
+                                  params={'keys': ', '.join(invalid_keys)})
+        return keys
 
 
 class JiraAuthenticationForm(forms.Form):
@@ -68,6 +88,19 @@ class JiraAuthenticationForm(forms.Form):
         """
         return True
 
+    def _defers_connection_test(self) -> bool:
+        """Determine whether the verification of the credentials should be deferred to the first real operation.
+        When deferred, the `client` property is populated with a `LazyClient` which does not communicate with the jira
+        backend during the form's validation. Any authentication errors are raised by the first operation instead and
+        have to be handled by the caller.
+
+        This depends on the ``JIRA_DEFER_AUTHENTICATION`` setting. Child classes which are explicitly meant to test
+        the connection should override this method.
+
+        :return: Whether the connection test should be deferred.
+        """
+        return getattr(settings, 'JIRA_DEFER_AUTHENTICATION', False)
+
     def clean(self) -> Dict[str, Any]:
         cleaned_data = super().clean()
         connection = self._get_connection()
@@ -76,7 +109,7 @@ class JiraAuthenticationForm(forms.Form):
                 self.add_error(None, _('Missing credentials. Check whether you entered an API URL, and a username.'))
             else:
                 try:
-                    self._client = connection.get_client()
+                    self._client = connection.get_client(verify=not self._defers_connection_test())
                 except (JIRAError, ConnectionError, RequestException) as e:
                     self.add_error(None, get_error_text(e, api_url=connection.api_url, connection=connection))
         return cleaned_data
@@ -123,9 +156,12 @@ class JiraConnectionForm(JiraAuthenticationForm, forms.ModelForm):
         return super().clean()
 
     def _get_connection(self) -> JiraConnection:
+        transport_options = {field: self.cleaned_data[field] for field in JiraConnection.TRANSPORT_FIELDS
+                             if field in self.cleaned_data}
         return JiraConnection(api_url=self.cleaned_data.get('api_url'),
                               username=self.cleaned_data.get('username'),
-                              password=self.cleaned_data.get('password'))
+                              password=self.cleaned_data.get('password'),
+                              **transport_options)
 
     def _requires_connection_test(self) -> bool:
         # Determine whether the connection to the jira backend should be tested. This depends on the `test_connection`
@@ -134,6 +170,10 @@ class JiraConnectionForm(JiraAuthenticationForm, forms.ModelForm):
         # password shouldn't be changed.
         return self.cleaned_data['test_connection']
 
+    def _defers_connection_test(self) -> bool:
+        # The whole point of the `test_connection` checkbox is to verify the credentials right away.
+        return False
+
 
 class ExportStoryPointsForm(JiraAuthenticationForm):
     """Form which is used for exporting stories to the jira backend."""
@@ -150,7 +190,8 @@ class ExportStoryPointsForm(JiraAuthenticationForm):
         connection = self.cleaned_data['jira_connection']
         return JiraConnection(api_url=connection.api_url,
                               username=self.cleaned_data['username'] or connection.username,
-                              password=self.cleaned_data['password'] or connection.password)
+                              password=self.cleaned_data['password'] or connection.password,
+                              **connection.get_transport_options())
 
 
 class ImportStoriesForm(JiraAuthenticationForm):
@@ -162,8 +203,58 @@ class ImportStoriesForm(JiraAuthenticationForm):
         queryset=PokerSession.objects.all(),
         required=False
     )
-    #: The query which should be used to retrieve the stories from the Jira backend.
-    jql_query = forms.CharField(label=_('JQL Query'), required=True)
+    #: The queries which should be used to retrieve the stories from the Jira backend. One query per line.
+    jql_query = forms.CharField(
+        label=_('JQL Query'),
+        help_text=_('Enter one query per line in order to import the issues of several queries at once. The issues are '
+                    'added in the order of the queries and issues matching more than one query are only added once'),
+        widget=forms.Textarea(attrs={'rows': 3}),
+        required=True
+    )
+    #: Optional: Overrides the format in which the descriptions are imported.
+    description_format = forms.ChoiceField(
+        label=_('Description Format'),
+        help_text=_('Importing the rendered HTML takes the Jira backend considerably longer than importing the raw '
+                    'markup. Importing only the summary is the fastest option'),
+        choices=[('', _('Connection default'))] + DescriptionFormat.choices,
+        required=False
+    )
+    #: Optional: Overrides whether the story points should be imported.
+    import_story_points = forms.TypedChoiceField(
+        label=_('Import Story Points'),
+        help_text=_('Import the story points which are already stored in the Jira backend'),
+        choices=[('', _('Connection default')), ('true', _('Yes')), ('false', _('No'))],
+        coerce=lambda value: value == 'true',
+        empty_value=None,
+        required=False
+    )
+    #: Whether the existing stories of the poker session should be updated instead of being imported a second time.
+    update_existing = forms.BooleanField(
+        label=_('Update Existing Stories'),
+        help_text=_('Update the stories of the poker session which have the ticket number of an imported issue instead '
+                    'of adding them a second time'),
+        required=False
+    )
+    #: Whether all the stories should be imported in a single transaction.
+    all_or_nothing = forms.BooleanField(
+        label=_('All or Nothing'),
+        help_text=_('Discard all the imported stories if the import fails. The poker session can not be changed until '
+                    'the import is finished'),
+        required=False
+    )
+    #: Whether the cached search results should be ignored.
+    bypass_cache = forms.BooleanField(
+        label=_('Bypass Cache'),
+        help_text=_('Request the issues from the Jira backend even if the results of the same query are still cached'),
+        required=False
+    )
+
+    #: The keys of the issues which were deselected on any page of the preview.
+    excluded_keys = IssueKeysField(required=False)
+    #: The keys of the issues which were listed on the last page of the preview.
+    shown_keys = IssueKeysField(required=False)
+    #: The keys of the issues which are still selected on the last page of the preview.
+    selected_keys = IssueKeysField(required=False)
 
     def __init__(self, connection: JiraConnection, *args, **kwargs):
         """The `ImportStoriesForm` requires a `JiraConnection` passed from the outside in order to use it to acquire
@@ -176,7 +267,45 @@ class ImportStoriesForm(JiraAuthenticationForm):
         super().__init__(*args, **kwargs)
         self._connection = connection
 
+    def get_field_projection(self) -> FieldProjection:
+        """Return the field projection for the import based on the connection's settings and the entered overrides.
+
+        :return: The field projection which should be used to import the stories.
+        """
+        return self._connection.get_field_projection(self.cleaned_data.get('description_format'),
+                                                     self.cleaned_data.get('import_story_points'))
+
+    def get_excluded_keys(self) -> Set[str]:
+        """Return the keys of all the issues which were deselected in the preview so far.
+
+        :return: The previously excluded keys and the keys which were shown but deselected on the last preview page.
+        """
+        selected_keys = set(self.cleaned_data.get('selected_keys', []))
+        return ({key for key in self.cleaned_data.get('excluded_keys', []) if key not in selected_keys} |
+                {key for key in self.cleaned_data.get('shown_keys', []) if key not in selected_keys})
+
+    def get_queries(self) -> List[str]:
+        """Return the queries which select the issues that should be imported.
+
+        :return: A list containing each of the entered JQL queries, restricted to the issues which were not deselected
+                 in the preview.
+        """
+        queries = split_jql_queries(self.cleaned_data['jql_query'])
+        excluded_keys = self.get_excluded_keys()
+        if not excluded_keys:
+            return queries
+        condition = 'key not in {}'.format(format_jql_list(sorted(excluded_keys)))
+        return [add_jql_condition(query, condition) for query in queries]
+
+    def get_query_string(self) -> str:
+        """Return the queries which select the issues that should be imported.
+
+        :return: The queries returned by `get_queries()`, one query per line.
+        """
+        return '\n'.join(self.get_queries())
+
     def _get_connection(self) -> JiraConnection:
         return JiraConnection(api_url=self._connection.api_url,
                               username=self.cleaned_data['username'] or self._connection.username,
-                              password=self.cleaned_data['password'] or self._connection.password)
+                              password=self.cleaned_data['password'] or self._connection.password,
+                              **self._connection.get_transport_options())
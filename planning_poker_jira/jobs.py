@@ -0,0 +1,153 @@
+"""Runs the `BackgroundJob`s, the synchronization of saved queries and the loading of deferred descriptions in-process
+on two thread pools, so neither a separate worker nor a message broker is required.
+
+Set ``JIRA_JOB_WORKERS`` to ``0`` in order to process the jobs exclusively with the ``run_jira_jobs`` management
+command instead.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Type
+
+from django.conf import settings
+from django.db import connection, transaction
+from jira import JIRAError
+from requests.exceptions import ConnectionError, RequestException
+
+from .models import BackgroundJob, ExportJob, ImportJob, JobStatus, SavedQuery, load_active_story_descriptions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_description_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Optional[ThreadPoolExecutor]:
+    """Return the process-wide thread pool which runs the jobs.
+
+    Once the thread pool was created, the jobs of previous processes are recovered (see `recover_jobs()`).
+
+    :return: The thread pool or `None` if the jobs shouldn't be run in-process.
+    """
+    global _executor
+    num_workers = getattr(settings, 'JIRA_JOB_WORKERS', 2)
+    if not num_workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='jira-job')
+            # Pick up the jobs which were left behind by a previous process.
+            _executor.submit(_recover_jobs)
+        return _executor
+
+
+def get_description_executor() -> Optional[ThreadPoolExecutor]:
+    """Return the process-wide thread pool which loads the deferred descriptions of the active stories.
+
+    The descriptions are loaded on their own threads, so they don't have to wait for long running jobs.
+
+    :return: The thread pool or `None` if the descriptions shouldn't be loaded in-process.
+    """
+    global _description_executor
+    num_workers = getattr(settings, 'JIRA_DESCRIPTION_WORKERS', 1)
+    if not num_workers or not getattr(settings, 'JIRA_JOB_WORKERS', 2):
+        return None
+    with _executor_lock:
+        if _description_executor is None:
+            _description_executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='jira-description')
+        return _description_executor
+
+
+def run_job(model: Type[BackgroundJob], job_id: int):
+    """Run the job with the given id unless it was already claimed by another worker.
+
+    :param model: The model of the job.
+    :param job_id: The primary key of the job.
+    """
+    try:
+        job = model.objects.select_related('connection').filter(pk=job_id).first()
+        if job is not None:
+            job.run()
+    finally:
+        # Each worker thread opens its own database connection which would otherwise be leaked.
+        connection.close()
+
+
+def recover_jobs():
+    """Mark the stale jobs as failed (see `BackgroundJob.fail_stale_jobs()`) and submit the pending jobs to the thread
+    pool, e.g. the ones which were still queued when the process that created them exited.
+
+    A job which is pending in several processes is only run by the one which claims it first.
+    """
+    executor = get_executor()
+    for model in (ImportJob, ExportJob):
+        model.fail_stale_jobs()
+        if executor is not None:
+            pending_jobs = model.objects.filter(status=JobStatus.PENDING).order_by('created_at')
+            for job_id in pending_jobs.values_list('pk', flat=True):
+                executor.submit(run_job, model, job_id)
+
+
+def _recover_jobs():
+    try:
+        recover_jobs()
+    except Exception:
+        logger.exception('Could not recover the jobs of previous processes.')
+    finally:
+        connection.close()
+
+
+def load_descriptions(poker_session_id: int):
+    """Load the deferred descriptions of the poker session's active story and the following stories.
+
+    :param poker_session_id: The primary key of the poker session.
+    """
+    try:
+        load_active_story_descriptions(poker_session_id)
+    finally:
+        connection.close()
+
+
+def sync_saved_query(saved_query_id: int, remove_missing: bool = False):
+    """Synchronize the stories of the saved query with the given id. The outcome is stored in the saved query.
+
+    :param saved_query_id: The primary key of the saved query.
+    :param remove_missing: Whether stories whose issues no longer match the query should be removed.
+    """
+    try:
+        saved_query = SavedQuery.objects.select_related('connection', 'poker_session').filter(
+            pk=saved_query_id
+        ).first()
+        if saved_query is not None:
+            saved_query.sync(remove_missing=remove_missing)
+    except Exception as e:
+        # The explanation of the error is stored in the saved query.
+        if not isinstance(e, (JIRAError, ConnectionError, RequestException)):
+            logger.exception('Saved query %s could not be synchronized.', saved_query_id)
+    finally:
+        connection.close()
+
+
+def submit(executor: Optional[ThreadPoolExecutor], function: Callable[..., Any], *args: Any):
+    """Schedule the given function to be called on the given thread pool once the current transaction was committed.
+
+    Nothing happens if the in-process workers are disabled. The work is picked up by the management command instead.
+
+    :param executor: The thread pool returned by `get_executor()` or `get_description_executor()`.
+    :param function: The function which should be called by one of the workers. It has to close the database
+                     connection of the worker thread.
+    :param args: The arguments the function should be called with.
+    """
+    if executor is not None:
+        transaction.on_commit(lambda: executor.submit(function, *args))
+
+
+def enqueue(job: BackgroundJob):
+    """Schedule the given job to be run in-process once the current transaction was committed.
+
+    Nothing happens if the in-process workers are disabled. The job is picked up by the management command instead.
+
+    :param job: The job which should be run.
+    """
+    submit(get_executor(), run_job, type(job), job.pk)
@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from jira import JIRAError
+from requests.exceptions import RequestException
+
+from planning_poker.models import Story
+from planning_poker_jira.models import JiraConnection
+from planning_poker_jira.utils import get_error_text, positive_int
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Export the story points of the given stories to Jira. Prints the outcome of each story and a summary as '
+            'JSON in the last line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('connection_id', type=int, help='The id of the Jira connection.')
+        parser.add_argument('story_ids', nargs='*', type=int, metavar='story_id',
+                            help='The id of a story whose story points should be exported.')
+        parser.add_argument('--poker-session', type=int, dest='poker_session_id', metavar='ID',
+                            help='Export the story points of all the stories of the poker session with this id.')
+        parser.add_argument('--workers', type=positive_int,
+                            help="The number of stories which are exported at the same time. Overrides the "
+                                 "connection's number of parallel requests.")
+        parser.add_argument('--batch-size', type=positive_int, default=500,
+                            help='The number of stories which are loaded from the database at once.')
+
+    def handle(self, *args, **options):
+        try:
+            connection = JiraConnection.objects.get(pk=options['connection_id'])
+        except JiraConnection.DoesNotExist:
+            raise CommandError('Jira connection {} does not exist.'.format(options['connection_id']))
+        if not options['story_ids'] and options['poker_session_id'] is None:
+            raise CommandError('Pass the ids of the stories or --poker-session.')
+        stories = Story.objects.order_by('pk')
+        if options['story_ids']:
+            stories = stories.filter(pk__in=options['story_ids'])
+        if options['poker_session_id'] is not None:
+            stories = stories.filter(poker_session=options['poker_session_id'])
+        if options['workers'] is not None:
+            # Only the instance is changed, the stored connection keeps its setting.
+            connection.num_workers = options['workers']
+
+        started_at = time.monotonic()
+        summary = {'status': 'succeeded', 'num_exported': 0, 'num_failed': 0}
+
+        def report_progress(story: Story, error: Optional[Exception]):
+            if error is None:
+                summary['num_exported'] += 1
+                self.stdout.write('{}: exported.'.format(story.ticket_number))
+            else:
+                summary['num_failed'] += 1
+                self.stdout.write('{}: failed. {}'.format(story.ticket_number, get_error_text(
+                    error, api_url=connection.api_url, connection=connection
+                )))
+
+        error = None
+        try:
+            connection.export_story_points(stories.iterator(chunk_size=options['batch_size']),
+                                           connection.get_client(), progress_callback=report_progress)
+        except Exception as e:
+            # Every failure is reported in the summary, e.g. the client not being able to authenticate as well.
+            if not isinstance(e, (JIRAError, RequestException)):
+                logger.exception('The export to "%s" failed.', connection)
+            error = str(get_error_text(e, api_url=connection.api_url, connection=connection))
+            summary['error'] = error
+        if error or summary['num_failed']:
+            summary['status'] = 'failed'
+        summary['duration'] = round(time.monotonic() - started_at, 3)
+        self.stdout.write(json.dumps(summary))
+        if error:
+            raise CommandError(error)
+        if summary['num_failed']:
+            raise CommandError('{} of {} stories could not be exported.'.format(
+                summary['num_failed'], summary['num_exported'] + summary['num_failed']
+            ))
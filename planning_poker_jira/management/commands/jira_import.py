@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from jira import JIRAError
+from requests.exceptions import RequestException
+
+from planning_poker.models import PokerSession
+from planning_poker_jira.models import DescriptionFormat, ImportResult, JiraConnection
+from planning_poker_jira.utils import get_error_text, positive_int
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Import the issues matching the given JQL queries as stories. Prints the progress after each page and a '
+            'summary as JSON in the last line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('connection_id', type=int, help='The id of the Jira connection.')
+        parser.add_argument('jql_queries', nargs='+', metavar='jql_query',
+                            help='The JQL query which selects the issues. Issues matching several queries are only '
+                                 'imported once.')
+        parser.add_argument('--poker-session', type=int, dest='poker_session_id', metavar='ID',
+                            help='The id of the poker session to which the stories are added.')
+        parser.add_argument('--description-format', choices=DescriptionFormat.values,
+                            help="Overrides the connection's description format.")
+        parser.add_argument('--upsert', action='store_true',
+                            help='Update the existing stories of the poker session instead of duplicating them.')
+        parser.add_argument('--atomic', action='store_true',
+                            help='Import all the stories in a single transaction or none at all.')
+        parser.add_argument('--use-cache', action='store_true', help='Take the search results from the search cache.')
+        parser.add_argument('--workers', type=positive_int,
+                            help="The number of pages which are fetched at the same time. Overrides the connection's "
+                                 "number of parallel requests.")
+        parser.add_argument('--page-size', type=positive_int,
+                            help='The number of issues which are requested for each page. Defaults to JIRA_PAGE_SIZE.')
+        parser.add_argument('--batch-size', type=positive_int,
+                            help='The number of stories which are inserted at once. Defaults to '
+                                 'JIRA_BULK_CREATE_BATCH_SIZE.')
+
+    def handle(self, *args, **options):
+        try:
+            connection = JiraConnection.objects.get(pk=options['connection_id'])
+        except JiraConnection.DoesNotExist:
+            raise CommandError('Jira connection {} does not exist.'.format(options['connection_id']))
+        poker_session = None
+        if options['poker_session_id'] is not None:
+            try:
+                poker_session = PokerSession.objects.get(pk=options['poker_session_id'])
+            except PokerSession.DoesNotExist:
+                raise CommandError('Poker session {} does not exist.'.format(options['poker_session_id']))
+        if options['workers'] is not None:
+            # Only the instance is changed, the stored connection keeps its setting.
+            connection.num_workers = options['workers']
+
+        started_at = time.monotonic()
+        summary = {'status': 'succeeded', 'num_imported': 0, 'num_updated': 0, 'total': 0}
+
+        def report_progress(result: ImportResult):
+            # The summary of a failed import contains the stories which were imported before the error.
+            summary.update(num_imported=result.num_imported, num_updated=result.num_updated, total=result.total)
+            self.stdout.write('{} of {} stories imported, {} updated.'.format(
+                result.num_imported, result.total, result.num_updated
+            ))
+
+        error = None
+        try:
+            result = connection.create_stories(
+                options['jql_queries'], poker_session,
+                projection=connection.get_field_projection(options['description_format']), upsert=options['upsert'],
+                progress_callback=report_progress, use_cache=options['use_cache'], atomic=options['atomic'],
+                page_size=options['page_size'], batch_size=options['batch_size']
+            )
+        except Exception as e:
+            # Every failure is reported in the summary, e.g. the database failing during a large import as well.
+            if not isinstance(e, (JIRAError, RequestException)):
+                logger.exception('The import from "%s" failed.', connection)
+            error = str(get_error_text(e, api_url=connection.api_url, connection=connection))
+            summary.update(status='failed', error=error)
+        else:
+            summary.update(num_imported=result.num_imported, num_updated=result.num_updated, total=result.total)
+        summary['duration'] = round(time.monotonic() - started_at, 3)
+        self.stdout.write(json.dumps(summary))
+        if error:
+            raise CommandError(error)
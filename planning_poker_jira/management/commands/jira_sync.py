@@ -0,0 +1,87 @@
+import functools
+import itertools
+import logging
+from operator import attrgetter
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from jira import JIRAError
+from requests.exceptions import RequestException
+
+from planning_poker_jira.models import SavedQuery
+from planning_poker_jira.utils import map_concurrently, positive_int
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Synchronize the stories of the saved Jira queries, e.g. periodically through cron. The saved queries of '
+            'different connections are synchronized concurrently.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('saved_query_ids', nargs='*', type=int, metavar='saved_query_id',
+                            help='Only synchronize the saved queries with these ids.')
+        parser.add_argument('--connection', type=int, action='append', dest='connection_ids', metavar='ID',
+                            help='Only synchronize the saved queries of the connection with this id. Can be repeated.')
+        parser.add_argument('--remove-missing', action='store_true',
+                            help='Remove the stories whose issues no longer match the query from the poker session.')
+        parser.add_argument('--max-connections', type=positive_int, default=4,
+                            help='The maximum number of connections whose saved queries are synchronized at the '
+                                 'same time.')
+        parser.add_argument('--max-queries-per-connection', type=positive_int, default=2,
+                            help='The maximum number of saved queries per connection which are synchronized at the '
+                                 'same time.')
+
+    def handle(self, *args, **options):
+        saved_queries = SavedQuery.objects.select_related('connection', 'poker_session').order_by('connection', 'pk')
+        if options['saved_query_ids']:
+            saved_queries = saved_queries.filter(pk__in=options['saved_query_ids'])
+        if options['connection_ids']:
+            saved_queries = saved_queries.filter(connection__in=options['connection_ids'])
+        queries_by_connection = [list(group) for _, group in itertools.groupby(saved_queries,
+                                                                               attrgetter('connection_id'))]
+        sync_connection = functools.partial(self.sync_connection, remove_missing=options['remove_missing'],
+                                            max_workers=options['max_queries_per_connection'])
+        num_failed = num_synced = 0
+        for synced_queries in map_concurrently(sync_connection, queries_by_connection, options['max_connections']):
+            for saved_query in synced_queries:
+                self.stdout.write(self.describe(saved_query))
+                num_synced += 1
+                num_failed += bool(saved_query.last_sync_error)
+        if num_failed:
+            raise CommandError('{} of {} saved queries could not be synchronized.'.format(num_failed, num_synced))
+
+    def sync_connection(self, saved_queries: List[SavedQuery], remove_missing: bool,
+                        max_workers: int) -> List[SavedQuery]:
+        """Synchronize the given saved queries which all belong to the same connection.
+
+        :param saved_queries: The saved queries which should be synchronized.
+        :param remove_missing: Whether stories whose issues no longer match the query should be removed.
+        :param max_workers: The maximum number of saved queries which are synchronized at the same time.
+        :return: The saved queries containing the outcome of their synchronization.
+        """
+        return list(map_concurrently(functools.partial(self.sync_query, remove_missing=remove_missing),
+                                     saved_queries, max_workers))
+
+    def sync_query(self, saved_query: SavedQuery, remove_missing: bool) -> SavedQuery:
+        try:
+            saved_query.sync(remove_missing=remove_missing)
+        except Exception as e:
+            # The explanation of the error is stored in the saved query and reported once all queries were synchronized.
+            if not isinstance(e, (JIRAError, RequestException)):
+                logger.exception('Saved query %s could not be synchronized.', saved_query.pk)
+        finally:
+            # Each worker thread opens its own database connection which would otherwise be leaked.
+            connection.close()
+        return saved_query
+
+    def describe(self, saved_query: SavedQuery) -> str:
+        description = 'Saved query {} "{}"'.format(saved_query.pk, saved_query)
+        if saved_query.last_sync_error:
+            return '{} failed after {:.1f}s: {}'.format(description, saved_query.last_sync_duration.total_seconds(),
+                                                        saved_query.last_sync_error)
+        return '{} synchronized in {:.1f}s: {} stories created, {} updated, {} removed.'.format(
+            description, saved_query.last_sync_duration.total_seconds(), saved_query.last_sync_num_imported,
+            saved_query.last_sync_num_updated, saved_query.last_sync_num_removed
+        )
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from planning_poker.models import PokerSession
+from planning_poker_jira.models import ExportJob, ImportJob, load_active_story_descriptions
+from planning_poker_jira.webhooks import apply_pending_issue_changes
+
+
+class Command(BaseCommand):
+    help = ('Run the pending Jira import and export jobs, apply the issue changes reported by the webhooks and load '
+            'the deferred descriptions of the active stories. Jobs which are running for longer than JIRA_JOB_TIMEOUT '
+            'are marked as failed. Keeps polling for new jobs unless --once is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once all the pending jobs were run.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='The number of seconds to wait before polling for new jobs again.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_pending_jobs()
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def run_pending_jobs(self):
+        num_updated, num_removed = apply_pending_issue_changes()
+        if num_updated or num_removed:
+            self.stdout.write('Issue changes applied: {} stories updated, {} removed.'.format(num_updated, num_removed))
+        for poker_session_id in PokerSession.objects.filter(
+            active_story__jira_deferred_description__isnull=False
+        ).values_list('pk', flat=True):
+            num_loaded = load_active_story_descriptions(poker_session_id)
+            if num_loaded:
+                self.stdout.write('Poker session {}: {} descriptions loaded.'.format(poker_session_id, num_loaded))
+        for model in (ImportJob, ExportJob):
+            for job in model.fail_stale_jobs():
+                self.stdout.write(self.describe(job))
+            pending_jobs = model.objects.filter(status=model.Status.PENDING).order_by('created_at')
+            for job in pending_jobs.select_related('connection'):
+                # Another worker may have claimed the job in the meantime, in which case `run()` does nothing.
+                job.run()
+                if job.finished_at:
+                    self.stdout.write(self.describe(job))
+
+    def describe(self, job) -> str:
+        if isinstance(job, ImportJob):
+            description = 'Import job {} {}: {} of {} stories imported, {} updated.'.format(
+                job.pk, job.status, job.num_imported, job.total, job.num_updated
+            )
+        else:
+            description = 'Export job {} {}: {} of {} stories exported, {} failed.'.format(
+                job.pk, job.status, job.num_exported, job.num_stories, job.num_failed
+            )
+        return ' '.join(filter(None, (description, job.error)))
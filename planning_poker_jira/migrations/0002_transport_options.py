@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='compression',
+            field=models.BooleanField(default=True, help_text='Ask the Jira backend to compress its responses', verbose_name='Compression'),
+        ),
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='keep_alive',
+            field=models.BooleanField(default=True, help_text='Reuse the connections to the Jira backend instead of opening a new one for each request', verbose_name='Keep-Alive'),
+        ),
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='pool_connections',
+            field=models.PositiveSmallIntegerField(default=10, help_text='The number of hosts for which connections are kept open', verbose_name='Connection Pools'),
+        ),
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='pool_maxsize',
+            field=models.PositiveSmallIntegerField(default=10, help_text='The maximum number of connections which are kept open for each host. This should be at least as high as the number of parallel requests to the Jira backend', verbose_name='Connection Pool Size'),
+        ),
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='proxy_url',
+            field=models.CharField(blank=True, help_text='The HTTP proxy through which all requests to the Jira backend should be sent', max_length=200, verbose_name='Proxy URL'),
+        ),
+    ]
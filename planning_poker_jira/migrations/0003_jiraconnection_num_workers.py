@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:31
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0002_transport_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='num_workers',
+            field=models.PositiveSmallIntegerField(default=4, help_text='The maximum number of requests which are sent to the Jira backend at the same time, e.g. for fetching the pages of large imports', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Parallel Requests'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0003_jiraconnection_num_workers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='description_format',
+            field=models.CharField(choices=[('rendered', 'Rendered HTML'), ('raw', 'Raw markup'), ('none', 'Summary only')], default='rendered', help_text='Importing the rendered HTML takes the Jira backend considerably longer than importing the raw markup. Importing only the summary is the fastest option', max_length=20, verbose_name='Description Format'),
+        ),
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='import_story_points',
+            field=models.BooleanField(default=False, help_text='Import the story points which are already stored in the Jira backend', verbose_name='Import Story Points'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker', '0001_initial'),
+        ('planning_poker_jira', '0004_field_projection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jql_query', models.TextField(verbose_name='JQL Query')),
+                ('last_synced_at', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last Synchronization')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_queries', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+                ('poker_session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='saved_jira_queries', to='planning_poker.pokersession', verbose_name='Poker Session')),
+            ],
+            options={
+                'verbose_name': 'Saved Query',
+                'verbose_name_plural': 'Saved Queries',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:40
+
+import django.db.models.deletion
+import encrypted_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker', '0001_initial'),
+        ('planning_poker_jira', '0005_savedquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jql_query', models.TextField(verbose_name='JQL Query')),
+                ('username', models.CharField(blank=True, max_length=200, verbose_name='API Username')),
+                ('password', encrypted_fields.fields.EncryptedCharField(blank=True, max_length=200, verbose_name='Password')),
+                ('description_format', models.CharField(blank=True, choices=[('rendered', 'Rendered HTML'), ('raw', 'Raw markup'), ('none', 'Summary only')], max_length=20, verbose_name='Description Format')),
+                ('import_story_points', models.BooleanField(blank=True, null=True, verbose_name='Import Story Points')),
+                ('upsert', models.BooleanField(default=False, verbose_name='Update Existing Stories')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('num_pages', models.PositiveIntegerField(default=0, verbose_name='Fetched Pages')),
+                ('num_imported', models.PositiveIntegerField(default=0, verbose_name='Imported Stories')),
+                ('num_updated', models.PositiveIntegerField(default=0, verbose_name='Updated Stories')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Matching Issues')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+                ('poker_session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jira_import_jobs', to='planning_poker.pokersession', verbose_name='Poker Session')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
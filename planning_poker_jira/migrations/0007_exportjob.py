@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:44
+
+import django.db.models.deletion
+import encrypted_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker', '0001_initial'),
+        ('planning_poker_jira', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(blank=True, max_length=200, verbose_name='API Username')),
+                ('password', encrypted_fields.fields.EncryptedCharField(blank=True, max_length=200, verbose_name='Password')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('num_stories', models.PositiveIntegerField(default=0, verbose_name='Stories')),
+                ('num_exported', models.PositiveIntegerField(default=0, verbose_name='Exported Stories')),
+                ('num_failed', models.PositiveIntegerField(default=0, verbose_name='Failed Stories')),
+                ('failures', models.TextField(blank=True, verbose_name='Failures')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+                ('stories', models.ManyToManyField(related_name='jira_export_jobs', to='planning_poker.Story', verbose_name='Stories')),
+            ],
+            options={
+                'verbose_name': 'Export Job',
+                'verbose_name_plural': 'Export Jobs',
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker', '0001_initial'),
+        ('planning_poker_jira', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='description_format',
+            field=models.CharField(blank=True, choices=[('rendered', 'Rendered HTML'), ('raw', 'Raw markup'), ('none', 'Summary only'), ('lazy', 'Rendered HTML on demand')], max_length=20, verbose_name='Description Format'),
+        ),
+        migrations.AlterField(
+            model_name='jiraconnection',
+            name='description_format',
+            field=models.CharField(choices=[('rendered', 'Rendered HTML'), ('raw', 'Raw markup'), ('none', 'Summary only'), ('lazy', 'Rendered HTML on demand')], default='rendered', help_text='Importing the rendered HTML takes the Jira backend considerably longer than importing the raw markup. Importing only the summary is the fastest option', max_length=20, verbose_name='Description Format'),
+        ),
+        migrations.CreateModel(
+            name='DeferredDescription',
+            fields=[
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='jira_deferred_description', serialize=False, to='planning_poker.story', verbose_name='Story')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deferred_descriptions', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+            ],
+            options={
+                'verbose_name': 'Deferred Description',
+                'verbose_name_plural': 'Deferred Descriptions',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0008_deferreddescription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='use_cache',
+            field=models.BooleanField(default=True, verbose_name='Use Cached Search Results'),
+        ),
+    ]
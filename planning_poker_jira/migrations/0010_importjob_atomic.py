@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0009_importjob_use_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='atomic',
+            field=models.BooleanField(default=False, verbose_name='All or Nothing'),
+        ),
+    ]
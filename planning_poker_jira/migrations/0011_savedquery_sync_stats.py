@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0010_importjob_atomic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedquery',
+            name='last_sync_duration',
+            field=models.DurationField(blank=True, editable=False, null=True, verbose_name='Duration of the Last Synchronization'),
+        ),
+        migrations.AddField(
+            model_name='savedquery',
+            name='last_sync_error',
+            field=models.TextField(blank=True, editable=False, verbose_name='Synchronization Error'),
+        ),
+        migrations.AddField(
+            model_name='savedquery',
+            name='last_sync_num_imported',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Created Stories'),
+        ),
+        migrations.AddField(
+            model_name='savedquery',
+            name='last_sync_num_removed',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Removed Stories'),
+        ),
+        migrations.AddField(
+            model_name='savedquery',
+            name='last_sync_num_updated',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Updated Stories'),
+        ),
+    ]
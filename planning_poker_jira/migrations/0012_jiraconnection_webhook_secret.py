@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:30
+
+import encrypted_fields.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker_jira', '0011_savedquery_sync_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jiraconnection',
+            name='webhook_secret',
+            field=encrypted_fields.fields.EncryptedCharField(blank=True, help_text='The secret the Jira backend has to send along with its webhooks. Leave this empty in order to reject all webhooks', max_length=200, verbose_name='Webhook Secret'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning_poker', '0001_initial'),
+        ('planning_poker_jira', '0013_jiraconnection_num_workers_help_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingIssueChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issue_key', models.CharField(max_length=200, verbose_name='Issue Key')),
+                ('event', models.CharField(max_length=50, verbose_name='Event')),
+                ('issue', models.TextField(verbose_name='Issue')),
+                ('timestamp', models.BigIntegerField(default=0, verbose_name='Timestamp')),
+                ('description_changed', models.BooleanField(default=False, verbose_name='Description Changed')),
+                ('received_at', models.DateTimeField(auto_now=True, verbose_name='Received at')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_issue_changes', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+            ],
+            options={
+                'verbose_name': 'Pending Issue Change',
+                'verbose_name_plural': 'Pending Issue Changes',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportedStory',
+            fields=[
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='jira_import', serialize=False, to='planning_poker.story', verbose_name='Story')),
+                ('connection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imported_stories', to='planning_poker_jira.jiraconnection', verbose_name='Jira Connection')),
+            ],
+            options={
+                'verbose_name': 'Imported Story',
+                'verbose_name_plural': 'Imported Stories',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pendingissuechange',
+            constraint=models.UniqueConstraint(fields=('connection', 'issue_key'), name='Only the latest change of each issue is kept.'),
+        ),
+    ]
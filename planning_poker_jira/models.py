@@ -1,17 +1,197 @@
 # -*- coding: utf-8 -*
+import functools
+import hashlib
+import itertools
+import json
 import logging
-from typing import List, Optional
+import math
+import warnings
+from datetime import datetime, timedelta
+from typing import (Any, Callable, Collection, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Sequence,
+                    Tuple, Union)
+from urllib.parse import quote
 
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from encrypted_fields import fields
-from jira import JIRA
+from jira import JIRA, Issue, JIRAError
+from jira.client import ResultList
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException
 
 from planning_poker.models import PokerSession, Story
 
+from .clients import DEFAULT_HEADERS, CircuitBreaker, LazyClient, client_pool, get_credentials_fingerprint, search_cache
+from .utils import (add_jql_condition, format_jql_list, get_error_text, map_concurrently, send_progress_event,
+                    send_story_changed_event, split_jql_queries)
+
 logger = logging.getLogger(__name__)
 
+#: The story points which can be assigned to a story.
+STORY_POINTS_CHOICES = frozenset(value for value, label in Story._meta.get_field('story_points').choices
+                                 if value is not None)
+
+
+class DescriptionFormat(models.TextChoices):
+    """The formats in which the descriptions of the issues can be imported."""
+    #: The HTML rendered by the jira backend. Rendering is the most expensive part of the search for long descriptions.
+    RENDERED = 'rendered', _('Rendered HTML')
+    #: The description's raw markup as it was entered into the jira backend.
+    RAW = 'raw', _('Raw markup')
+    #: Don't import the description at all.
+    NONE = 'none', _('Summary only')
+    #: Import the summary only and load the rendered HTML once the story is actually needed.
+    LAZY = 'lazy', _('Rendered HTML on demand')
+
+
+class IssueRecord:
+    """Compact representation of an issue returned by the search which only holds the fields that are imported.
+
+    The records are created straight from the JSON returned by the jira backend, which is considerably cheaper than
+    creating a full `jira.Issue` resource for each issue.
+    """
+    __slots__ = ('key', 'summary', 'description', 'story_points')
+
+    def __init__(self, key: str, summary: str, description: str = '', story_points: Optional[int] = None):
+        self.key = key
+        self.summary = summary
+        self.description = description
+        self.story_points = story_points
+
+
+class FieldProjection(NamedTuple):
+    """Determines which fields are requested from the jira backend and how they are stored in the stories."""
+    #: The format in which the description should be imported. One of the `DescriptionFormat` values.
+    description_format: str = DescriptionFormat.RENDERED
+    #: The name of the field which contains the story points or `None` if the story points shouldn't be imported.
+    story_points_field: Optional[str] = None
+
+    @property
+    def fields(self) -> List[str]:
+        """The fields which have to be requested from the jira backend."""
+        fields = ['summary']
+        if self.description_format in (DescriptionFormat.RENDERED, DescriptionFormat.RAW):
+            fields.append('description')
+        if self.story_points_field:
+            fields.append(self.story_points_field)
+        return fields
+
+    @property
+    def expand(self) -> Optional[str]:
+        """The value of the ``expand`` parameter which has to be sent to the jira backend."""
+        return 'renderedFields' if self.description_format == DescriptionFormat.RENDERED else None
+
+    @property
+    def story_fields(self) -> List[str]:
+        """The names of the story's fields which are filled with the data of the jira backend."""
+        story_fields = ['title']
+        if self.description_format in (DescriptionFormat.RENDERED, DescriptionFormat.RAW):
+            story_fields.append('description')
+        if self.story_points_field:
+            story_fields.append('story_points')
+        return story_fields
+
+    @property
+    def defers_description(self) -> bool:
+        """Whether the descriptions are loaded later on (see `load_deferred_descriptions()`)."""
+        return self.description_format == DescriptionFormat.LAZY
+
+    def create_record(self, raw_issue: Dict[str, Any]) -> IssueRecord:
+        """Create a record from the JSON of an issue which was requested with this projection.
+
+        :param raw_issue: The JSON of the issue as returned by the jira backend.
+        :return: The record containing the projected fields.
+        """
+        fields = raw_issue.get('fields') or {}
+        if self.description_format == DescriptionFormat.RENDERED:
+            description = (raw_issue.get('renderedFields') or {}).get('description')
+        elif self.description_format == DescriptionFormat.RAW:
+            description = fields.get('description')
+        else:
+            description = ''
+        story_points = fields.get(self.story_points_field) if self.story_points_field else None
+        return IssueRecord(raw_issue['key'], fields.get('summary') or '', description or '',
+                           self._convert_story_points(raw_issue['key'], story_points))
+
+    @staticmethod
+    def _convert_story_points(key: str, story_points: Any) -> Optional[int]:
+        if story_points is None:
+            return None
+        try:
+            number = float(story_points)
+        except (TypeError, ValueError):
+            number = math.nan
+        # Anything else would be truncated or rejected by the story, e.g. 0.5 or 4 story points.
+        if number.is_integer() and int(number) in STORY_POINTS_CHOICES:
+            return int(number)
+        logger.warning('The story points "%s" of "%s" are not one of the available story points and were skipped.',
+                       story_points, key)
+        return None
+
+    def create_page(self, search_result: Dict[str, Any]) -> ResultList:
+        """Create the records for a page of search results.
+
+        :param search_result: The JSON returned by the search of the jira backend.
+        :return: A `ResultList` containing a record for each issue. The pagination attributes are taken from the
+                 search result.
+        """
+        return ResultList([self.create_record(raw_issue) for raw_issue in search_result.get('issues', [])],
+                          search_result.get('startAt', 0), search_result.get('maxResults', 0),
+                          search_result.get('total', 0), search_result.get('isLast'))
+
+    def create_story(self, issue: Union[IssueRecord, Issue], **kwargs) -> Story:
+        """Create an unsaved story from the given issue.
+
+        :param issue: The record or the issue resource which was requested with this projection.
+        :param kwargs: Additional keyword arguments which will be passed to the story's constructor.
+        :return: The story containing the issue's data.
+        """
+        if isinstance(issue, Issue):
+            issue = self.create_record(issue.raw)
+        if self.story_points_field:
+            kwargs['story_points'] = issue.story_points
+        return Story(ticket_number=issue.key, title=issue.summary, description=issue.description, **kwargs)
+
+
+class ImportResult(NamedTuple):
+    """The outcome of importing stories from a jira backend."""
+    #: The number of stories which were created.
+    num_imported: int
+    #: The total number of issues the jira backend reported to match the query.
+    total: int
+    #: The number of existing stories which were updated with the current data of their issues.
+    num_updated: int = 0
+    #: The number of stories which were removed from the poker session because their issues no longer match the query.
+    num_removed: int = 0
+
+
+class IssuePreview(NamedTuple):
+    """A page of the issues matching a query which is shown before the issues are imported."""
+    #: The total number of issues matching the query.
+    total: int
+    #: The number of the page, starting at ``1``.
+    page: int
+    #: The maximum number of issues per page.
+    page_size: int
+    #: A list containing tuples with the key and the summary of each issue on the page.
+    issues: List[Tuple[str, str]]
+
+    @property
+    def num_pages(self) -> int:
+        return max(math.ceil(self.total / self.page_size), 1)
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 1
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.num_pages
+
 
 class JiraConnection(models.Model):
     #: Used solely for displaying the Jira Connection to the user.
@@ -24,6 +204,75 @@ class JiraConnection(models.Model):
     password = fields.EncryptedCharField(verbose_name=_('Password'), max_length=200, blank=True)
     #: The name of the field the Jira backend uses to store the story points.
     story_points_field = models.CharField(verbose_name=_('Story Points Field'), max_length=200)
+    #: The number of hosts for which urllib3 keeps a connection pool.
+    pool_connections = models.PositiveSmallIntegerField(
+        verbose_name=_('Connection Pools'),
+        help_text=_('The number of hosts for which connections are kept open'),
+        default=10
+    )
+    #: The maximum number of connections which are kept open for each host.
+    pool_maxsize = models.PositiveSmallIntegerField(
+        verbose_name=_('Connection Pool Size'),
+        help_text=_('The maximum number of connections which are kept open for each host. This should be at least as '
+                    'high as the number of parallel requests to the Jira backend'),
+        default=10
+    )
+    #: Whether the connections to the Jira backend should be kept open between requests.
+    keep_alive = models.BooleanField(
+        verbose_name=_('Keep-Alive'),
+        help_text=_('Reuse the connections to the Jira backend instead of opening a new one for each request'),
+        default=True
+    )
+    #: Whether the Jira backend should be asked to compress its responses.
+    compression = models.BooleanField(
+        verbose_name=_('Compression'),
+        help_text=_('Ask the Jira backend to compress its responses'),
+        default=True
+    )
+    #: Optional: The URL of the HTTP proxy through which all requests should be sent.
+    proxy_url = models.CharField(
+        verbose_name=_('Proxy URL'),
+        help_text=_('The HTTP proxy through which all requests to the Jira backend should be sent'),
+        max_length=200,
+        blank=True
+    )
+
+    #: The maximum number of requests which are sent to the Jira backend at the same time.
+    num_workers = models.PositiveSmallIntegerField(
+        verbose_name=_('Parallel Requests'),
+        help_text=_('The maximum number of requests which are sent to the Jira backend at the same time, e.g. for '
+                    'fetching the pages of large imports or exporting story points'),
+        default=4,
+        validators=[MinValueValidator(1)]
+    )
+
+    #: The format in which the descriptions of the issues are imported.
+    description_format = models.CharField(
+        verbose_name=_('Description Format'),
+        help_text=_('Importing the rendered HTML takes the Jira backend considerably longer than importing the raw '
+                    'markup. Importing only the summary is the fastest option'),
+        max_length=20,
+        choices=DescriptionFormat.choices,
+        default=DescriptionFormat.RENDERED
+    )
+    #: Whether the story points should be imported from the `story_points_field`.
+    import_story_points = models.BooleanField(
+        verbose_name=_('Import Story Points'),
+        help_text=_('Import the story points which are already stored in the Jira backend'),
+        default=False
+    )
+
+    #: The shared secret which authenticates the webhooks of the Jira backend. Webhooks are rejected while it is empty.
+    webhook_secret = fields.EncryptedCharField(
+        verbose_name=_('Webhook Secret'),
+        help_text=_('The secret the Jira backend has to send along with its webhooks. Leave this empty in order to '
+                    'reject all webhooks'),
+        max_length=200,
+        blank=True
+    )
+
+    #: The names of the fields which configure the HTTP transport between the client and the Jira backend.
+    TRANSPORT_FIELDS = ('pool_connections', 'pool_maxsize', 'keep_alive', 'compression', 'proxy_url')
 
     class Meta:
         verbose_name = _('Jira Connection')
@@ -32,31 +281,1036 @@ class JiraConnection(models.Model):
     def __str__(self) -> str:
         return self.label or self.api_url
 
-    def get_client(self) -> JIRA:
-        """Authenticate at the jira backend and return a client to communicate with it."""
-        return JIRA(self.api_url, basic_auth=(self.username, self.password),
-                    timeout=getattr(settings, 'JIRA_TIMEOUT', (3.05, 7)),
-                    max_retries=getattr(settings, 'JIRA_NUM_RETRIES', 0))
+    def get_client(self, verify: bool = True) -> JIRA:
+        """Return a client to communicate with the jira backend.
+
+        The clients are shared across the whole process through the `client_pool`, so only the first call for each set
+        of credentials has to authenticate at the jira backend.
+
+        :param verify: Whether the credentials should be verified right away. If this is `False`, a `LazyClient` is
+                       returned which doesn't communicate with the jira backend until its first real operation and
+                       raises any authentication errors then. The `JIRA` client still requests the list of fields
+                       while it is created, so only the server info request is skipped. These clients don't know the
+                       version of the jira backend, so they are pooled separately from the verified ones.
+        :return: A client which can be used to communicate with the jira backend.
+        """
+        if verify:
+            return client_pool.get(self.get_client_key(), self._create_client)
+        return LazyClient(lambda: client_pool.get((*self.get_client_key(), 'unverified'),
+                                                  lambda: self._create_client(get_server_info=False)))
+
+    def get_client_key(self) -> Hashable:
+        """Return the key which identifies this connection's client inside the `client_pool`.
+
+        :return: A tuple containing the API URL, the username, a fingerprint of the credentials and the transport
+                 options.
+        """
+        return (self.api_url, self.username, get_credentials_fingerprint(self.username, self.password),
+                *self.get_transport_options().values())
+
+    def get_transport_options(self) -> Dict[str, Any]:
+        """Return the options which configure the HTTP transport between the client and the jira backend.
+
+        :return: A dictionary containing the value for each of the `TRANSPORT_FIELDS`.
+        """
+        return {field: getattr(self, field) for field in self.TRANSPORT_FIELDS}
+
+    def get_circuit_breaker(self) -> CircuitBreaker:
+        """Return the circuit breaker which guards all the requests to this connection's jira backend.
+
+        :return: A `CircuitBreaker` whose state is shared by all connections with the same API URL.
+        """
+        return CircuitBreaker(self.api_url)
+
+    def _create_client(self, get_server_info: bool = True) -> JIRA:
+        """Authenticate at the jira backend and return a new client to communicate with it.
+
+        :param get_server_info: Whether the client should request the server info during its initialization.
+        :return: The newly created client.
+        """
+        headers = {
+            **DEFAULT_HEADERS,
+            'Accept-Encoding': 'gzip, deflate' if self.compression else 'identity',
+            'Connection': 'keep-alive' if self.keep_alive else 'close',
+        }
+        circuit_breaker = self.get_circuit_breaker()
+        client = circuit_breaker.call(
+            JIRA, self.api_url, options={'headers': headers}, basic_auth=(self.username, self.password),
+            get_server_info=get_server_info, timeout=getattr(settings, 'JIRA_TIMEOUT', (3.05, 7)),
+            max_retries=getattr(settings, 'JIRA_NUM_RETRIES', 0),
+            proxies={'http': self.proxy_url, 'https': self.proxy_url} if self.proxy_url else None
+        )
+        circuit_breaker.guard(client._session)
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        client._session.mount('http://', adapter)
+        client._session.mount('https://', adapter)
+        return client
+
+    def get_field_projection(self, description_format: Optional[str] = None,
+                             import_story_points: Optional[bool] = None) -> FieldProjection:
+        """Return the projection which determines the fields that are imported from the jira backend.
+
+        :param description_format: Overrides the connection's `description_format`. Optional.
+        :param import_story_points: Overrides the connection's `import_story_points` setting. Optional.
+        :return: The field projection.
+        """
+        if import_story_points is None:
+            import_story_points = self.import_story_points
+        return FieldProjection(description_format or self.description_format,
+                               self.story_points_field if import_story_points else None)
 
-    def create_stories(self, query_string: str, poker_session: Optional[PokerSession] = None,
-                       client: Optional[JIRA] = None) -> List[Story]:
+    def create_stories(self, query_string: Union[str, Sequence[str]], poker_session: Optional[PokerSession] = None,
+                       client: Optional[JIRA] = None, projection: Optional[FieldProjection] = None,
+                       upsert: bool = False, progress_callback: Optional[Callable[[ImportResult], None]] = None,
+                       use_cache: bool = False, atomic: bool = False, page_size: Optional[int] = None,
+                       batch_size: Optional[int] = None) -> ImportResult:
         """Fetch issues from the Jira client with the given query string and add them to the poker session.
 
-        :param query_string: The string which should be used to query the stories.
+        The issues are fetched page by page (see `iter_issue_pages()`) and the stories for each page are inserted
+        before the next page is requested. This keeps the memory usage flat regardless of the number of issues.
+
+        :param query_string: The string which should be used to query the stories or a list of such strings. The
+                             issues of multiple queries are added in the order of the queries and issues which were
+                             already returned by a previous query are skipped.
         :param poker_session: The poker session to which the stories should be added.
         :param client: The jira client which should be used to import the stories. Optional.
-        :return: A list containing the created stories.
+        :param projection: Determines which fields should be imported. Defaults to the connection's settings.
+        :param upsert: Whether the stories of the poker session which have the ticket number of an issue should be
+                       updated instead of adding a duplicate story for the issue.
+        :param progress_callback: Called with the intermediate result after the stories of each page were stored.
+                                  Optional.
+        :param use_cache: Whether the pages of the search results should be taken from the `search_cache` if possible.
+        :param atomic: Whether the whole import should run in a single transaction, so either all or none of the
+                       stories are stored. The poker session stays locked until the import is finished and any progress
+                       only becomes visible to other database connections at the end.
+        :param page_size: The number of issues which should be requested for each page. Defaults to the
+                          ``JIRA_PAGE_SIZE`` setting.
+        :param batch_size: The number of stories which are inserted or updated at once. Defaults to the
+                           ``JIRA_BULK_CREATE_BATCH_SIZE`` setting.
+        :return: The number of imported and updated stories and the total number of issues the jira backend reported.
+        """
+        if atomic:
+            with transaction.atomic():
+                return self.create_stories(query_string, poker_session, client, projection, upsert, progress_callback,
+                                           use_cache, page_size=page_size, batch_size=batch_size)
+        projection = projection or self.get_field_projection()
+        num_imported = num_updated = total = 0
+        for issues, total in self._iter_unique_issues(query_string, client, projection, use_cache, page_size):
+            created, updated = self._import_page(issues, projection, poker_session, upsert, batch_size)
+            num_imported += created
+            num_updated += updated
+            if progress_callback:
+                progress_callback(ImportResult(num_imported, total, num_updated))
+        return ImportResult(num_imported, total, num_updated)
+
+    def _iter_unique_issues(self, query_string: Union[str, Sequence[str]], client: Optional[JIRA] = None,
+                            projection: Optional[FieldProjection] = None, use_cache: bool = False,
+                            page_size: Optional[int] = None) -> Iterator[Tuple[List[IssueRecord], int]]:
+        """Fetch the issues matching the given queries page by page and skip the ones a previous query already returned.
+
+        The queries are run one after the other with `iter_issue_pages()`, so the pages of each query are fetched
+        concurrently and only a bounded number of pages is held in memory at any time.
+
+        :param query_string: The string which should be used to query the stories or a list of such strings.
+        :param client: The jira client which should be used to fetch the issues. Optional.
+        :param projection: Determines which fields should be requested. Defaults to the connection's settings.
+        :param use_cache: Whether the pages should be taken from and stored in the `search_cache`.
+        :param page_size: The number of issues which should be requested for each page. Optional.
+        :return: An iterator which yields a tuple for each page. It contains the issues of the page which were not
+                 returned before and the total number of distinct issues known so far.
+        """
+        queries = [query_string] if isinstance(query_string, str) else list(query_string)
+        client = client or self.get_client()
+        pages = ((index, page) for index, query in enumerate(queries)
+                 for page in self.iter_issue_pages(query, client, page_size, projection, use_cache))
+        totals = {}
+        seen_keys = set()
+        num_duplicates = 0
+        for index, page in pages:
+            totals.setdefault(index, page.total)
+            issues = []
+            for issue in page:
+                if issue.key in seen_keys:
+                    num_duplicates += 1
+                else:
+                    seen_keys.add(issue.key)
+                    issues.append(issue)
+            yield issues, sum(totals.values()) - num_duplicates
+
+    def iter_issue_pages(self, query_string: str, client: Optional[JIRA] = None, page_size: Optional[int] = None,
+                         projection: Optional[FieldProjection] = None, use_cache: bool = False,
+                         num_workers: Optional[int] = None) -> Iterator[ResultList]:
+        """Fetch the issues matching the given query string from the jira backend page by page.
+
+        The first page is fetched on its own in order to learn the total number of issues. The remaining pages are
+        fetched concurrently by up to `num_workers` threads but are still yielded in the order of the query.
+
+        :param query_string: The string which should be used to query the stories.
+        :param client: The jira client which should be used to fetch the issues. Optional.
+        :param page_size: The number of issues which should be requested for each page. Defaults to the
+                          ``JIRA_PAGE_SIZE`` setting. The jira backend may return less issues per page.
+        :param projection: Determines which fields should be requested. Defaults to the connection's settings.
+        :param use_cache: Whether the pages should be taken from and stored in the `search_cache`.
+        :param num_workers: The maximum number of pages which are fetched at the same time. Defaults to the
+                            connection's `num_workers`.
+        :return: An iterator which yields a `ResultList` containing an `IssueRecord` for each issue of a page. Its
+                 `total` attribute contains the total number of issues matching the query.
         """
+        client = client or self.get_client()
+        page_size = page_size or getattr(settings, 'JIRA_PAGE_SIZE', 100)
+        projection = projection or self.get_field_projection()
+        search_kwargs = {'jql_str': query_string, 'expand': projection.expand, 'fields': projection.fields}
+        if use_cache:
+            search_json = functools.partial(search_cache.search_issues, client, self.api_url)
+        else:
+            search_json = functools.partial(client.search_issues, json_result=True)
 
-        results = (client or self.get_client()).search_issues(
-            jql_str=query_string,
-            expand='renderedFields',
-            fields=['summary', 'description']
+        def search_issues(**kwargs) -> ResultList:
+            # The JSON is mapped to records right away instead of creating a full resource for each issue.
+            return projection.create_page(search_json(**kwargs))
+
+        first_page = search_issues(startAt=0, maxResults=page_size, **search_kwargs)
+        if not first_page:
+            return
+        yield first_page
+        # The jira backend caps the page size (e.g. 100 for Jira Cloud), so the remaining pages are requested with the
+        # size it actually used.
+        page_size = min(page_size, first_page.maxResults or page_size)
+        pages = map_concurrently(
+            lambda start_at: search_issues(startAt=start_at, maxResults=page_size, **search_kwargs),
+            range(len(first_page), first_page.total, page_size),
+            num_workers or self.num_workers
         )
-        order_start = getattr(poker_session.stories.last(), '_order', -1) + 1 if poker_session else 0
-        stories = [Story(
-            ticket_number=story.key, title=story.fields.summary,
-            description=story.renderedFields.description, poker_session=poker_session,
-            _order=index
-        ) for index, story in enumerate(results, start=order_start)]
-        return Story.objects.bulk_create(stories)
+        # Issues which were deleted in the meantime can leave the last pages empty.
+        yield from (page for page in pages if page)
+
+    def count_issues(self, query_string: str, client: Optional[JIRA] = None) -> int:
+        """Determine the number of issues matching the given query string without fetching any of them.
+
+        :param query_string: The string which should be used to query the issues.
+        :param client: The jira client which should be used. Optional.
+        :return: The total number of issues the jira backend reported to match the query.
+        """
+        client = client or self.get_client()
+        with warnings.catch_warnings():
+            # The client warns that it can't fetch all the issues at once, which is exactly what is not intended here.
+            warnings.simplefilter('ignore')
+            return client.search_issues(query_string, maxResults=0, fields=['key'], json_result=True)['total']
+
+    def preview_issues(self, query_string: str, client: Optional[JIRA] = None, page: int = 1,
+                       page_size: Optional[int] = None) -> IssuePreview:
+        """List the keys and the summaries of the issues matching the given query string page by page.
+
+        The total is determined by a separate `count_issues()` request first, so queries which don't match anything
+        only cost a single cheap request.
+
+        :param query_string: The string which should be used to query the issues.
+        :param client: The jira client which should be used. Optional.
+        :param page: The number of the page which should be listed, starting at ``1``.
+        :param page_size: The number of issues per page. Defaults to the ``JIRA_PREVIEW_PAGE_SIZE`` setting.
+        :return: The preview of the requested page.
+        """
+        client = client or self.get_client()
+        page_size = page_size or getattr(settings, 'JIRA_PREVIEW_PAGE_SIZE', 50)
+        total = self.count_issues(query_string, client)
+        page = min(max(page, 1), max(math.ceil(total / page_size), 1))
+        issues = []
+        if total:
+            issues = [(issue.key, issue.fields.summary) for issue in client.search_issues(
+                query_string, startAt=(page - 1) * page_size, maxResults=page_size, fields=['summary']
+            )]
+        return IssuePreview(total, page, page_size, issues)
+
+    def _get_order_start(self, poker_session: Optional[PokerSession] = None) -> int:
+        """Return the `_order` value the next story added to the poker session should get.
+
+        The poker session's row is locked until the end of the current transaction, so this has to be called inside the
+        transaction which inserts the stories. Concurrent imports into the same poker session wait for each other
+        instead of allocating the same values.
+
+        :param poker_session: The poker session to which the stories should be added.
+        :return: The order of the first story which will be imported.
+        """
+        if poker_session is not None:
+            list(PokerSession.objects.select_for_update().filter(pk=poker_session.pk).values_list('pk'))
+        max_order = Story.objects.filter(poker_session=poker_session).aggregate(max_order=models.Max('_order'))
+        return (max_order['max_order'] if max_order['max_order'] is not None else -1) + 1
+
+    def _get_batch_size(self) -> int:
+        return getattr(settings, 'JIRA_BULK_CREATE_BATCH_SIZE', 500)
+
+    def _store_stories(self, issues: Iterable[IssueRecord], projection: FieldProjection,
+                       poker_session: Optional[PokerSession] = None, batch_size: Optional[int] = None) -> int:
+        """Create a story for each of the given issues and append them to the poker session.
+
+        The stories are created lazily and inserted in batches of ``JIRA_BULK_CREATE_BATCH_SIZE`` stories, so no more
+        than a single batch of stories is kept in memory. All the batches are inserted in the same transaction.
+
+        :param issues: The records of the issues from which the stories should be created.
+        :param projection: The projection which was used to request the issues.
+        :param poker_session: The poker session to which the stories should be added.
+        :param batch_size: Overrides the ``JIRA_BULK_CREATE_BATCH_SIZE`` setting. Optional.
+        :return: The number of created stories.
+        """
+        issues = iter(issues)
+        batch_size = batch_size or self._get_batch_size()
+        batch = list(itertools.islice(issues, batch_size))
+        if not batch:
+            return 0
+        num_stored = 0
+        with transaction.atomic():
+            order = self._get_order_start(poker_session)
+            while batch:
+                stories = Story.objects.bulk_create([
+                    projection.create_story(issue, poker_session=poker_session, _order=index)
+                    for index, issue in enumerate(batch, start=order)
+                ], batch_size=batch_size)
+                self._link_stories(stories, poker_session)
+                if projection.defers_description:
+                    self._defer_descriptions(stories, poker_session)
+                order += len(stories)
+                num_stored += len(stories)
+                batch = list(itertools.islice(issues, batch_size))
+        return num_stored
+
+    def _import_page(self, issues: Iterable[IssueRecord], projection: FieldProjection,
+                     poker_session: Optional[PokerSession] = None, upsert: bool = False,
+                     batch_size: Optional[int] = None) -> Tuple[int, int]:
+        """Store the stories for a single page of issues.
+
+        :param issues: The records of the issues from which the stories should be created.
+        :param projection: The projection which was used to request the issues.
+        :param poker_session: The poker session to which the stories should be added.
+        :param upsert: Whether existing stories of the poker session should be updated instead of being duplicated.
+        :param batch_size: Overrides the ``JIRA_BULK_CREATE_BATCH_SIZE`` setting. Optional.
+        :return: A tuple containing the number of created and the number of updated stories.
+        """
+        if upsert:
+            return self._upsert_stories(issues, projection, poker_session, batch_size)
+        return self._store_stories(issues, projection, poker_session, batch_size), 0
+
+    def _upsert_stories(self, issues: Iterable[IssueRecord], projection: FieldProjection,
+                        poker_session: Optional[PokerSession] = None,
+                        batch_size: Optional[int] = None) -> Tuple[int, int]:
+        """Update the stories of the poker session which belong to the given issues and create stories for the others.
+
+        The existing stories are loaded with a single query and only those whose data actually changed are updated.
+
+        :param issues: The records of the issues from which the stories should be created or updated.
+        :param projection: The projection which was used to request the issues.
+        :param poker_session: The poker session whose stories should be updated and to which new stories are added.
+        :param batch_size: Overrides the ``JIRA_BULK_CREATE_BATCH_SIZE`` setting. Optional.
+        :return: A tuple containing the number of created and the number of updated stories.
+        """
+        batch_size = batch_size or self._get_batch_size()
+        issues = list(issues)
+        existing_stories = {
+            story.ticket_number: story
+            for story in Story.objects.filter(poker_session=poker_session,
+                                              ticket_number__in=[issue.key for issue in issues]).select_related(
+                'jira_import'
+            )
+        }
+        new_issues = []
+        changed_stories = []
+        for issue in issues:
+            story = existing_stories.get(issue.key)
+            if story is None:
+                new_issues.append(issue)
+            elif self._update_story(story, issue, projection):
+                changed_stories.append(story)
+        with transaction.atomic():
+            # Stories which were imported before they were linked to their connection get linked by the next upsert.
+            unlinked_stories = [story for story in existing_stories.values() if not hasattr(story, 'jira_import')]
+            if unlinked_stories:
+                self._link_stories(unlinked_stories, poker_session)
+            if changed_stories:
+                Story.objects.bulk_update(changed_stories, projection.story_fields, batch_size=batch_size)
+                if projection.defers_description:
+                    # The description may have changed along with the other fields.
+                    cache.delete_many([self._get_description_cache_key(story.ticket_number)
+                                       for story in changed_stories])
+                    self._defer_descriptions(changed_stories, poker_session)
+            return self._store_stories(new_issues, projection, poker_session, batch_size), len(changed_stories)
+
+    @staticmethod
+    def _update_story(story: Story, issue: IssueRecord, projection: FieldProjection) -> bool:
+        """Copy the projected fields of the issue to the story without saving it.
+
+        :param story: The story which should be updated.
+        :param issue: The record of the story's issue.
+        :param projection: The projection which was used to request the issue.
+        :return: Whether any of the story's fields changed.
+        """
+        current_story = projection.create_story(issue)
+        changed = False
+        for field in projection.story_fields:
+            if getattr(story, field) != getattr(current_story, field):
+                setattr(story, field, getattr(current_story, field))
+                changed = True
+        return changed
+
+    def apply_issue_changes(self, updated_issues: Iterable[Dict[str, Any]], deleted_keys: Iterable[str] = (),
+                            changed_description_keys: Collection[str] = ()) -> Tuple[int, int]:
+        """Apply the changes which the webhooks of the jira backend reported to the stories of the changed issues.
+
+        The stories which were imported from this connection are matched by their ticket number regardless of their
+        poker session. The webhooks only contain the raw fields of the issues, so descriptions which are imported as
+        rendered HTML are loaded on demand (see `DescriptionFormat.LAZY`) once they changed.
+
+        :param updated_issues: The JSON of the issues which were updated.
+        :param deleted_keys: The keys of the issues which were deleted. Their stories are removed from their poker
+                             sessions but are kept, so their votes don't get lost.
+        :param changed_description_keys: The keys of the updated issues whose description changed.
+        :return: A tuple containing the number of updated and the number of removed stories.
+        """
+        projection = self.get_field_projection()
+        if projection.description_format == DescriptionFormat.RENDERED:
+            projection = projection._replace(description_format=DescriptionFormat.LAZY)
+        issues = {issue['key']: projection.create_record(issue) for issue in updated_issues}
+        keys = list(issues)
+        batch_size = self._get_batch_size()
+        imported_stories = Story.objects.filter(jira_import__connection=self)
+        changed_stories = []
+        deferred_stories = []
+        for start in range(0, len(keys), batch_size):
+            for story in imported_stories.filter(ticket_number__in=keys[start:start + batch_size]):
+                if self._update_story(story, issues[story.ticket_number], projection):
+                    changed_stories.append(story)
+                if projection.defers_description and story.ticket_number in changed_description_keys:
+                    deferred_stories.append(story)
+        removed_story_ids = list(imported_stories.filter(ticket_number__in=list(deleted_keys))
+                                 .exclude(poker_session=None).values_list('id', flat=True))
+        with transaction.atomic():
+            Story.objects.bulk_update(changed_stories, projection.story_fields, batch_size=batch_size)
+            if deferred_stories:
+                cache.delete_many([self._get_description_cache_key(story.ticket_number)
+                                   for story in deferred_stories])
+                self._defer_descriptions(deferred_stories)
+            PokerSession.objects.filter(active_story__in=removed_story_ids).update(active_story=None)
+            num_removed = Story.objects.filter(id__in=removed_story_ids).update(poker_session=None)
+        return len(changed_stories), num_removed
+
+    def _defer_descriptions(self, stories: List[Story], poker_session: Optional[PokerSession] = None):
+        """Remember that the descriptions of the given stories have to be loaded from this connection.
+
+        :param stories: The saved stories.
+        :param poker_session: The poker session to which the stories belong.
+        """
+        self._fetch_story_ids(stories, poker_session)
+        DeferredDescription.objects.bulk_create(
+            [DeferredDescription(story=story, connection=self) for story in stories if story.pk is not None],
+            ignore_conflicts=True
+        )
+
+    def _link_stories(self, stories: List[Story], poker_session: Optional[PokerSession] = None):
+        """Remember that the given stories were imported from this connection.
+
+        Only the linked stories are changed by the webhooks of the connection's jira backend, since the issues of
+        different jira backends may have the same keys.
+
+        :param stories: The saved stories.
+        :param poker_session: The poker session to which the stories belong.
+        """
+        self._fetch_story_ids(stories, poker_session)
+        ImportedStory.objects.bulk_create(
+            [ImportedStory(story=story, connection=self) for story in stories if story.pk is not None],
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def _fetch_story_ids(stories: List[Story], poker_session: Optional[PokerSession] = None):
+        """Set the primary keys of the given stories if they were not set by `bulk_create()`.
+
+        :param stories: The saved stories.
+        :param poker_session: The poker session to which the stories belong.
+        """
+        if any(story.pk is None for story in stories):
+            # Only some database backends return the primary keys from `bulk_create()`.
+            story_ids = {
+                (ticket_number, order): story_id for story_id, ticket_number, order in Story.objects.filter(
+                    poker_session=poker_session, ticket_number__in=[story.ticket_number for story in stories]
+                ).values_list('id', 'ticket_number', '_order')
+            }
+            for story in stories:
+                story.pk = story.pk or story_ids.get((story.ticket_number, story._order))
+
+    def _get_description_cache_key(self, ticket_number: str) -> str:
+        # The rendered description depends on what the credentials are allowed to see.
+        api_url_hash = hashlib.sha256(self.api_url.encode()).hexdigest()
+        return 'planning_poker_jira:description:{}:{}:{}'.format(
+            api_url_hash, get_credentials_fingerprint(self.username, self.password), ticket_number
+        )
+
+    def load_descriptions(self, stories: Iterable[Story], client: Optional[JIRA] = None) -> int:
+        """Load the rendered descriptions of the given stories from the cache or the jira backend and save them.
+
+        The descriptions which are not cached are requested together with up to ``JIRA_PAGE_SIZE`` issues per request.
+        They are kept in Django's cache for ``JIRA_DESCRIPTION_CACHE_TTL`` seconds.
+
+        :param stories: The stories whose descriptions should be loaded.
+        :param client: The jira client which should be used to fetch the descriptions. It has to use the connection's
+                       credentials since the descriptions are cached for them. Optional.
+        :return: The number of stories whose descriptions were loaded.
+        """
+        stories = list(stories)
+        cache_keys = {self._get_description_cache_key(story.ticket_number): story.ticket_number for story in stories}
+        descriptions = {cache_keys[cache_key]: description
+                        for cache_key, description in cache.get_many(list(cache_keys)).items()}
+        missing_keys = sorted({story.ticket_number for story in stories} - set(descriptions))
+        if missing_keys:
+            client = client or self.get_client()
+            page_size = getattr(settings, 'JIRA_PAGE_SIZE', 100)
+            projection = FieldProjection(DescriptionFormat.RENDERED)
+            pages = map_concurrently(
+                lambda keys: projection.create_page(client.search_issues(
+                    'key in {}'.format(format_jql_list(keys)), maxResults=len(keys),
+                    fields=['description'], expand='renderedFields', validate_query=False, json_result=True
+                )),
+                [missing_keys[start:start + page_size] for start in range(0, len(missing_keys), page_size)],
+                self.num_workers
+            )
+            fetched_descriptions = {issue.key: issue.description for page in pages for issue in page}
+            cache.set_many({self._get_description_cache_key(key): description
+                            for key, description in fetched_descriptions.items()},
+                           timeout=getattr(settings, 'JIRA_DESCRIPTION_CACHE_TTL', 3600))
+            descriptions.update(fetched_descriptions)
+        loaded_stories = []
+        for story in stories:
+            if story.ticket_number in descriptions:
+                story.description = descriptions[story.ticket_number]
+                loaded_stories.append(story)
+        Story.objects.bulk_update(loaded_stories, ['description'])
+        # Issues which were deleted in the meantime have no description to load.
+        DeferredDescription.objects.filter(story__in=stories).delete()
+        return len(loaded_stories)
+
+    def export_story_points(
+        self, stories: Iterable[Story], client: Optional[JIRA] = None,
+        progress_callback: Optional[Callable[[Story, Optional[Exception]], None]] = None
+    ) -> List[Tuple[Story, Optional[Exception]]]:
+        """Send the story points of the given stories to the jira backend.
+
+        The stories are exported concurrently by up to `num_workers` threads. The export continues if a single story
+        can not be exported. Check the returned list for any errors.
+
+        :param stories: The stories whose story points should be exported. The iterable is consumed by the calling
+                        thread, so it may be a queryset.
+        :param client: The jira client which should be used to export the story points. Optional.
+        :param progress_callback: Called by the calling thread with each story and the exception which prevented its
+                                  export or `None` as soon as the story and all the stories before it were exported.
+                                  Optional.
+        :return: A list containing a tuple for each story in the order of the given stories. The tuple consists of the
+                 story and the exception which prevented its export or `None` if it was exported successfully.
+        """
+        client = client or self.get_client()
+
+        def export(story: Story) -> Tuple[Story, Optional[Exception]]:
+            try:
+                self._update_story_points(story, client)
+            except (JIRAError, ConnectionError, RequestException) as e:
+                return story, e
+            return story, None
+
+        results = []
+        for result in map_concurrently(export, stories, self.num_workers):
+            results.append(result)
+            if progress_callback:
+                progress_callback(*result)
+        return results
+
+    def _update_story_points(self, story: Story, client: JIRA):
+        """Send the story points of the given story to the jira backend with a single request.
+
+        `Issue.update()` would fetch the issue before and again after updating it, so the update is sent directly.
+
+        :param story: The story whose story points should be exported.
+        :param client: The jira client which should be used to export the story points.
+        :raises JIRAError: If the jira backend rejects the update, e.g. with the status code ``404`` if the issue does
+                           not exist.
+        """
+        client._session.put(client._get_url('issue/{}'.format(quote(story.ticket_number, safe=''))),
+                            data=json.dumps({'fields': {self.story_points_field: story.story_points}}))
+
+
+class DeferredDescription(models.Model):
+    """Marks a story which was imported without its description. See `DescriptionFormat.LAZY`."""
+    story = models.OneToOneField(Story, verbose_name=_('Story'), on_delete=models.CASCADE, primary_key=True,
+                                 related_name='jira_deferred_description')
+    #: The connection from which the description has to be loaded.
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='deferred_descriptions')
+
+    class Meta:
+        verbose_name = _('Deferred Description')
+        verbose_name_plural = _('Deferred Descriptions')
+
+
+class ImportedStory(models.Model):
+    """Links a story to the connection from which it was imported."""
+    story = models.OneToOneField(Story, verbose_name=_('Story'), on_delete=models.CASCADE, primary_key=True,
+                                 related_name='jira_import')
+    #: The connection whose jira backend contains the story's issue.
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='imported_stories')
+
+    class Meta:
+        verbose_name = _('Imported Story')
+        verbose_name_plural = _('Imported Stories')
+
+
+class PendingIssueChange(models.Model):
+    """The latest change of an issue which a webhook reported and which was not yet applied to the stories.
+
+    The changes are stored before the webhook is acknowledged, so they survive a restart of the process which received
+    them. Several changes of the same issue are coalesced into a single row.
+    """
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='pending_issue_changes')
+    issue_key = models.CharField(verbose_name=_('Issue Key'), max_length=200)
+    #: The name of the webhook event.
+    event = models.CharField(verbose_name=_('Event'), max_length=50)
+    #: The JSON of the issue.
+    issue = models.TextField(verbose_name=_('Issue'))
+    #: The time at which the jira backend sent the webhook in milliseconds since the epoch.
+    timestamp = models.BigIntegerField(verbose_name=_('Timestamp'), default=0)
+    #: Whether the description changed with this or any of the coalesced changes.
+    description_changed = models.BooleanField(verbose_name=_('Description Changed'), default=False)
+    received_at = models.DateTimeField(verbose_name=_('Received at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Pending Issue Change')
+        verbose_name_plural = _('Pending Issue Changes')
+        constraints = [
+            models.UniqueConstraint(fields=['connection', 'issue_key'],
+                                    name='Only the latest change of each issue is kept.')
+        ]
+
+    def get_issue(self) -> Dict[str, Any]:
+        return json.loads(self.issue)
+
+
+def load_deferred_descriptions(stories: Iterable[Story]) -> int:
+    """Load the descriptions of those stories which were imported without them.
+
+    The descriptions are loaded in batches for each connection. The given story instances are updated as well.
+
+    :param stories: The stories whose descriptions should be loaded if they were deferred.
+    :return: The number of stories whose descriptions were loaded.
+    """
+    stories = {story.pk: story for story in stories}
+    stories_by_connection = {}
+    connections = {}
+    for deferred_description in DeferredDescription.objects.filter(story__in=list(stories)).select_related(
+        'connection'
+    ):
+        connections[deferred_description.connection_id] = deferred_description.connection
+        stories_by_connection.setdefault(deferred_description.connection_id, []).append(
+            stories[deferred_description.story_id]
+        )
+    return sum(connections[connection_id].load_descriptions(connection_stories)
+               for connection_id, connection_stories in stories_by_connection.items())
+
+
+class SavedQuery(models.Model):
+    """A JQL query whose matching issues are kept in sync with the stories of a poker session."""
+    #: The connection to the jira backend which is queried.
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='saved_queries')
+    #: The poker session whose stories are synchronized. Stories without a poker session are used if this is empty.
+    poker_session = models.ForeignKey(PokerSession, verbose_name=_('Poker Session'), on_delete=models.CASCADE,
+                                      related_name='saved_jira_queries', blank=True, null=True)
+    #: The JQL query which selects the issues.
+    jql_query = models.TextField(verbose_name=_('JQL Query'))
+    #: The time at which the last synchronization was started. Only issues updated since then are requested.
+    last_synced_at = models.DateTimeField(verbose_name=_('Last Synchronization'), blank=True, null=True,
+                                          editable=False)
+    #: How long the last synchronization attempt took, regardless of whether it succeeded.
+    last_sync_duration = models.DurationField(verbose_name=_('Duration of the Last Synchronization'), blank=True,
+                                              null=True, editable=False)
+    #: The number of stories which were created by the last successful synchronization.
+    last_sync_num_imported = models.PositiveIntegerField(verbose_name=_('Created Stories'), default=0, editable=False)
+    #: The number of stories which were updated by the last successful synchronization.
+    last_sync_num_updated = models.PositiveIntegerField(verbose_name=_('Updated Stories'), default=0, editable=False)
+    #: The number of stories which were removed by the last successful synchronization.
+    last_sync_num_removed = models.PositiveIntegerField(verbose_name=_('Removed Stories'), default=0, editable=False)
+    #: The explanation of the error which made the last synchronization attempt fail. Empty if it succeeded.
+    last_sync_error = models.TextField(verbose_name=_('Synchronization Error'), blank=True, editable=False)
+
+    class Meta:
+        verbose_name = _('Saved Query')
+        verbose_name_plural = _('Saved Queries')
+
+    def __str__(self) -> str:
+        return self.jql_query
+
+    def get_delta_query(self, now: Optional[datetime] = None) -> str:
+        """Return the query which selects the issues that were updated since the last synchronization.
+
+        The jira backend interprets absolute dates in the time zone of the API user, so a relative date is used instead.
+        It is rounded up to whole minutes and extended by another minute to make up for differing clocks. Updating an
+        unchanged story is a no-op, so the overlap is harmless.
+
+        :param now: The time at which the synchronization is started. Defaults to the current time.
+        :return: The query string. This is the unmodified `jql_query` if the query was never synchronized.
+        """
+        if not self.last_synced_at:
+            return self.jql_query
+        minutes = math.ceil(((now or timezone.now()) - self.last_synced_at).total_seconds() / 60) + 1
+        return add_jql_condition(self.jql_query, 'updated >= "-{}m"'.format(minutes))
+
+    def sync(self, client: Optional[JIRA] = None, remove_missing: bool = False) -> ImportResult:
+        """Synchronize the stories of the poker session with the issues which currently match the query.
+
+        Only the issues which were updated since the last synchronization are requested. Stories whose issues changed
+        are updated in place and new issues are appended to the poker session. The duration and the outcome of each
+        attempt are stored in the saved query. Any exception is raised again after its explanation was stored.
+
+        :param client: The jira client which should be used to fetch the issues. Optional.
+        :param remove_missing: Whether stories whose issues no longer match the query should be removed from the poker
+                               session. This requires an additional query for the keys of all matching issues. The
+                               stories themselves (and their votes) are kept.
+        :return: The number of created, updated and removed stories and the number of issues which changed since the
+                 last synchronization.
+        """
+        started_at = timezone.now()
+        try:
+            client = client or self.connection.get_client()
+            result = self.connection.create_stories(self.get_delta_query(started_at), self.poker_session, client,
+                                                    upsert=True)
+            if remove_missing and self.poker_session:
+                result = result._replace(num_removed=self._remove_missing_stories(client))
+        except Exception as e:
+            # The stories which were already stored are kept, so the failed attempt only shows up in the statistics.
+            self.last_sync_duration = timezone.now() - started_at
+            self.last_sync_error = str(get_error_text(e, api_url=self.connection.api_url, connection=self.connection))
+            self.save(update_fields=['last_sync_duration', 'last_sync_error'])
+            raise
+        self.last_synced_at = started_at
+        self.last_sync_duration = timezone.now() - started_at
+        self.last_sync_num_imported = result.num_imported
+        self.last_sync_num_updated = result.num_updated
+        self.last_sync_num_removed = result.num_removed
+        self.last_sync_error = ''
+        self.save(update_fields=['last_synced_at', 'last_sync_duration', 'last_sync_num_imported',
+                                 'last_sync_num_updated', 'last_sync_num_removed', 'last_sync_error'])
+        return result
+
+    def _remove_missing_stories(self, client: JIRA) -> int:
+        """Remove the stories whose issues no longer match the query from the poker session.
+
+        :param client: The jira client which should be used to fetch the keys of the matching issues.
+        :return: The number of removed stories.
+        """
+        keys = set()
+        for page in self.connection.iter_issue_pages(self.jql_query, client,
+                                                     projection=FieldProjection(DescriptionFormat.NONE)):
+            keys.update(issue.key for issue in page)
+        missing_story_ids = [story_id for story_id, ticket_number
+                             in self.poker_session.stories.values_list('id', 'ticket_number')
+                             if ticket_number not in keys]
+        if self.poker_session.active_story_id in missing_story_ids:
+            self.poker_session.active_story = None
+            self.poker_session.save(update_fields=['active_story'])
+        # Keep the number of query parameters below the limits of the database backends.
+        return sum(Story.objects.filter(id__in=missing_story_ids[start:start + 500]).update(poker_session=None)
+                   for start in range(0, len(missing_story_ids), 500))
+
+
+class JobStatus(models.TextChoices):
+    """The states of a `BackgroundJob`."""
+    PENDING = 'pending', _('Pending')
+    RUNNING = 'running', _('Running')
+    SUCCEEDED = 'succeeded', _('Succeeded')
+    FAILED = 'failed', _('Failed')
+
+
+class BackgroundJob(models.Model):
+    """Base class of the jobs which communicate with a jira backend in the background instead of during the HTTP
+    request that started them.
+
+    The jobs are either run in-process on a thread pool (see `planning_poker_jira.jobs`) or by the ``run_jira_jobs``
+    management command. A job is claimed atomically before it is run, so it is never run twice. Its progress is stored
+    in the database and sent to the channel group returned by `get_progress_group_name()`.
+    """
+    Status = JobStatus
+
+    #: Optional: Overrides the username of the connection.
+    username = models.CharField(verbose_name=_('API Username'), max_length=200, blank=True)
+    #: Optional: Overrides the password of the connection. It is removed as soon as the job is finished.
+    password = fields.EncryptedCharField(verbose_name=_('Password'), max_length=200, blank=True)
+    status = models.CharField(verbose_name=_('Status'), max_length=20, choices=JobStatus.choices,
+                              default=JobStatus.PENDING, db_index=True)
+    #: The explanation of the error which made the job fail.
+    error = models.TextField(verbose_name=_('Error'), blank=True)
+    created_at = models.DateTimeField(verbose_name=_('Created at'), auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name=_('Started at'), blank=True, null=True)
+    finished_at = models.DateTimeField(verbose_name=_('Finished at'), blank=True, null=True)
+
+    class Meta:
+        abstract = True
+        ordering = ('-created_at',)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def get_client(self) -> JIRA:
+        """Return a client which uses the credentials of the job or falls back to the ones of the connection.
+
+        :return: A client which can be used to communicate with the jira backend.
+        """
+        if not (self.username or self.password):
+            return self.connection.get_client()
+        return JiraConnection(api_url=self.connection.api_url,
+                              username=self.username or self.connection.username,
+                              password=self.password or self.connection.password,
+                              **self.connection.get_transport_options()).get_client()
+
+    def claim(self) -> bool:
+        """Mark the job as running unless another worker already claimed it.
+
+        :return: Whether the job was claimed and should be run by the caller.
+        """
+        started_at = timezone.now()
+        claimed = type(self).objects.filter(pk=self.pk, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING, started_at=started_at
+        )
+        if claimed:
+            self.status = JobStatus.RUNNING
+            self.started_at = started_at
+        return bool(claimed)
+
+    @classmethod
+    def fail_stale_jobs(cls) -> List['BackgroundJob']:
+        """Mark the running jobs which were started more than ``JIRA_JOB_TIMEOUT`` seconds ago as failed.
+
+        The worker of such a job most likely died, e.g. because its process was restarted, so it would otherwise stay
+        running forever and keep its password.
+
+        :return: The jobs which were marked as failed.
+        """
+        timeout = getattr(settings, 'JIRA_JOB_TIMEOUT', 3600)
+        if not timeout:
+            return []
+        stale_jobs = []
+        for job in cls.objects.filter(status=JobStatus.RUNNING,
+                                      started_at__lt=timezone.now() - timedelta(seconds=timeout)):
+            job.status = JobStatus.FAILED
+            job.error = str(_('The job did not finish within {} seconds.').format(timeout))
+            job.password = ''
+            job.finished_at = timezone.now()
+            # The job may have finished in the meantime.
+            if cls.objects.filter(pk=job.pk, status=JobStatus.RUNNING).update(
+                status=job.status, error=job.error, password=job.password, finished_at=job.finished_at
+            ):
+                job.send_progress('finished')
+                stale_jobs.append(job)
+        return stale_jobs
+
+    def run(self):
+        """Claim the job and perform it. The outcome is stored in the job instead of being raised."""
+        if not self.claim():
+            return
+        connection = self.connection
+        try:
+            self.perform(self.get_client())
+        except Exception as e:
+            if not isinstance(e, (JIRAError, ConnectionError, RequestException)):
+                logger.exception('%s %s failed.', self._meta.verbose_name, self.pk)
+            self.status = JobStatus.FAILED
+            self.error = str(get_error_text(e, api_url=connection.api_url, connection=connection))
+        else:
+            self.status = JobStatus.SUCCEEDED
+        self.password = ''
+        self.finished_at = timezone.now()
+        self.save()
+        self.send_progress('finished')
+
+    def perform(self, client: JIRA):
+        """Do the actual work of the job.
+
+        :param client: The client which should be used to communicate with the jira backend.
+        """
+        raise NotImplementedError()
+
+    def get_progress(self, include_details: bool = False) -> Dict[str, Any]:
+        """Return the current state of the job.
+
+        :param include_details: Whether details which grow with the size of the job should be included. The progress
+                                events only contain the changes to these details.
+        :return: A dictionary which can be serialized to JSON.
+        """
+        return {
+            'status': self.status,
+            'status_display': str(self.get_status_display()),
+            'is_finished': self.is_finished,
+            'elapsed': ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+            if self.started_at else 0,
+            'error': self.error,
+        }
+
+    def get_progress_group_name(self) -> str:
+        """Return the name of the channel group to which the progress events of the job are sent."""
+        return 'planning_poker_jira.{}.{}'.format(self._meta.model_name, self.pk)
+
+    def send_progress(self, event: str, **data):
+        """Send a progress event with the current state of the job to the job's channel group.
+
+        :param event: The name of the event.
+        :param data: Additional data which should be sent along with the state of the job.
+        """
+        send_progress_event(self.get_progress_group_name(), event, {**self.get_progress(), **data})
+
+
+class ImportJob(BackgroundJob):
+    """An import of stories which runs in the background."""
+    #: The connection from which the stories are imported.
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='import_jobs')
+    #: The poker session to which the stories are added.
+    poker_session = models.ForeignKey(PokerSession, verbose_name=_('Poker Session'), on_delete=models.CASCADE,
+                                      related_name='jira_import_jobs', blank=True, null=True)
+    #: The queries which are used to retrieve the stories from the jira backend. One query per line.
+    jql_query = models.TextField(verbose_name=_('JQL Query'))
+    #: Optional: Overrides the connection's `description_format`.
+    description_format = models.CharField(verbose_name=_('Description Format'), max_length=20,
+                                          choices=DescriptionFormat.choices, blank=True)
+    #: Optional: Overrides the connection's `import_story_points` setting.
+    import_story_points = models.BooleanField(verbose_name=_('Import Story Points'), blank=True, null=True)
+    #: Whether the existing stories of the poker session should be updated instead of being imported a second time.
+    upsert = models.BooleanField(verbose_name=_('Update Existing Stories'), default=False)
+    #: Whether the search results may be taken from the search cache.
+    use_cache = models.BooleanField(verbose_name=_('Use Cached Search Results'), default=True)
+    #: Whether all the stories should be imported in a single transaction.
+    atomic = models.BooleanField(verbose_name=_('All or Nothing'), default=False)
+    #: The number of pages which were fetched from the jira backend so far.
+    num_pages = models.PositiveIntegerField(verbose_name=_('Fetched Pages'), default=0)
+    #: The number of stories which were created so far.
+    num_imported = models.PositiveIntegerField(verbose_name=_('Imported Stories'), default=0)
+    #: The number of existing stories which were updated so far.
+    num_updated = models.PositiveIntegerField(verbose_name=_('Updated Stories'), default=0)
+    #: The total number of issues the jira backend reported to match the query.
+    total = models.PositiveIntegerField(verbose_name=_('Matching Issues'), default=0)
+
+    class Meta(BackgroundJob.Meta):
+        verbose_name = _('Import Job')
+        verbose_name_plural = _('Import Jobs')
+
+    def __str__(self) -> str:
+        return self.jql_query
+
+    def perform(self, client: JIRA):
+        self.connection.create_stories(
+            split_jql_queries(self.jql_query), self.poker_session, client,
+            self.connection.get_field_projection(self.description_format, self.import_story_points),
+            upsert=self.upsert, progress_callback=self._record_progress, use_cache=self.use_cache, atomic=self.atomic
+        )
+
+    def get_progress(self, include_details: bool = False) -> Dict[str, Any]:
+        return {
+            **super().get_progress(include_details),
+            'num_pages': self.num_pages,
+            'num_imported': self.num_imported,
+            'num_updated': self.num_updated,
+            'total': self.total,
+        }
+
+    def _record_progress(self, result: ImportResult):
+        self.num_pages += 1
+        self.num_imported, self.total, self.num_updated = result.num_imported, result.total, result.num_updated
+        self.save(update_fields=['num_pages', 'num_imported', 'total', 'num_updated'])
+        self.send_progress('page_imported')
+
+
+class ExportJob(BackgroundJob):
+    """An export of story points which runs in the background."""
+    #: The connection to which the story points are exported.
+    connection = models.ForeignKey(JiraConnection, verbose_name=_('Jira Connection'), on_delete=models.CASCADE,
+                                   related_name='export_jobs')
+    #: The stories whose story points are exported.
+    stories = models.ManyToManyField(Story, verbose_name=_('Stories'), related_name='jira_export_jobs')
+    #: The number of stories which are exported.
+    num_stories = models.PositiveIntegerField(verbose_name=_('Stories'), default=0)
+    #: The number of stories which were exported successfully so far.
+    num_exported = models.PositiveIntegerField(verbose_name=_('Exported Stories'), default=0)
+    #: The number of stories which could not be exported so far.
+    num_failed = models.PositiveIntegerField(verbose_name=_('Failed Stories'), default=0)
+    #: The explanations why the failed stories could not be exported. One per line.
+    failures = models.TextField(verbose_name=_('Failures'), blank=True)
+
+    class Meta(BackgroundJob.Meta):
+        verbose_name = _('Export Job')
+        verbose_name_plural = _('Export Jobs')
+
+    def __str__(self) -> str:
+        return str(self.connection)
+
+    def perform(self, client: JIRA):
+        self.connection.export_story_points(self.stories.order_by('pk'), client,
+                                            progress_callback=self._record_progress)
+
+    def get_progress(self, include_details: bool = False) -> Dict[str, Any]:
+        progress = {
+            **super().get_progress(include_details),
+            'num_stories': self.num_stories,
+            'num_exported': self.num_exported,
+            'num_failed': self.num_failed,
+        }
+        if include_details:
+            progress['failures'] = self.failures.splitlines()
+        return progress
+
+    def _record_progress(self, story: Story, error: Optional[Exception]):
+        failure = None
+        if error is None:
+            self.num_exported += 1
+        else:
+            self.num_failed += 1
+            failure = str(_('"{story}" could not be exported. {reason}').format(
+                story=story,
+                reason=get_error_text(error, api_url=self.connection.api_url, connection=self.connection)
+            ))
+            self.failures = '\n'.join(filter(None, (self.failures, failure)))
+        self.save(update_fields=['num_exported', 'num_failed', 'failures'])
+        self.send_progress('story_exported', story=str(story), failure=failure)
+
+
+def load_active_story_descriptions(poker_session_id: int) -> int:
+    """Load the deferred description of a poker session's active story and send the story to the participants again.
+
+    The descriptions of the next ``JIRA_DESCRIPTION_PREFETCH`` stories are loaded in the same batch, so they are
+    already available once the participants get to them. Errors of the jira backend are only logged.
+
+    :param poker_session_id: The primary key of the poker session.
+    :return: The number of stories whose descriptions were loaded.
+    """
+    poker_session = PokerSession.objects.select_related('active_story').filter(pk=poker_session_id).first()
+    if poker_session is None or poker_session.active_story is None:
+        return 0
+    active_story = poker_session.active_story
+    condition = models.Q(pk=active_story.pk)
+    if active_story._order is not None:
+        condition |= models.Q(poker_session=poker_session.pk, _order__gt=active_story._order)
+    num_prefetched = getattr(settings, 'JIRA_DESCRIPTION_PREFETCH', 5)
+    deferred_stories = list(Story.objects.filter(condition, jira_deferred_description__isnull=False).order_by(
+        '_order'
+    )[:num_prefetched + 1])
+    is_active_story_deferred = bool(deferred_stories) and deferred_stories[0].pk == active_story.pk
+    if not is_active_story_deferred:
+        # The active story's description is already loaded, so only the following stories are left.
+        deferred_stories = deferred_stories[:num_prefetched]
+    stories = [active_story if story.pk == active_story.pk else story for story in deferred_stories]
+    if not stories:
+        return 0
+    try:
+        num_loaded = load_deferred_descriptions(stories)
+    except (JIRAError, ConnectionError, RequestException):
+        logger.warning('Could not load the description of "%s".', active_story, exc_info=True)
+        return 0
+    # The participants may have moved on to another story in the meantime.
+    if is_active_story_deferred and active_story.description and PokerSession.objects.filter(
+        pk=poker_session.pk, active_story=active_story.pk
+    ).exists():
+        send_story_changed_event(poker_session.pk, active_story)
+    return num_loaded
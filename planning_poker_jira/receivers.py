@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from planning_poker.models import PokerSession
+
+from .clients import client_pool
+from .jobs import get_description_executor, load_descriptions, submit
+from .models import DeferredDescription, JiraConnection
+
+
+@receiver(post_save, sender=PokerSession)
+def load_active_story_description(sender, instance: PokerSession, raw: bool = False, **kwargs):
+    """Load the deferred description of the poker session's active story in the background once it was saved.
+
+    Saving the poker session, e.g. while the moderator moves on to the next story, never waits for the jira backend.
+    The participants are sent the story again as soon as its description was loaded. Nothing is submitted if the
+    description of the active story is not deferred.
+    """
+    if raw or instance.active_story_id is None:
+        return
+    if DeferredDescription.objects.filter(story=instance.active_story_id).exists():
+        submit(get_description_executor(), load_descriptions, instance.pk)
+
+
+@receiver(post_save, sender=JiraConnection)
+@receiver(post_delete, sender=JiraConnection)
+def invalidate_pooled_clients(sender, instance: JiraConnection, **kwargs):
+    """Remove the pooled clients of a jira connection whenever it gets changed or deleted."""
+    client_pool.invalidate(instance.api_url)
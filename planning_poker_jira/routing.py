@@ -0,0 +1,7 @@
+from django.urls import re_path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'^jira/(?P<job_type>import|export)_jobs/(?P<job_id>\d+)/$', consumers.JobProgressConsumer.as_asgi()),
+]
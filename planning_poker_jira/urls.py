@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'planning_poker_jira'
+
+urlpatterns = [
+    path('webhook/<int:connection_id>/', views.webhook_view, name='webhook'),
+]
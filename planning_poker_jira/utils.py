@@ -1,7 +1,29 @@
+import argparse
+import itertools
+import logging
+import math
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, TypeVar
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from django.utils.translation import gettext, gettext_lazy as _
 from jira.exceptions import JIRAError
 from requests.exceptions import ConnectionError, RequestException
 
+from planning_poker.models import Story
+
+from .clients import CircuitBreakerOpen
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+ORDER_BY_PATTERN = re.compile(r'(?:^|\s+)ORDER\s+BY\s+', re.IGNORECASE)
+
 
 def get_error_text(exception: Exception, **context) -> str:
     """Utility method which returns a string explaining the given exception.
@@ -12,6 +34,10 @@ def get_error_text(exception: Exception, **context) -> str:
     """
     if isinstance(exception, JIRAError):
         error_text = get_jira_error_error_text(exception, **context)
+    elif isinstance(exception, CircuitBreakerOpen):
+        error_text = gettext('The Jira backend at "{api_url}" failed repeatedly and is considered to be unavailable. '
+                             'Try again in {retry_after} seconds.')
+        error_text = error_text.format(api_url=exception.api_url, retry_after=math.ceil(exception.retry_after))
     elif isinstance(exception, ConnectionError):
         error_text = gettext('Failed to connect to server.')
         api_url = context.get('api_url')
@@ -47,3 +73,136 @@ def get_jira_error_error_text(jira_error: JIRAError, **context) -> str:
     else:
         error_text = _('Received status code {status_code}.').format(status_code=jira_error.status_code)
     return error_text
+
+
+def format_jql_list(values: Iterable[str]) -> str:
+    """Utility method which formats the given values as a JQL list, e.g. for ``key in (...)`` conditions.
+
+    :param values: The values which should be listed. They are quoted, so they must not contain any double quotes.
+    :return: The JQL list containing the given values.
+    """
+    return '({})'.format(', '.join('"{}"'.format(value) for value in values))
+
+
+def add_jql_condition(query_string: str, condition: str) -> str:
+    """Utility method which restricts the given JQL query by an additional condition.
+
+    :param query_string: The JQL query which should be restricted. It may contain an ``ORDER BY`` clause.
+    :param condition: The JQL condition which the issues have to match additionally.
+    :return: A JQL query which matches the issues matching both the query and the condition. The ordering of the
+             original query is kept.
+    """
+    parts = ORDER_BY_PATTERN.split(query_string.strip(), maxsplit=1)
+    query = '({}) AND {}'.format(parts[0], condition) if parts[0] else condition
+    if len(parts) > 1:
+        query = '{} ORDER BY {}'.format(query, parts[1])
+    return query
+
+
+def split_jql_queries(text: str) -> List[str]:
+    """Utility method which splits the given text into JQL queries.
+
+    :param text: The text containing one JQL query per line.
+    :return: A list containing the stripped queries without any blank lines.
+    """
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def combine_jql_queries(queries: Sequence[str]) -> str:
+    """Utility method which combines the given JQL queries into a single query matching the issues of all of them.
+
+    :param queries: The JQL queries which should be combined.
+    :return: The combined query. The ``ORDER BY`` clauses of the queries are dropped unless there is only one query.
+    """
+    if len(queries) == 1:
+        return queries[0]
+    conditions = [ORDER_BY_PATTERN.split(query.strip(), maxsplit=1)[0] for query in queries]
+    if not all(conditions):
+        # A query without any condition matches all the issues.
+        return ''
+    return ' OR '.join('({})'.format(condition) for condition in conditions)
+
+
+def positive_int(value: str) -> int:
+    """Utility method which converts a command line argument to an integer which is greater than zero.
+
+    :param value: The argument which was passed on the command line.
+    :return: The converted argument.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(gettext('{} is not a positive integer.').format(value))
+    return number
+
+
+def map_concurrently(function: Callable[[T], R], iterable: Iterable[T], max_workers: int) -> Iterator[R]:
+    """Utility method which works like the builtin `map()` but calls the function concurrently on a bounded thread pool.
+
+    The results are yielded in the order of the iterable regardless of the order in which the calls finish. At most
+    twice as many calls as there are workers are scheduled ahead of the consumer, so slow consumers don't cause the
+    results to pile up in memory. If a call raises an exception, it is raised when its result would have been yielded
+    and any pending calls are cancelled.
+
+    :param function: The function which should be called for each item.
+    :param iterable: The items for which the function should be called.
+    :param max_workers: The maximum number of threads which call the function at the same time.
+    :return: An iterator which yields the function's return value for each item.
+    """
+    items = iter(iterable)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = deque(executor.submit(function, item) for item in itertools.islice(items, 2 * max_workers))
+        try:
+            while futures:
+                future = futures.popleft()
+                futures.extend(executor.submit(function, item) for item in itertools.islice(items, 1))
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def send_progress_event(group_name: str, event: str, data: Dict[str, Any]):
+    """Utility method which sends a progress event to the given channel group.
+
+    Progress events are sent on a best-effort basis. Nothing is sent if no channel layer is configured and errors of the
+    channel layer are only logged, so they never interrupt the work whose progress is reported.
+
+    :param group_name: The name of the channel group.
+    :param event: The name of the event.
+    :param data: The data which should be sent along with the event.
+    """
+    _send_to_group(group_name, {'type': 'job.progress', 'event': event, 'data': data})
+
+
+def send_story_changed_event(poker_session_id: int, story: Story):
+    """Utility method which sends the given story to the participants of a poker session as their active story.
+
+    The event is the same one the poker session's consumers send once the active story changes and it is sent on a
+    best-effort basis as well.
+
+    :param poker_session_id: The primary key of the poker session.
+    :param story: The active story of the poker session.
+    """
+    _send_to_group('poker_session_{}'.format(poker_session_id), {
+        'type': 'send_json',
+        'event': 'story_changed',
+        'data': {
+            'id': story.id,
+            'story_label': str(story),
+            'description': story.description,
+            'votes': story.get_votes_with_voter_information(),
+        },
+    })
+
+
+def _send_to_group(group_name: str, message: Dict[str, Any]):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name, message)
+    except Exception:
+        logger.warning('Could not send the "%s" event to "%s".', message['event'], group_name, exc_info=True)
@@ -0,0 +1,65 @@
+import hashlib
+import hmac
+import json
+
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import JiraConnection
+from .webhooks import apply_pending_issue_changes, get_delay, schedule_pending_issue_changes, store_issue_change
+
+
+def is_authenticated_webhook(request: HttpRequest, secret: str) -> bool:
+    """Check whether the webhook was sent by a jira backend which knows the given secret.
+
+    Jira Cloud signs the body of the webhooks with the secret and sends the signature in the ``X-Hub-Signature`` header.
+    Jira Server can't do that, so the secret may be passed as the ``secret`` query parameter of the webhook URL instead.
+
+    :param request: The request of the webhook.
+    :param secret: The webhook secret of the connection.
+    :return: Whether the signature or the secret match.
+    """
+    signature = request.headers.get('X-Hub-Signature', '')
+    if signature:
+        expected_signature = 'sha256=' + hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+        # `compare_digest()` only accepts strings which consist of ASCII characters.
+        return hmac.compare_digest(signature.encode(), expected_signature.encode())
+    return hmac.compare_digest(request.GET.get('secret', '').encode(), secret.encode())
+
+
+@csrf_exempt
+@require_POST
+def webhook_view(request: HttpRequest, connection_id: int) -> HttpResponse:
+    """Receive the ``jira:issue_updated`` and ``jira:issue_deleted`` webhooks of a jira backend.
+
+    The change is stored before the webhook is acknowledged and is applied to the stories of the issue once
+    ``JIRA_WEBHOOK_DELAY`` seconds passed or right away if the delay is ``0``. Other events are ignored.
+
+    :param request: The request of the webhook.
+    :param connection_id: The id of the jira connection whose jira backend sends the webhook.
+    :return: An empty response with the status code ``202`` if the change was accepted, ``204`` if it was ignored and
+             ``400`` if the payload is malformed.
+    """
+    connection = get_object_or_404(JiraConnection.objects.only('webhook_secret'), pk=connection_id)
+    if not connection.webhook_secret or not is_authenticated_webhook(request, connection.webhook_secret):
+        return HttpResponseForbidden()
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if not isinstance(payload, dict):
+        return HttpResponseBadRequest()
+    try:
+        stored = store_issue_change(connection, payload)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if not stored:
+        return HttpResponse(status=204)
+    if get_delay() > 0:
+        transaction.on_commit(schedule_pending_issue_changes)
+    else:
+        apply_pending_issue_changes([connection.pk])
+    return HttpResponse(status=202)
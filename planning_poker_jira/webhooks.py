@@ -0,0 +1,143 @@
+"""Applies the issue changes which the webhooks of the Jira backends report to the stories.
+
+Each change is stored as a `PendingIssueChange` before the webhook is acknowledged, so no change gets lost if the
+process is restarted before it was applied. The changes of a burst of webhooks (e.g. while someone edits an issue field
+by field or moves a lot of issues at once) are coalesced for ``JIRA_WEBHOOK_DELAY`` seconds and only the latest state of
+each issue is applied, so a burst results in a few bulk updates instead of one update per webhook. The stored changes
+are applied by the in-process job workers or by the ``run_jira_jobs`` management command.
+"""
+import itertools
+import json
+import logging
+import threading
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .jobs import get_executor
+from .models import JiraConnection, PendingIssueChange
+
+logger = logging.getLogger(__name__)
+
+ISSUE_UPDATED = 'jira:issue_updated'
+ISSUE_DELETED = 'jira:issue_deleted'
+#: The webhook events which are applied to the stories. All the other events are ignored.
+SUPPORTED_EVENTS = (ISSUE_UPDATED, ISSUE_DELETED)
+ISSUE_KEY_MAX_LENGTH = PendingIssueChange._meta.get_field('issue_key').max_length
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def get_delay() -> float:
+    return getattr(settings, 'JIRA_WEBHOOK_DELAY', 1)
+
+
+def store_issue_change(jira_connection: JiraConnection, payload: Dict[str, Any]) -> bool:
+    """Store the change reported by the given webhook payload until it is applied.
+
+    The change is coalesced with the stored change of the same issue. The webhooks are not guaranteed to arrive in
+    order, so the issue of the latest webhook is kept.
+
+    :param jira_connection: The connection whose jira backend sent the webhook.
+    :param payload: The JSON sent by the webhook.
+    :return: Whether the payload contained a supported event.
+    :raises ValueError: If the payload of a supported event is malformed.
+    """
+    event = payload.get('webhookEvent')
+    if event not in SUPPORTED_EVENTS:
+        return False
+    issue = payload.get('issue') or {}
+    changelog = payload.get('changelog') or {}
+    timestamp = payload.get('timestamp') or 0
+    if not (isinstance(issue, dict) and isinstance(changelog, dict) and type(timestamp) is int):
+        raise ValueError('The payload of the "{}" webhook is malformed.'.format(event))
+    items = changelog.get('items') or []
+    key = issue.get('key')
+    if not (isinstance(items, list) and all(isinstance(item, dict) for item in items) and
+            isinstance(key, (str, type(None))) and len(key or '') <= ISSUE_KEY_MAX_LENGTH):
+        raise ValueError('The payload of the "{}" webhook is malformed.'.format(event))
+    if not key:
+        return False
+    description_changed = any(item.get('field') == 'description' for item in items)
+    with transaction.atomic():
+        change, created = PendingIssueChange.objects.select_for_update().get_or_create(
+            connection=jira_connection, issue_key=key, defaults={
+                'event': event, 'issue': json.dumps(issue), 'timestamp': timestamp,
+                'description_changed': description_changed
+            }
+        )
+        if not created:
+            if timestamp >= change.timestamp:
+                change.event, change.issue, change.timestamp = event, json.dumps(issue), timestamp
+            change.description_changed = change.description_changed or description_changed
+            change.save()
+    return True
+
+
+def apply_pending_issue_changes(connection_ids: Optional[Iterable[int]] = None) -> Tuple[int, int]:
+    """Apply the stored issue changes to the stories and delete them.
+
+    The changes of a connection which could not be applied are logged and kept, so they are retried the next time.
+
+    :param connection_ids: Only apply the changes of the connections with these ids. Optional.
+    :return: A tuple containing the number of updated and the number of removed stories.
+    """
+    # Changes which are stored while the others are applied are kept for the next time.
+    started_at = timezone.now()
+    changes = PendingIssueChange.objects.select_related('connection').order_by('connection', 'pk')
+    if connection_ids is not None:
+        changes = changes.filter(connection__in=list(connection_ids))
+    num_updated = num_removed = 0
+    for _, connection_changes in itertools.groupby(changes, attrgetter('connection_id')):
+        connection_changes = list(connection_changes)
+        jira_connection = connection_changes[0].connection
+        try:
+            updated, removed = jira_connection.apply_issue_changes(
+                [change.get_issue() for change in connection_changes if change.event == ISSUE_UPDATED],
+                [change.issue_key for change in connection_changes if change.event == ISSUE_DELETED],
+                {change.issue_key for change in connection_changes if change.description_changed}
+            )
+        except Exception:
+            logger.exception('Could not apply the issue changes reported by the webhooks of "%s".', jira_connection)
+            continue
+        PendingIssueChange.objects.filter(pk__in=[change.pk for change in connection_changes],
+                                          received_at__lte=started_at).delete()
+        num_updated += updated
+        num_removed += removed
+    return num_updated, num_removed
+
+
+def schedule_pending_issue_changes():
+    """Apply the stored issue changes in-process once ``JIRA_WEBHOOK_DELAY`` seconds passed.
+
+    The changes which are stored in the meantime are applied along with them. Nothing happens if the in-process workers
+    are disabled. The changes are applied by the ``run_jira_jobs`` management command instead.
+    """
+    global _timer
+    executor = get_executor()
+    if executor is None:
+        return
+    with _timer_lock:
+        if _timer is None:
+            _timer = threading.Timer(get_delay(), _submit_pending_issue_changes, (executor,))
+            _timer.daemon = True
+            _timer.start()
+
+
+def _submit_pending_issue_changes(executor):
+    global _timer
+    with _timer_lock:
+        _timer = None
+    executor.submit(_run_pending_issue_changes)
+
+
+def _run_pending_issue_changes():
+    try:
+        apply_pending_issue_changes()
+    finally:
+        # Each worker thread opens its own database connection which would otherwise be leaked.
+        connection.close()
@@ -1,9 +1,51 @@
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
+from django.core.cache import cache
 
 from planning_poker.models import PokerSession, Story
-from planning_poker_jira.models import JiraConnection
+from planning_poker_jira.clients import client_pool
+from planning_poker_jira.models import ImportedStory, JiraConnection
+
+from .fake_jira import FakeJira
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', help='Run the benchmarks against the fake Jira backend.')
+    parser.addoption('--benchmark-latency', type=float, default=0.005,
+                     help='The latency in seconds of each request to the fake Jira backend during the benchmarks.')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip_benchmark = pytest.mark.skip(reason='Only runs with the --benchmark option.')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
+@pytest.fixture(autouse=True)
+def clear_client_pool():
+    client_pool.clear()
+    yield
+    client_pool.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # The circuit breakers store their state inside the cache.
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def skip_job_recovery():
+    # The jobs are recovered on a worker thread of the in-process thread pool which must not access the test database.
+    with patch('planning_poker_jira.jobs._recover_jobs'):
+        yield
 
 
 @pytest.fixture
@@ -34,3 +76,21 @@ def stories(db):
         }
     ]
     return Story.objects.bulk_create([Story(**story) for story in stories])
+
+
+@pytest.fixture
+def imported_stories(jira_connection, stories):
+    ImportedStory.objects.bulk_create([ImportedStory(story=story, connection=jira_connection)
+                                       for story in Story.objects.all()])
+
+
+@pytest.fixture
+def fake_jira():
+    with FakeJira() as fake_jira:
+        yield fake_jira
+
+
+@pytest.fixture
+def fake_jira_connection(db, fake_jira):
+    return JiraConnection.objects.create(api_url=fake_jira.url, username='testuser', password='supersecret',
+                                         story_points_field='customfield_10002')
@@ -0,0 +1,222 @@
+"""A local stand-in for the Jira REST API which can be used to test and benchmark the communication with a Jira backend
+without mocking away the network.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_PATH = '/rest/api/2/'
+
+KEY_IN_PATTERN = re.compile(r'key\s+in\s*\(([^)]*)\)', re.IGNORECASE)
+UPDATED_SINCE_PATTERN = re.compile(r'updated\s*>=\s*"-(\d+)m"', re.IGNORECASE)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # `http.server.ThreadingHTTPServer` was only added in Python 3.7.
+    daemon_threads = True
+
+
+class FakeJira:
+    """In-process HTTP server which implements the parts of the Jira REST API used by this app.
+
+    Supported endpoints are ``serverInfo``, ``field``, ``search`` (with pagination) as well as ``GET`` and ``PUT`` for
+    single issues. The search understands ``key in (...)`` and relative ``updated >= "-<n>m"`` conditions. Each request
+    can be delayed by a fixed latency and every nth request can be answered with an error status code in order to
+    simulate rate limiting (``429``) or an unhealthy backend (``5xx``).
+    """
+
+    def __init__(self, num_issues: int = 10, latency: float = 0.0, error_every: int = 0, error_status: int = 503,
+                 max_results_limit: int = 100, description_size: int = 200, project: str = 'FAKE'):
+        """Create the fake backend and its dataset. Call `start()` to start serving requests.
+
+        :param num_issues: The number of issues in the dataset.
+        :param latency: The number of seconds each request should be delayed.
+        :param error_every: Answer every nth request with `error_status`. `0` disables the error injection.
+        :param error_status: The status code which is used for the injected errors.
+        :param max_results_limit: The maximum page size the search endpoint returns regardless of the requested one.
+        :param description_size: The number of characters of each issue's description.
+        :param project: The project key which is used as the prefix for the issue keys.
+        """
+        self.latency = latency
+        self.error_every = error_every
+        self.error_status = error_status
+        self.max_results_limit = max_results_limit
+        self.issues = OrderedDict()
+        #: Maps the issue keys to the time at which the issues were last updated.
+        self.updated_at = {}
+        for number in range(1, num_issues + 1):
+            key = '{}-{}'.format(project, number)
+            self.issues[key] = {
+                'summary': 'Summary of {}'.format(key),
+                'description': ('Description of {} '.format(key) * description_size)[:description_size],
+            }
+            self.updated_at[key] = time.time()
+        #: A list containing a tuple with the method and the path of each request which was received.
+        self.requests = []
+        #: The highest number of requests which were handled at the same time.
+        self.max_concurrent_requests = 0
+        self._num_concurrent_requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._create_handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeJira':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def update_issue(self, key: str, **fields):
+        """Create or change an issue and mark it as updated.
+
+        :param key: The key of the issue.
+        :param fields: The fields which should be changed.
+        """
+        self.issues.setdefault(key, {'summary': '', 'description': ''}).update(fields)
+        self.updated_at[key] = time.time()
+
+    def count_requests(self, method: Optional[str] = None, path_prefix: str = '') -> int:
+        """Count the received requests.
+
+        :param method: Only count requests with this HTTP method.
+        :param path_prefix: Only count requests whose path (relative to the REST API) starts with this prefix.
+        :return: The number of matching requests.
+        """
+        return sum(1 for request_method, path in self.requests
+                   if (method is None or request_method == method) and path.startswith(path_prefix))
+
+    def _register_request(self, method: str, path: str) -> bool:
+        """Record the request and determine whether it should be answered with an injected error."""
+        with self._lock:
+            self.requests.append((method, path))
+            self._num_concurrent_requests += 1
+            self.max_concurrent_requests = max(self.max_concurrent_requests, self._num_concurrent_requests)
+            return bool(self.error_every) and len(self.requests) % self.error_every == 0
+
+    def _unregister_request(self):
+        """Record that the latency of a request passed and its response is being sent."""
+        with self._lock:
+            self._num_concurrent_requests -= 1
+
+    def _issue_json(self, key: str, fields: List[str], expand: List[str]) -> Dict[str, Any]:
+        issue = self.issues[key]
+        if not fields or '*all' in fields:
+            fields = list(issue)
+        data = {
+            'key': key,
+            'id': key.split('-')[-1],
+            'self': '{}{}issue/{}'.format(self.url, API_PATH, key),
+            'fields': {field: issue.get(field) for field in fields},
+        }
+        if 'renderedFields' in expand:
+            data['renderedFields'] = {
+                field: '<p>{}</p>'.format(issue[field]) if isinstance(issue.get(field), str) else issue.get(field)
+                for field in fields
+            }
+        return data
+
+    def _search(self, params: Dict[str, str]) -> Dict[str, Any]:
+        keys = list(self.issues)
+        match = KEY_IN_PATTERN.search(params.get('jql', ''))
+        if match:
+            requested_keys = {key.strip().strip('"\'') for key in match.group(1).split(',')}
+            keys = [key for key in keys if key in requested_keys]
+        match = UPDATED_SINCE_PATTERN.search(params.get('jql', ''))
+        if match:
+            updated_since = time.time() - int(match.group(1)) * 60
+            keys = [key for key in keys if self.updated_at[key] >= updated_since]
+        start_at = int(params.get('startAt', 0))
+        max_results = min(int(params.get('maxResults', 50)), self.max_results_limit)
+        fields = [field for field in params.get('fields', '').split(',') if field]
+        expand = params.get('expand', '').split(',')
+        return {
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(keys),
+            'issues': [self._issue_json(key, fields, expand) for key in keys[start_at:start_at + max_results]],
+        }
+
+    def _create_handler(self):
+        fake_jira = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Otherwise the headers and the body are sent in separate packets which adds delayed ACK stalls.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, data: Any = None, headers: Optional[Dict[str, str]] = None):
+                body = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for header, value in (headers or {}).items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, status: int, message: str):
+                self._send_json(status, {'errorMessages': [message], 'errors': {}},
+                                {'Retry-After': '1'} if status == 429 else None)
+
+            def _handle(self, method: str):
+                url = urlparse(self.path)
+                path = url.path[len(API_PATH):] if url.path.startswith(API_PATH) else url.path
+                # Repeated parameters (e.g. ``fields=summary&fields=description``) are joined with commas.
+                params = {key: ','.join(values) for key, values in parse_qs(url.query).items()}
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                inject_error = fake_jira._register_request(method, path)
+                if fake_jira.latency:
+                    time.sleep(fake_jira.latency)
+                fake_jira._unregister_request()
+                if inject_error:
+                    return self._send_error(fake_jira.error_status, 'Injected error')
+
+                if method == 'GET' and path == 'serverInfo':
+                    return self._send_json(200, {'baseUrl': fake_jira.url, 'version': '8.20.0',
+                                                 'versionNumbers': [8, 20, 0], 'deploymentType': 'Server'})
+                if method == 'GET' and path == 'field':
+                    return self._send_json(200, [])
+                if method == 'GET' and path == 'search':
+                    return self._send_json(200, fake_jira._search(params))
+                if path.startswith('issue/'):
+                    key = path[len('issue/'):]
+                    if key not in fake_jira.issues:
+                        return self._send_error(404, 'Issue does not exist or you do not have permission to see it.')
+                    if method == 'GET':
+                        fields = [field for field in params.get('fields', '').split(',') if field]
+                        return self._send_json(200, fake_jira._issue_json(key, fields or ['*all'],
+                                                                          params.get('expand', '').split(',')))
+                    if method == 'PUT':
+                        fake_jira.update_issue(key, **json.loads(body or b'{}').get('fields', {}))
+                        return self._send_json(204)
+                return self._send_error(404, 'Unknown resource')
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+        return Handler
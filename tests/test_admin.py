@@ -1,17 +1,21 @@
-from unittest.mock import Mock, call, patch
+from unittest.mock import Mock, patch
 
 import pytest
 from django.contrib import messages
 from django.contrib.admin.sites import site
 from django.contrib.admin.templatetags.admin_urls import admin_urlname
+from django.contrib.auth.models import Permission
 from django.urls import reverse
 from jira import JIRAError
-from requests.exceptions import ConnectionError, RequestException
+from requests.exceptions import ConnectionError
 
 from planning_poker.models import Story
-from planning_poker_jira.admin import JiraConnectionAdmin, export_story_points
+from planning_poker_jira.admin import (ExportJobAdmin, ImportJobAdmin, JiraConnectionAdmin, SavedQueryAdmin,
+                                       export_story_points, load_descriptions)
 from planning_poker_jira.forms import ExportStoryPointsForm, ImportStoriesForm
-from planning_poker_jira.models import JiraConnection
+from planning_poker_jira.jobs import sync_saved_query
+from planning_poker_jira.models import (DeferredDescription, ExportJob, ImportJob, IssuePreview, JiraConnection,
+                                        SavedQuery)
 
 
 @pytest.fixture
@@ -27,44 +31,42 @@ class TestExportStoriesAction:
         assert isinstance(response.context_data['form'].form, ExportStoryPointsForm)
         assert response.context_data['stories'] == stories
 
-    @pytest.mark.parametrize('side_effect, expected_message_user_calls', (
-        (Mock(), (('2 stories were successfully exported.', messages.SUCCESS),)),
-        (JIRAError(status_code=404), (
-            ('"FIAE-1: Write tests" could not be exported. '
-             'The story does probably not exist inside "http://test_url".', messages.ERROR),
-            ('"FIAE-2: Write more tests" could not be exported. '
-             'The story does probably not exist inside "http://test_url".', messages.ERROR),
-        )),
-        (ConnectionError(), (
-            ('"FIAE-1: Write tests" could not be exported. '
-             'Failed to connect to server. Is "http://test_url" the correct API URL?', messages.ERROR),
-            ('"FIAE-2: Write more tests" could not be exported. '
-             'Failed to connect to server. Is "http://test_url" the correct API URL?', messages.ERROR),
-        )),
-        (RequestException(), (
-            ('"FIAE-1: Write tests" could not be exported. '
-             'There was an ambiguous error with your request. Check if all your data is correct.', messages.ERROR),
-            ('"FIAE-2: Write more tests" could not be exported. '
-             'There was an ambiguous error with your request. Check if all your data is correct.', messages.ERROR),
-        )),
-    ))
-    @patch('planning_poker_jira.models.JiraConnection.get_client')
-    def test_confirmed_export_story_points(self, mock_get_client, rf, admin_user, jira_connection,
-                                           jira_connection_admin, stories, side_effect, expected_message_user_calls):
-        mock_client = Mock()
-        mock_client.issue = Mock(side_effect=side_effect)
-        mock_get_client.return_value = mock_client
-        mock_message_user = Mock()
-
-        request = rf.post('/', dict(**{'jira_connection': jira_connection.pk}, export=True))
+    @patch('planning_poker_jira.admin.enqueue')
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_confirmed_export_story_points(self, mock_enqueue, rf, admin_user, jira_connection,
+                                           jira_connection_admin, stories):
+        request = rf.post('/', {'jira_connection': jira_connection.pk, 'username': 'other', 'export': True})
         request.user = admin_user
-        with patch.object(jira_connection_admin, 'message_user', mock_message_user):
-            export_story_points(jira_connection_admin, request, stories)
-        mock_message_user.assert_has_calls(
-            (call(request, *expected_call) for expected_call in expected_message_user_calls)
+        response = export_story_points(jira_connection_admin, request, Story.objects.all())
+        job = ExportJob.objects.get()
+        assert (job.connection, job.username, job.num_stories, job.status) == (
+            jira_connection, 'other', 2, ExportJob.Status.PENDING
         )
-        if not isinstance(side_effect, Exception):
-            side_effect().update.assert_has_calls(call(fields={'testfield': story.story_points}) for story in stories)
+        assert list(job.stories.values_list('ticket_number', flat=True)) == ['FIAE-1', 'FIAE-2']
+        mock_enqueue.assert_called_once_with(job)
+        assert response.url == reverse('admin:planning_poker_jira_exportjob_progress', args=[job.pk])
+
+
+class TestLoadDescriptionsAction:
+    @pytest.fixture
+    def deferred_stories(self, jira_connection, stories):
+        DeferredDescription.objects.bulk_create([DeferredDescription(story=story, connection=jira_connection)
+                                                 for story in Story.objects.all()])
+
+    @pytest.mark.parametrize('side_effect, expected_message', (
+        ([2], ('2 descriptions were loaded.', messages.SUCCESS)),
+        (ConnectionError(), ('The descriptions could not be loaded. Failed to connect to server. Is "http://test_url" '
+                             'the correct API URL?', messages.ERROR)),
+    ))
+    @patch('planning_poker_jira.models.JiraConnection.load_descriptions')
+    def test_load_descriptions(self, mock_load_descriptions, jira_connection_admin, deferred_stories, rf,
+                               side_effect, expected_message):
+        mock_load_descriptions.side_effect = side_effect
+        request = rf.post('/')
+        with patch.object(jira_connection_admin, 'message_user') as mock_message_user:
+            load_descriptions(jira_connection_admin, request, Story.objects.all())
+        assert [story.ticket_number for story in mock_load_descriptions.call_args[0][0]] == ['FIAE-1', 'FIAE-2']
+        mock_message_user.assert_called_once_with(request, *expected_message)
 
 
 class TestJiraConnectionAdmin:
@@ -72,36 +74,84 @@ class TestJiraConnectionAdmin:
         response = admin_client.get(reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'),
                                             args=[jira_connection.id]))
         assert isinstance(response.context_data['form'].form, ImportStoriesForm)
+        assert response.context_data['search_cache_stats'] == {'hits': 0, 'misses': 0}
 
-    @pytest.mark.parametrize('side_effect, expected_errors, expected_message', (
-        # The side effect has to be a list inside a list because `side_effect` will return the next element whenever it
-        # is an iterable.
-        ([[Story(ticket_number='FIAE-1', title='Write tests', description='Write some tests.')]], None,
-         ('1 story was successfully imported.', messages.SUCCESS)),
-        (JIRAError(status_code=1337), {'jql_query': ['Received status code 1337.']}, None),
-        (ConnectionError(), {'__all__': ['Failed to connect to server. Is "http://test_url" the correct API URL?']},
-         None),
-        (RequestException(), {
-            '__all__': ['There was an ambiguous error with your request. Check if all your data is correct.']
-        }, None)
+    @pytest.mark.parametrize('form_data, expected_job_data', (
+        ({}, {'username': '', 'description_format': '', 'import_story_points': None, 'upsert': False,
+              'use_cache': True, 'atomic': False}),
+        ({'username': 'other', 'description_format': 'none', 'import_story_points': 'true', 'update_existing': 'on',
+          'bypass_cache': 'on', 'all_or_nothing': 'on'},
+         {'username': 'other', 'description_format': 'none', 'import_story_points': True, 'upsert': True,
+          'use_cache': False, 'atomic': True}),
     ))
-    @patch('planning_poker_jira.admin.JiraConnectionAdmin.message_user')
-    @patch('planning_poker_jira.models.JiraConnection.get_client')
-    @patch('planning_poker_jira.models.JiraConnection.create_stories')
-    def test_import_stories_view_post(self, mock_create_stories, mock_get_client, mock_message_user, admin_client,
-                                      jira_connection, jira_connection_admin, side_effect, expected_errors,
-                                      expected_message):
-
-        mock_create_stories.side_effect = side_effect
-        jql_query = 'key in "FIAE-1"'
-        response = admin_client.post(reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'),
-                                             args=[jira_connection.id]), {'jql_query': jql_query,
-                                                                          'poker_session': ''})
-        mock_create_stories.assert_called_with(jql_query, None, mock_get_client())
-        if expected_errors:
-            assert response.context_data['form'].form.errors == expected_errors
-        if expected_message:
-            mock_message_user.assert_called_with(response.wsgi_request, *expected_message)
+    @patch('planning_poker_jira.admin.enqueue')
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_import_stories_view_post(self, mock_enqueue, admin_client, jira_connection, jira_connection_admin,
+                                      poker_session, form_data, expected_job_data):
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[jira_connection.id])
+        response = admin_client.post(url, dict(form_data, jql_query='project = FIAE', poker_session=poker_session.pk))
+        job = ImportJob.objects.get()
+        assert (job.connection, job.poker_session, job.jql_query, job.status) == (
+            jira_connection, poker_session, 'project = FIAE', ImportJob.Status.PENDING
+        )
+        assert {field: getattr(job, field) for field in expected_job_data} == expected_job_data
+        mock_enqueue.assert_called_once_with(job)
+        assert response.url == reverse('admin:planning_poker_jira_importjob_progress', args=[job.pk])
+
+    @patch('planning_poker_jira.admin.enqueue')
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_import_stories_view_post_excluded_keys(self, mock_enqueue, admin_client, jira_connection,
+                                                    jira_connection_admin):
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[jira_connection.id])
+        admin_client.post(url, {'jql_query': 'project = FIAE', 'excluded_keys': ['FIAE-1'],
+                                'shown_keys': ['FIAE-2', 'FIAE-3'], 'selected_keys': ['FIAE-3'], '_import': 'Import'})
+        assert ImportJob.objects.get().jql_query == '(project = FIAE) AND key not in ("FIAE-1", "FIAE-2")'
+
+    @pytest.mark.parametrize('page, expected_page', (('2', 2), ('foo', 1)))
+    def test_import_stories_view_preview(self, admin_client, fake_jira, jira_connection_admin, settings, page,
+                                         expected_page):
+        settings.JIRA_PREVIEW_PAGE_SIZE = 4
+        connection = JiraConnection.objects.create(api_url=fake_jira.url, username='testuser', password='secret')
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[connection.id])
+        response = admin_client.post(url, {'jql_query': 'project = FAKE', 'excluded_keys': ['FAKE-1'],
+                                           'shown_keys': ['FAKE-2', 'FAKE-3'], 'selected_keys': ['FAKE-3'],
+                                           '_preview': page})
+        preview = response.context_data['preview']
+        assert (preview.total, preview.page) == (10, expected_page)
+        assert response.context_data['excluded_keys'] == ['FAKE-1', 'FAKE-2']
+        assert not ImportJob.objects.exists()
+        content = response.content.decode()
+        assert 'The query matches 10 issues.' in content
+        assert '<input type="hidden" name="excluded_keys" value="FAKE-2">' in content
+
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    @patch('planning_poker_jira.models.JiraConnection.preview_issues')
+    def test_import_stories_view_preview_multiple_queries(self, mock_preview_issues, admin_client, jira_connection,
+                                                          jira_connection_admin):
+        mock_preview_issues.return_value = IssuePreview(0, 1, 50, [])
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[jira_connection.id])
+        admin_client.post(url, {'jql_query': 'component = Foo\r\ncomponent = Bar ORDER BY rank', '_preview': '1'})
+        assert mock_preview_issues.call_args.args[0] == '(component = Foo) OR (component = Bar)'
+
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    @patch('planning_poker_jira.models.JiraConnection.preview_issues', Mock(side_effect=JIRAError(400, 'Bad query')))
+    def test_import_stories_view_preview_error(self, admin_client, jira_connection, jira_connection_admin):
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[jira_connection.id])
+        response = admin_client.post(url, {'jql_query': 'project = ', '_preview': '1'})
+        assert response.context_data['form'].form.errors == {'__all__': ['Bad query']}
+        assert response.context_data['preview'] is None
+
+    @patch('planning_poker_jira.admin.enqueue')
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock(side_effect=ConnectionError()))
+    def test_import_stories_view_post_invalid(self, mock_enqueue, admin_client, jira_connection,
+                                              jira_connection_admin):
+        url = reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'), args=[jira_connection.id])
+        response = admin_client.post(url, {'jql_query': 'project = FIAE', 'poker_session': ''})
+        assert response.context_data['form'].form.errors == {
+            '__all__': ['Failed to connect to server. Is "http://test_url" the correct API URL?']
+        }
+        assert not ImportJob.objects.exists()
+        mock_enqueue.assert_not_called()
 
     def test_import_stories_view_no_object_found(self, admin_client, jira_connection_admin):
         response = admin_client.get(reverse(admin_urlname(jira_connection_admin.opts, 'import_stories'),
@@ -122,6 +172,125 @@ class TestJiraConnectionAdmin:
             expected_result = ('label', 'api_url', 'username', 'password', 'story_points_field', 'test_connection')
         assert fields == expected_result
 
+    def test_get_fieldsets(self, jira_connection_admin):
+        fieldsets = jira_connection_admin.get_fieldsets(None)
+        assert fieldsets[0][1]['fields'] == jira_connection_admin.get_fields(None)
+        assert fieldsets[1][1]['fields'] == ('description_format', 'import_story_points')
+        assert fieldsets[2][1]['fields'] == ('pool_connections', 'pool_maxsize', 'keep_alive', 'compression',
+                                             'proxy_url', 'num_workers')
+        assert fieldsets[3][1]['fields'] == ('webhook_secret',)
+
     def test_get_import_stories_url(self, jira_connection, jira_connection_admin):
         import_stories_tag = jira_connection_admin.get_import_stories_url(jira_connection)
         assert import_stories_tag == '<a href="/admin/planning_poker_jira/jiraconnection/1/import_stories/">Import</a>'
+
+
+class TestImportJobAdmin:
+    @pytest.fixture
+    def import_job_admin(self):
+        return ImportJobAdmin(ImportJob, site)
+
+    @pytest.fixture
+    def import_job(self, jira_connection):
+        return ImportJob.objects.create(connection=jira_connection, jql_query='project = FIAE', num_pages=2,
+                                        num_imported=150, total=300, status=ImportJob.Status.RUNNING)
+
+    def test_permissions(self, import_job_admin, rf):
+        assert not import_job_admin.has_add_permission(rf.get('/'))
+        assert not import_job_admin.has_change_permission(rf.get('/'))
+
+    def test_get_progress_url(self, import_job_admin, import_job):
+        assert import_job_admin.get_progress_url(import_job) == (
+            '<a href="/admin/planning_poker_jira/importjob/{}/progress/">Progress</a>'.format(import_job.pk)
+        )
+
+    def test_progress_view(self, admin_client, import_job):
+        response = admin_client.get(reverse('admin:planning_poker_jira_importjob_progress', args=[import_job.pk]))
+        assert response.context_data['job'] == import_job
+        assert response.context_data['status_url'] == reverse('admin:planning_poker_jira_importjob_status',
+                                                              args=[import_job.pk])
+        assert response.context_data['title'] == 'Importing stories from "http://test_url"'
+        assert response.context_data['websocket_path'] == '/jira/import_jobs/{}/'.format(import_job.pk)
+        assert b'<td id="job-num-imported">150</td>' in response.content
+
+    def test_progress_view_no_object_found(self, admin_client):
+        response = admin_client.get(reverse('admin:planning_poker_jira_importjob_progress', args=[9001]))
+        assert response.status_code == 302
+
+    def test_status_view(self, admin_client, import_job):
+        response = admin_client.get(reverse('admin:planning_poker_jira_importjob_status', args=[import_job.pk]))
+        assert response.json() == {
+            'status': 'running',
+            'status_display': 'Running',
+            'is_finished': False,
+            'elapsed': 0,
+            'num_pages': 2,
+            'num_imported': 150,
+            'num_updated': 0,
+            'total': 300,
+            'error': '',
+        }
+
+    def test_status_view_no_object_found(self, admin_client):
+        response = admin_client.get(reverse('admin:planning_poker_jira_importjob_status', args=[9001]))
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('view_name', ('progress', 'status'))
+    def test_view_permission(self, client, django_user_model, import_job, view_name):
+        user = django_user_model.objects.create_user('staff', is_staff=True)
+        client.force_login(user)
+        url = reverse('admin:planning_poker_jira_importjob_{}'.format(view_name), args=[import_job.pk])
+        assert client.get(url).status_code == 403
+        user.user_permissions.add(Permission.objects.get(codename='view_importjob'))
+        assert client.get(url).status_code == 200
+
+
+class TestExportJobAdmin:
+    def test_progress_view(self, admin_client, jira_connection):
+        job = ExportJob.objects.create(connection=jira_connection, num_stories=3, num_exported=1, num_failed=1,
+                                       failures='"FIAE-2" could not be exported.')
+        response = admin_client.get(reverse('admin:planning_poker_jira_exportjob_progress', args=[job.pk]))
+        assert response.context_data['title'] == 'Exporting story points to "http://test_url"'
+        assert response.context_data['websocket_path'] == '/jira/export_jobs/{}/'.format(job.pk)
+        assert b'<li>&quot;FIAE-2&quot; could not be exported.</li>' in response.content
+
+    def test_list_display(self):
+        assert 'get_progress_url' in ExportJobAdmin(ExportJob, site).list_display
+
+
+class TestSavedQueryAdmin:
+    @pytest.fixture
+    def saved_query_admin(self):
+        return SavedQueryAdmin(SavedQuery, site)
+
+    @pytest.mark.parametrize('action, remove_missing', (
+        ('sync_stories', False),
+        ('sync_stories_and_remove_missing', True),
+    ))
+    @patch('planning_poker_jira.admin.submit')
+    @patch('planning_poker_jira.admin.get_executor')
+    def test_sync(self, mock_get_executor, mock_submit, jira_connection, saved_query_admin, rf, action,
+                  remove_missing):
+        saved_query = SavedQuery.objects.create(connection=jira_connection, jql_query='project = FIAE')
+        request = rf.post('/')
+        with patch.object(saved_query_admin, 'message_user') as mock_message_user:
+            getattr(saved_query_admin, action)(request, SavedQuery.objects.all())
+        mock_submit.assert_called_once_with(mock_get_executor.return_value, sync_saved_query, saved_query.pk,
+                                            remove_missing)
+        mock_message_user.assert_called_once_with(
+            request, '1 saved query is being synchronized in the background. Reload this page to see its outcome.',
+            messages.SUCCESS
+        )
+
+    @patch('planning_poker_jira.admin.submit')
+    @patch('planning_poker_jira.admin.get_executor', Mock(return_value=None))
+    def test_sync_without_workers(self, mock_submit, jira_connection, saved_query_admin, rf):
+        SavedQuery.objects.create(connection=jira_connection, jql_query='project = FIAE')
+        request = rf.post('/')
+        with patch.object(saved_query_admin, 'message_user') as mock_message_user:
+            saved_query_admin.sync_stories(request, SavedQuery.objects.all())
+        mock_submit.assert_not_called()
+        mock_message_user.assert_called_once_with(
+            request, 'The saved queries can only be synchronized by the "jira_sync" management command because the '
+                     'in-process workers are disabled.', messages.ERROR
+        )
@@ -0,0 +1,66 @@
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+from planning_poker.models import PokerSession, Story
+from planning_poker_jira.models import JiraConnection
+
+from .fake_jira import FakeJira
+
+pytestmark = pytest.mark.benchmark
+
+NUM_ISSUES = (10, 1000, 10000)
+
+
+@pytest.fixture(params=NUM_ISSUES, ids=lambda num_issues: '{}_issues'.format(num_issues))
+def benchmark_jira(request):
+    with FakeJira(num_issues=request.param, latency=request.config.getoption('--benchmark-latency'),
+                  description_size=2000) as fake_jira:
+        yield fake_jira
+
+
+@pytest.fixture
+def benchmark_connection(db, benchmark_jira):
+    return JiraConnection.objects.create(api_url=benchmark_jira.url, username='benchmark', password='benchmark',
+                                         story_points_field='customfield_10002')
+
+
+def measure(function, *args, **kwargs):
+    """Call the function and return its wall time in seconds and the peak of the memory allocated during the call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        function(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return duration, peak
+
+
+def report(capsys, operation, num_issues, duration, peak):
+    with capsys.disabled():
+        print('\n{operation}: {num_issues} issues in {duration:.2f}s ({throughput:.0f} issues/s), '
+              'peak memory {peak:.1f} MiB'.format(operation=operation, num_issues=num_issues, duration=duration,
+                                                  throughput=num_issues / duration, peak=peak / 2 ** 20))
+
+
+def test_create_stories(benchmark_connection, benchmark_jira, capsys):
+    poker_session = PokerSession.objects.create(poker_date=datetime.now(), name='benchmark')
+    client = benchmark_connection.get_client()
+    duration, peak = measure(benchmark_connection.create_stories, 'project = FAKE', poker_session, client)
+    num_imported_stories = poker_session.stories.count()
+    report(capsys, 'create_stories', num_imported_stories, duration, peak)
+    assert num_imported_stories == len(benchmark_jira.issues)
+
+
+def test_export_story_points(benchmark_connection, benchmark_jira, capsys):
+    Story.objects.bulk_create(Story(ticket_number=key, title=issue['summary'], story_points=3, _order=index)
+                              for index, (key, issue) in enumerate(benchmark_jira.issues.items()))
+    client = benchmark_connection.get_client()
+    duration, peak = measure(benchmark_connection.export_story_points, Story.objects.all(), client)
+    num_issues = len(benchmark_jira.issues)
+    report(capsys, 'export_story_points', num_issues, duration, peak)
+    assert all(issue['customfield_10002'] == 3 for issue in benchmark_jira.issues.values())
@@ -0,0 +1,276 @@
+import hashlib
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from jira import JIRAError
+from requests import Response, Session
+from requests.exceptions import ConnectionError, ReadTimeout
+
+from planning_poker_jira.clients import (CircuitBreaker, CircuitBreakerOpen, ClientPool, LazyClient, SearchCache,
+                                         get_client_fingerprint, get_credentials_fingerprint)
+
+
+@pytest.fixture
+def pool():
+    return ClientPool()
+
+
+def test_get_client_fingerprint(fake_jira_connection):
+    client = fake_jira_connection.get_client()
+    expected_fingerprint = get_credentials_fingerprint(fake_jira_connection.username, fake_jira_connection.password)
+    assert get_client_fingerprint(client) == expected_fingerprint
+
+
+def test_get_credentials_fingerprint():
+    fingerprint = get_credentials_fingerprint('testuser', 'supersecret')
+    assert 'supersecret' not in fingerprint
+    assert fingerprint == get_credentials_fingerprint('testuser', 'supersecret')
+    assert fingerprint != get_credentials_fingerprint('testuser', 'evenmoresupersecret')
+    assert fingerprint != get_credentials_fingerprint('testusers', 'upersecret')
+
+
+def test_get_credentials_fingerprint_secret_key(settings):
+    fingerprint = get_credentials_fingerprint('testuser', 'supersecret')
+    assert fingerprint != hashlib.sha256(b'testuser\0supersecret').hexdigest()
+    settings.SECRET_KEY = 'other'
+    assert get_credentials_fingerprint('testuser', 'supersecret') != fingerprint
+
+
+class TestClientPool:
+    def test_get(self, pool):
+        factory = Mock()
+        client = pool.get(('http://test_url', 'testuser', 'fingerprint'), factory)
+        assert client is factory.return_value
+        assert pool.get(('http://test_url', 'testuser', 'fingerprint'), factory) is client
+        factory.assert_called_once()
+
+    def test_get_factory_raises(self, pool):
+        with pytest.raises(ValueError):
+            pool.get(('http://test_url',), Mock(side_effect=ValueError))
+        assert len(pool) == 0
+
+    @patch('planning_poker_jira.clients.time.monotonic')
+    def test_get_expired(self, mock_monotonic, pool, settings):
+        settings.JIRA_CLIENT_POOL_TTL = 10
+        factory = Mock(side_effect=[Mock(), Mock()])
+        mock_monotonic.return_value = 100
+        first_client = pool.get(('http://test_url',), factory)
+        mock_monotonic.return_value = 109
+        assert pool.get(('http://test_url',), factory) is first_client
+        mock_monotonic.return_value = 110
+        assert pool.get(('http://test_url',), factory) is not first_client
+        assert factory.call_count == 2
+
+    def test_get_evicts_least_recently_used(self, pool, settings):
+        settings.JIRA_CLIENT_POOL_SIZE = 2
+        pool.get(('http://first',), Mock())
+        pool.get(('http://second',), Mock())
+        pool.get(('http://first',), Mock())
+        pool.get(('http://third',), Mock())
+        assert list(pool._clients) == [('http://first',), ('http://third',)]
+
+    def test_invalidate(self, pool):
+        pool.get(('http://first', 'testuser'), Mock())
+        pool.get(('http://first', 'otheruser'), Mock())
+        pool.get(('http://second', 'testuser'), Mock())
+        pool.invalidate('http://first')
+        assert list(pool._clients) == [('http://second', 'testuser')]
+
+    def test_clear(self, pool):
+        pool.get(('http://first',), Mock())
+        pool.clear()
+        assert len(pool) == 0
+
+
+class TestLazyClient:
+    def test_resolve(self):
+        factory = Mock()
+        client = LazyClient(factory)
+        factory.assert_not_called()
+        assert client.resolve() is factory.return_value
+        assert client.resolve() is factory.return_value
+        factory.assert_called_once()
+
+    def test_getattr(self):
+        factory = Mock()
+        client = LazyClient(factory)
+        client.search_issues('project=FIAE')
+        factory.return_value.search_issues.assert_called_once_with('project=FIAE')
+
+    def test_getattr_factory_raises(self):
+        client = LazyClient(Mock(side_effect=ValueError))
+        with pytest.raises(ValueError):
+            client.search_issues('project=FIAE')
+
+
+def response(status_code):
+    response = Response()
+    response.status_code = status_code
+    return response
+
+
+@pytest.fixture
+def circuit_breaker(settings):
+    settings.JIRA_CIRCUIT_BREAKER_THRESHOLD = 2
+    settings.JIRA_CIRCUIT_BREAKER_COOLDOWN = 30
+    return CircuitBreaker('http://test_url')
+
+
+class TestCircuitBreaker:
+    @pytest.mark.parametrize('response_or_exception, expected_result', (
+        (response(200), False),
+        (response(404), False),
+        (response(429), True),
+        (response(503), True),
+        (JIRAError(status_code=401), False),
+        (JIRAError(status_code=502), True),
+        (JIRAError(), True),
+        (ConnectionError(), True),
+        (ReadTimeout(), True),
+        (None, False),
+    ))
+    def test_is_failure(self, circuit_breaker, response_or_exception, expected_result):
+        assert circuit_breaker.is_failure(response_or_exception) == expected_result
+
+    def test_call(self, circuit_breaker):
+        function = Mock(return_value=response(200))
+        assert circuit_breaker.call(function, 'foo', bar='baz') is function.return_value
+        function.assert_called_once_with('foo', bar='baz')
+
+    @patch('planning_poker_jira.clients.time.time')
+    def test_open_and_half_open(self, mock_time, circuit_breaker):
+        mock_time.return_value = 1000
+        failing_function = Mock(side_effect=ConnectionError())
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                circuit_breaker.call(failing_function)
+        assert circuit_breaker.is_open
+
+        mock_time.return_value = 1010
+        with pytest.raises(CircuitBreakerOpen) as exc_info:
+            circuit_breaker.call(failing_function)
+        assert exc_info.value.retry_after == 20
+        assert failing_function.call_count == 2
+
+        # The probe fails, so the breaker stays open for another cooldown.
+        mock_time.return_value = 1030
+        with pytest.raises(ConnectionError):
+            circuit_breaker.call(failing_function)
+        with pytest.raises(CircuitBreakerOpen):
+            circuit_breaker.call(failing_function)
+
+        # The probe succeeds, so the breaker closes again.
+        mock_time.return_value = 1060
+        assert circuit_breaker.call(Mock(return_value=response(200))).status_code == 200
+        assert not circuit_breaker.is_open
+
+    def test_only_one_probe(self, circuit_breaker):
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        with patch('planning_poker_jira.clients.time.time', return_value=time.time() + 60):
+            circuit_breaker.before_request()
+            with pytest.raises(CircuitBreakerOpen):
+                circuit_breaker.before_request()
+
+    def test_success_resets_failures(self, circuit_breaker):
+        circuit_breaker.record_failure()
+        with pytest.raises(JIRAError):
+            circuit_breaker.call(Mock(side_effect=JIRAError(status_code=404)))
+        circuit_breaker.record_failure()
+        assert not circuit_breaker.is_open
+
+    def test_failures_expired(self, circuit_breaker):
+        circuit_breaker.record_failure()
+        with patch('planning_poker_jira.clients.cache.incr', side_effect=ValueError):
+            circuit_breaker.record_failure()
+        assert not circuit_breaker.is_open
+
+    def test_disabled(self, circuit_breaker, settings):
+        settings.JIRA_CIRCUIT_BREAKER_THRESHOLD = 0
+        for _ in range(5):
+            circuit_breaker.record_failure()
+        assert not circuit_breaker.is_open
+
+    def test_unrelated_exception(self, circuit_breaker):
+        with pytest.raises(ValueError):
+            circuit_breaker.call(Mock(side_effect=ValueError))
+
+    def test_shared_state(self, circuit_breaker):
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        assert CircuitBreaker('http://test_url').is_open
+        assert not CircuitBreaker('http://other_url').is_open
+
+    def test_guard(self, circuit_breaker):
+        session = Session()
+        with patch.object(session, 'request', Mock(return_value=response(503))) as mock_request:
+            circuit_breaker.guard(session)
+            session.get('http://test_url')
+            session.get('http://test_url')
+            with pytest.raises(CircuitBreakerOpen):
+                session.get('http://test_url')
+        assert mock_request.call_count == 2
+
+
+class TestSearchCache:
+    @pytest.fixture
+    def search_cache(self):
+        return SearchCache()
+
+    @pytest.fixture
+    def client(self, fake_jira_connection):
+        return fake_jira_connection.get_client()
+
+    def search(self, search_cache, client, fake_jira, jql_str='project = FAKE', **kwargs):
+        return search_cache.search_issues(client, fake_jira.url, jql_str, startAt=kwargs.pop('startAt', 0),
+                                          maxResults=kwargs.pop('maxResults', 5), **kwargs)
+
+    def test_search_issues(self, search_cache, client, fake_jira):
+        page = self.search(search_cache, client, fake_jira, fields=['summary'])
+        cached_page = self.search(search_cache, client, fake_jira, jql_str='  project =   FAKE ', fields=['summary'])
+        assert fake_jira.count_requests('GET', 'search') == 1
+        assert cached_page == page
+        assert (page['total'], page['issues'][0]['fields']) == (10, {'summary': 'Summary of FAKE-1'})
+        assert search_cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    @pytest.mark.parametrize('kwargs', (
+        {'jql_str': 'project = fake'},
+        {'startAt': 5},
+        {'maxResults': 10},
+        {'fields': ['summary', 'description']},
+        {'expand': 'renderedFields'},
+    ))
+    def test_search_issues_different_key(self, search_cache, client, fake_jira, kwargs):
+        self.search(search_cache, client, fake_jira, fields=['summary'])
+        self.search(search_cache, client, fake_jira, **{'fields': ['summary'], **kwargs})
+        assert fake_jira.count_requests('GET', 'search') == 2
+
+    def test_search_issues_different_credentials(self, search_cache, client, fake_jira, fake_jira_connection):
+        fake_jira_connection.password = 'otherpassword'
+        self.search(search_cache, client, fake_jira)
+        self.search(search_cache, fake_jira_connection.get_client(), fake_jira)
+        assert fake_jira.count_requests('GET', 'search') == 2
+
+    def test_search_issues_other_authentication(self, search_cache, client, fake_jira):
+        client._session.auth = None
+        self.search(search_cache, client, fake_jira)
+        self.search(search_cache, client, fake_jira)
+        assert fake_jira.count_requests('GET', 'search') == 2
+
+    def test_search_issues_disabled(self, search_cache, client, fake_jira, settings):
+        settings.JIRA_SEARCH_CACHE_TTL = 0
+        self.search(search_cache, client, fake_jira)
+        self.search(search_cache, client, fake_jira)
+        assert fake_jira.count_requests('GET', 'search') == 2
+        assert search_cache.get_stats() == {'hits': 0, 'misses': 2}
+
+    def test_reset_stats(self, search_cache, client, fake_jira):
+        self.search(search_cache, client, fake_jira)
+        search_cache.reset_stats()
+        assert search_cache.get_stats() == {'hits': 0, 'misses': 0}
+
+    def test_count_reset_in_the_meantime(self, search_cache):
+        with patch('planning_poker_jira.clients.cache.incr', side_effect=ValueError()):
+            search_cache._count('hits')
+        assert search_cache.get_stats() == {'hits': 1, 'misses': 0}
@@ -0,0 +1,270 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import call, patch
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.utils import timezone
+from jira import JIRAError
+
+from planning_poker.models import PokerSession, Story
+from planning_poker_jira.models import ExportJob, ImportJob, SavedQuery
+from planning_poker_jira.utils import map_concurrently
+from planning_poker_jira.webhooks import ISSUE_UPDATED, store_issue_change
+
+from .test_webhooks import issue_payload
+
+
+class TestRunJiraJobs:
+    def test_once(self, fake_jira_connection, poker_session):
+        job = ImportJob.objects.create(connection=fake_jira_connection, poker_session=poker_session,
+                                       jql_query='project = FAKE')
+        finished_job = ImportJob.objects.create(connection=fake_jira_connection, jql_query='project = FAKE',
+                                                status=ImportJob.Status.SUCCEEDED)
+        stdout = StringIO()
+        call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Import job {} succeeded: 10 of 10 stories imported, 0 updated.\n'.format(job.pk)
+        assert poker_session.stories.count() == 10
+        finished_job.refresh_from_db()
+        assert finished_job.num_imported == 0
+
+    def test_export_job(self, fake_jira_connection):
+        job = ExportJob.objects.create(connection=fake_jira_connection, num_stories=1)
+        job.stories.add(Story.objects.create(ticket_number='FAKE-1', title='foo', story_points=3))
+        stdout = StringIO()
+        call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Export job {} succeeded: 1 of 1 stories exported, 0 failed.\n'.format(job.pk)
+
+    def test_failed(self, jira_connection):
+        job = ImportJob.objects.create(connection=jira_connection, jql_query='project = FIAE')
+        stdout = StringIO()
+        with patch('planning_poker_jira.models.JiraConnection.get_client'), \
+                patch('planning_poker_jira.models.JiraConnection.create_stories', side_effect=ValueError()):
+            call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Import job {} failed: 0 of 0 stories imported, 0 updated. ' \
+                                    'Encountered an unknown exception.\n'.format(job.pk)
+
+    def test_stale_job(self, jira_connection):
+        job = ExportJob.objects.create(connection=jira_connection, status=ExportJob.Status.RUNNING,
+                                       started_at=timezone.now() - timedelta(days=1), password='secret')
+        stdout = StringIO()
+        call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Export job {} failed: 0 of 0 stories exported, 0 failed. ' \
+                                    'The job did not finish within 3600 seconds.\n'.format(job.pk)
+        job.refresh_from_db()
+        assert job.password == ''
+
+    def test_issue_changes(self, jira_connection, imported_stories):
+        store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Write better tests'))
+        stdout = StringIO()
+        call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Issue changes applied: 1 stories updated, 0 removed.\n'
+        assert Story.objects.get(ticket_number='FIAE-1').title == 'Write better tests'
+
+    @patch('planning_poker_jira.models.send_story_changed_event')
+    def test_active_story_descriptions(self, mock_send_story_changed_event, fake_jira_connection, poker_session,
+                                       settings):
+        settings.JIRA_DESCRIPTION_PREFETCH = 1
+        fake_jira_connection.description_format = 'lazy'
+        fake_jira_connection.create_stories('project = FAKE', poker_session)
+        PokerSession.objects.filter(pk=poker_session.pk).update(active_story=poker_session.stories.first())
+        stdout = StringIO()
+        call_command('run_jira_jobs', once=True, stdout=stdout)
+        assert stdout.getvalue() == 'Poker session {}: 2 descriptions loaded.\n'.format(poker_session.pk)
+        mock_send_story_changed_event.assert_called_once()
+
+    def test_polling(self, jira_connection):
+        with patch('time.sleep', side_effect=[None, KeyboardInterrupt()]) as mock_sleep, \
+                patch('planning_poker_jira.management.commands.run_jira_jobs.Command.run_pending_jobs') \
+                as mock_run_pending_jobs:
+            try:
+                call_command('run_jira_jobs', interval=2)
+            except KeyboardInterrupt:
+                pass
+        assert mock_run_pending_jobs.call_count == 2
+        mock_sleep.assert_called_with(2)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestJiraSync:
+    """The saved queries are synchronized on worker threads which only see committed data."""
+
+    def test_sync(self, fake_jira_connection, poker_session):
+        saved_query = SavedQuery.objects.create(connection=fake_jira_connection, poker_session=poker_session,
+                                                jql_query='project = FAKE')
+        stdout = StringIO()
+        call_command('jira_sync', stdout=stdout)
+        assert stdout.getvalue().startswith('Saved query {} "project = FAKE" synchronized in '.format(saved_query.pk))
+        assert stdout.getvalue().endswith(': 10 stories created, 0 updated, 0 removed.\n')
+        assert poker_session.stories.count() == 10
+        saved_query.refresh_from_db()
+        assert (saved_query.last_synced_at is not None, saved_query.last_sync_num_imported) == (True, 10)
+
+    def test_failed(self, fake_jira, fake_jira_connection, poker_session, caplog):
+        first_query = SavedQuery.objects.create(connection=fake_jira_connection, jql_query='project = FAKE')
+        second_query = SavedQuery.objects.create(connection=fake_jira_connection, jql_query='project = FOO')
+        fake_jira.error_every = 1
+        fake_jira.error_status = 400
+        stdout = StringIO()
+        with pytest.raises(CommandError, match='^2 of 2 saved queries could not be synchronized.$'):
+            call_command('jira_sync', '--max-queries-per-connection=1', stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        assert lines[0].startswith('Saved query {} "project = FAKE" failed after '.format(first_query.pk))
+        assert lines[0].endswith(': Injected error')
+        assert lines[1].endswith(': Injected error')
+        assert SavedQuery.objects.get(pk=second_query.pk).last_sync_error == 'Injected error'
+        assert caplog.messages == []
+
+    def test_unknown_error(self, fake_jira_connection, caplog):
+        saved_query = SavedQuery.objects.create(connection=fake_jira_connection, jql_query='project = FAKE')
+        with patch('planning_poker_jira.models.JiraConnection.create_stories', side_effect=ValueError()), \
+                pytest.raises(CommandError):
+            call_command('jira_sync', stdout=StringIO())
+        assert caplog.messages == ['Saved query {} could not be synchronized.'.format(saved_query.pk)]
+        assert SavedQuery.objects.get(pk=saved_query.pk).last_sync_error == 'Encountered an unknown exception.'
+
+    @pytest.mark.parametrize('option', ('--max-connections', '--max-queries-per-connection'))
+    def test_invalid_number(self, db, option):
+        with pytest.raises(CommandError, match='0 is not a positive integer.'):
+            call_command('jira_sync', option, '0')
+
+    @patch('planning_poker_jira.management.commands.jira_sync.map_concurrently', side_effect=map_concurrently)
+    @patch('planning_poker_jira.management.commands.jira_sync.Command.describe', return_value='')
+    @patch('planning_poker_jira.management.commands.jira_sync.Command.sync_query', side_effect=lambda query, **_: query)
+    def test_selection(self, mock_sync_query, mock_describe, mock_map_concurrently, jira_connection,
+                       fake_jira_connection):
+        queries = [SavedQuery.objects.create(connection=connection, jql_query='project = FIAE')
+                   for connection in (jira_connection, fake_jira_connection, fake_jira_connection, jira_connection)]
+        call_command('jira_sync', queries[0].pk, queries[1].pk, queries[2].pk, connection_ids=[fake_jira_connection.pk],
+                     max_connections=3, max_queries_per_connection=5, remove_missing=True, stdout=StringIO())
+        assert mock_sync_query.call_args_list == [call(queries[1], remove_missing=True),
+                                                  call(queries[2], remove_missing=True)]
+        # One call for the connections and one for the saved queries of each connection.
+        assert [args[2] for args, _ in mock_map_concurrently.call_args_list] == [3, 5]
+
+
+class TestJiraImport:
+    def test_import(self, fake_jira, fake_jira_connection, poker_session):
+        stdout = StringIO()
+        call_command('jira_import', fake_jira_connection.pk, 'project = FAKE', 'key in (FAKE-1, FAKE-11)',
+                     poker_session=poker_session.pk, description_format='none', workers=2, page_size=4, batch_size=3,
+                     stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        assert lines[:-1] == ['4 of 10 stories imported, 0 updated.', '8 of 10 stories imported, 0 updated.',
+                              '10 of 10 stories imported, 0 updated.', '10 of 10 stories imported, 0 updated.']
+        summary = json.loads(lines[-1])
+        assert summary.pop('duration') >= 0
+        assert summary == {'status': 'succeeded', 'num_imported': 10, 'num_updated': 0, 'total': 10}
+        assert fake_jira.count_requests('GET', 'search') == 4
+        assert set(poker_session.stories.values_list('description', flat=True)) == {''}
+
+    def test_upsert(self, fake_jira, fake_jira_connection, poker_session):
+        call_command('jira_import', fake_jira_connection.pk, 'project = FAKE', poker_session=poker_session.pk,
+                     stdout=StringIO())
+        fake_jira.update_issue('FAKE-2', summary='Changed summary')
+        stdout = StringIO()
+        call_command('jira_import', fake_jira_connection.pk, 'project = FAKE', poker_session=poker_session.pk,
+                     upsert=True, atomic=True, use_cache=True, stdout=stdout)
+        assert json.loads(stdout.getvalue().splitlines()[-1])['num_updated'] == 1
+        assert poker_session.stories.count() == 10
+
+    def test_failed(self, fake_jira, fake_jira_connection):
+        fake_jira_connection.get_client()
+        fake_jira.error_every = 1
+        fake_jira.error_status = 400
+        stdout = StringIO()
+        with pytest.raises(CommandError, match='^Injected error$'):
+            call_command('jira_import', fake_jira_connection.pk, 'project = FAKE', stdout=stdout)
+        summary = json.loads(stdout.getvalue())
+        assert (summary['status'], summary['error'], summary['num_imported']) == ('failed', 'Injected error', 0)
+
+    def test_unknown_error(self, jira_connection, caplog):
+        stdout = StringIO()
+        with patch('planning_poker_jira.models.JiraConnection.create_stories', side_effect=OperationalError()), \
+                pytest.raises(CommandError, match='^Encountered an unknown exception.$'):
+            call_command('jira_import', jira_connection.pk, 'project = FIAE', stdout=stdout)
+        summary = json.loads(stdout.getvalue())
+        assert (summary['status'], summary['error']) == ('failed', 'Encountered an unknown exception.')
+        assert caplog.messages == ['The import from "{}" failed.'.format(jira_connection)]
+
+    @pytest.mark.parametrize('option', ('--workers', '--page-size', '--batch-size'))
+    @pytest.mark.parametrize('value', ('0', '-1'))
+    def test_invalid_number(self, jira_connection, option, value):
+        with pytest.raises(CommandError, match='{} is not a positive integer.'.format(value)):
+            call_command('jira_import', jira_connection.pk, 'project = FAKE', option, value)
+
+    @pytest.mark.parametrize('arguments, expected_message', (
+        ((0, 'project = FAKE'), '^Jira connection 0 does not exist.$'),
+        ((None, 'project = FAKE', '--poker-session=0'), '^Poker session 0 does not exist.$'),
+    ))
+    def test_does_not_exist(self, jira_connection, arguments, expected_message):
+        arguments = [jira_connection.pk if argument is None else argument for argument in arguments]
+        with pytest.raises(CommandError, match=expected_message):
+            call_command('jira_import', *arguments)
+
+
+class TestJiraExport:
+    @pytest.fixture
+    def stories(self, db, poker_session):
+        return [Story.objects.create(ticket_number=ticket_number, title='foo', story_points=story_points,
+                                     poker_session=poker_session if index < 2 else None)
+                for index, (ticket_number, story_points) in enumerate((('FAKE-1', 3), ('FAKE-2', 5), ('FAKE-3', 8)))]
+
+    def test_export(self, fake_jira, fake_jira_connection, poker_session, stories):
+        stdout = StringIO()
+        call_command('jira_export', fake_jira_connection.pk, poker_session=poker_session.pk, workers=2, batch_size=1,
+                     stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        assert lines[:-1] == ['FAKE-1: exported.', 'FAKE-2: exported.']
+        summary = json.loads(lines[-1])
+        assert summary.pop('duration') >= 0
+        assert summary == {'status': 'succeeded', 'num_exported': 2, 'num_failed': 0}
+        story_points = [fake_jira.issues[key].get('customfield_10002') for key in ('FAKE-1', 'FAKE-2', 'FAKE-3')]
+        assert story_points == [3, 5, None]
+
+    def test_failed(self, fake_jira, fake_jira_connection, stories):
+        missing_story = Story.objects.create(ticket_number='FAKE-99', title='bar', story_points=1)
+        stdout = StringIO()
+        with pytest.raises(CommandError, match='^1 of 2 stories could not be exported.$'):
+            call_command('jira_export', fake_jira_connection.pk, stories[2].pk, missing_story.pk, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        assert lines[:-1] == ['FAKE-3: exported.', 'FAKE-99: failed. The story does probably not exist inside '
+                                                   '"{}".'.format(fake_jira_connection)]
+        assert json.loads(lines[-1])['status'] == 'failed'
+
+    def test_no_stories(self, jira_connection):
+        with pytest.raises(CommandError, match='^Pass the ids of the stories or --poker-session.$'):
+            call_command('jira_export', jira_connection.pk)
+
+    def test_connection_does_not_exist(self, db):
+        with pytest.raises(CommandError, match='^Jira connection 0 does not exist.$'):
+            call_command('jira_export', 0, 1)
+
+    @patch('planning_poker_jira.models.JiraConnection.get_client', side_effect=JIRAError(401))
+    def test_client_error(self, mock_get_client, jira_connection, stories):
+        stdout = StringIO()
+        with pytest.raises(CommandError, match='^Could not authenticate the API user'):
+            call_command('jira_export', jira_connection.pk, stories[0].pk, stdout=stdout)
+        summary = json.loads(stdout.getvalue())
+        assert summary.pop('duration') >= 0
+        assert summary.pop('error').startswith('Could not authenticate the API user')
+        assert summary == {'status': 'failed', 'num_exported': 0, 'num_failed': 0}
+
+    def test_unknown_error(self, jira_connection, stories, caplog):
+        stdout = StringIO()
+        with patch('planning_poker_jira.models.JiraConnection.get_client'), \
+                patch('planning_poker_jira.models.JiraConnection.export_story_points',
+                      side_effect=OperationalError()), \
+                pytest.raises(CommandError, match='^Encountered an unknown exception.$'):
+            call_command('jira_export', jira_connection.pk, stories[0].pk, stdout=stdout)
+        summary = json.loads(stdout.getvalue())
+        assert (summary['status'], summary['error']) == ('failed', 'Encountered an unknown exception.')
+        assert caplog.messages == ['The export to "{}" failed.'.format(jira_connection)]
+
+    @pytest.mark.parametrize('option', ('--workers', '--batch-size'))
+    @pytest.mark.parametrize('value', ('0', '-1', 'many'))
+    def test_invalid_number(self, jira_connection, stories, option, value):
+        with pytest.raises(CommandError, match='{} is not a positive integer.'.format(value)):
+            call_command('jira_export', jira_connection.pk, stories[0].pk, option, value)
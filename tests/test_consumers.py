@@ -0,0 +1,73 @@
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, Permission
+
+from planning_poker_jira.models import ImportJob
+from planning_poker_jira.routing import websocket_urlpatterns
+from planning_poker_jira.utils import send_progress_event
+
+
+@pytest.fixture(autouse=True)
+def channel_layer(settings):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    return get_channel_layer()
+
+
+@pytest.fixture
+def import_job(jira_connection):
+    return ImportJob.objects.create(connection=jira_connection, jql_query='project = FIAE', num_imported=3)
+
+
+def create_communicator(path, user):
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+    communicator.scope['user'] = user
+    return communicator
+
+
+@async_to_sync
+async def can_connect(path, user):
+    communicator = create_communicator(path, user)
+    connected, _ = await communicator.connect()
+    await communicator.disconnect()
+    return connected
+
+
+class TestJobProgressConsumer:
+    def test_progress(self, admin_user, import_job):
+        @async_to_sync
+        async def receive_events():
+            communicator = create_communicator('/jira/import_jobs/{}/'.format(import_job.pk), admin_user)
+            await communicator.connect()
+            initial_event = await communicator.receive_json_from()
+            import_job.num_imported = 5
+            await sync_to_async(import_job.send_progress)('page_imported')
+            await sync_to_async(send_progress_event)('planning_poker_jira.importjob.9001', 'page_imported', {})
+            progress_event = await communicator.receive_json_from()
+            received_nothing = await communicator.receive_nothing()
+            await communicator.disconnect()
+            return initial_event, progress_event, received_nothing
+
+        initial_event, progress_event, received_nothing = receive_events()
+        assert (initial_event['event'], initial_event['data']['num_imported']) == ('progress', 3)
+        assert progress_event == {'event': 'page_imported', 'data': import_job.get_progress()}
+        # Events of other jobs are not forwarded.
+        assert received_nothing
+
+    @pytest.mark.parametrize('path', ('/jira/import_jobs/9001/', '/jira/export_jobs/{}/'))
+    def test_missing_job(self, admin_user, import_job, path):
+        assert not can_connect(path.format(import_job.pk), admin_user)
+
+    def test_permission(self, django_user_model, import_job):
+        user = django_user_model.objects.create_user('staff', is_staff=True)
+        path = '/jira/import_jobs/{}/'.format(import_job.pk)
+        assert not can_connect(path, AnonymousUser())
+        assert not can_connect(path, user)
+        user.user_permissions.add(Permission.objects.get(codename='view_importjob'))
+        assert can_connect(path, django_user_model.objects.get(pk=user.pk))
+
+    def test_no_channel_layer(self, settings, admin_user, import_job):
+        settings.CHANNEL_LAYERS = {}
+        assert not can_connect('/jira/import_jobs/{}/'.format(import_job.pk), admin_user)
@@ -6,6 +6,7 @@ from requests.exceptions import ConnectionError, RequestException
 
 from planning_poker_jira.forms import (ExportStoryPointsForm, ImportStoriesForm, JiraAuthenticationForm,
                                        JiraConnectionForm)
+from planning_poker_jira.models import FieldProjection
 
 try:
     from contextlib import nullcontext as does_not_raise
@@ -118,6 +119,21 @@ class TestJiraAuthenticationForm:
     def test_requires_connection_test(self):
         assert JiraAuthenticationForm()._requires_connection_test()
 
+    @pytest.mark.parametrize('defer_authentication', (True, False))
+    def test_defers_connection_test(self, defer_authentication, settings):
+        settings.JIRA_DEFER_AUTHENTICATION = defer_authentication
+        assert JiraAuthenticationForm()._defers_connection_test() == defer_authentication
+
+    @pytest.mark.parametrize('defer_authentication', (True, False))
+    def test_clean_deferred(self, defer_authentication, jira_connection, settings):
+        settings.JIRA_DEFER_AUTHENTICATION = defer_authentication
+        jira_authentication_form = JiraAuthenticationForm()
+        jira_authentication_form.cleaned_data = {}
+        with patch.object(jira_authentication_form, '_get_connection', Mock(return_value=jira_connection)):
+            with patch.object(jira_connection, 'get_client') as mock_get_client:
+                jira_authentication_form.clean()
+        mock_get_client.assert_called_once_with(verify=not defer_authentication)
+
 
 class TestJiraConnectionForm:
     def test_init(self):
@@ -138,6 +154,17 @@ class TestJiraConnectionForm:
         for attribute, value in expected_data.items():
             assert getattr(connection, attribute) == value
 
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_get_connection_transport_options(self, jira_connection, form_data):
+        form = JiraConnectionForm(dict(**form_data, pool_connections=2, pool_maxsize=25, keep_alive=False,
+                                       compression=True, proxy_url='http://proxy:3128'), instance=jira_connection)
+        form.is_valid()
+        connection = form._get_connection()
+        assert connection.get_transport_options() == {
+            'pool_connections': 2, 'pool_maxsize': 25, 'keep_alive': False, 'compression': True,
+            'proxy_url': 'http://proxy:3128'
+        }
+
     @pytest.mark.parametrize('delete_password_checked', (True, False))
     @pytest.mark.parametrize('entered_password', ('', 'custom password'))
     def test_clean(self, delete_password_checked, entered_password, form_data, jira_connection):
@@ -161,12 +188,19 @@ class TestJiraConnectionForm:
         form.is_valid()
         assert form._requires_connection_test() == test_connection_checked
 
+    def test_defers_connection_test(self, settings):
+        settings.JIRA_DEFER_AUTHENTICATION = True
+        assert not JiraConnectionForm()._defers_connection_test()
+
 
 class TestExportStoryPointsForm:
     @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
     def test_get_connection(self, jira_connection, form_data, expected_data):
+        jira_connection.proxy_url = 'http://proxy:3128'
+        jira_connection.save()
         form_data = dict(**form_data, jira_connection=jira_connection)
         expected_data['api_url'] = jira_connection.api_url
+        expected_data['proxy_url'] = jira_connection.proxy_url
         form = ExportStoryPointsForm(form_data)
         form.is_valid()
         connection = form._get_connection()
@@ -182,9 +216,60 @@ class TestImportStoriesForm:
 
     @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
     def test_get_connection(self, jira_connection, form_data, expected_data):
+        jira_connection.pool_maxsize = 25
         form = ImportStoriesForm(jira_connection, form_data)
         expected_data['api_url'] = jira_connection.api_url
+        expected_data['pool_maxsize'] = 25
         form.is_valid()
         connection = form._get_connection()
         for attribute, value in expected_data.items():
             assert getattr(connection, attribute) == value
+
+    @pytest.mark.parametrize('form_data, expected_projection', (
+        ({}, FieldProjection('raw', None)),
+        ({'description_format': 'none'}, FieldProjection('none', None)),
+        ({'import_story_points': 'true'}, FieldProjection('raw', 'testfield')),
+        ({'description_format': 'rendered', 'import_story_points': 'false'}, FieldProjection('rendered', None)),
+    ))
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_get_field_projection(self, form_data, expected_projection, jira_connection):
+        jira_connection.description_format = 'raw'
+        form = ImportStoriesForm(jira_connection, dict(form_data, jql_query='project = FIAE'))
+        assert form.is_valid()
+        assert form.get_field_projection() == expected_projection
+
+    @pytest.mark.parametrize('form_data, expected_keys, expected_query_string', (
+        ({}, set(), 'project = FIAE ORDER BY rank'),
+        ({'shown_keys': ['FIAE-1', 'FIAE-2'], 'selected_keys': ['FIAE-1', 'FIAE-2']}, set(),
+         'project = FIAE ORDER BY rank'),
+        ({'shown_keys': ['FIAE-1', 'FIAE-2', 'FIAE-3'], 'selected_keys': ['FIAE-2']}, {'FIAE-1', 'FIAE-3'},
+         '(project = FIAE) AND key not in ("FIAE-1", "FIAE-3") ORDER BY rank'),
+        ({'excluded_keys': ['FIAE-1', 'FIAE-5'], 'shown_keys': ['FIAE-5', 'FIAE-6'], 'selected_keys': ['FIAE-5']},
+         {'FIAE-1', 'FIAE-6'}, '(project = FIAE) AND key not in ("FIAE-1", "FIAE-6") ORDER BY rank'),
+    ))
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_get_query_string(self, form_data, expected_keys, expected_query_string, jira_connection):
+        form = ImportStoriesForm(jira_connection, dict(form_data, jql_query='project = FIAE ORDER BY rank'))
+        assert form.is_valid()
+        assert form.get_excluded_keys() == expected_keys
+        assert form.get_query_string() == expected_query_string
+
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_invalid_keys(self, jira_connection):
+        form = ImportStoriesForm(jira_connection, {'jql_query': 'project = FIAE',
+                                                   'excluded_keys': ['FIAE-1', 'FIAE-1") OR ("1', ' ']})
+        assert form.errors == {'excluded_keys': ['Invalid issue keys: FIAE-1") OR ("1']}
+
+    @pytest.mark.parametrize('form_data, expected_queries', (
+        ({}, ['project = FIAE', 'component = Bar ORDER BY rank']),
+        ({'shown_keys': ['FIAE-1'], 'excluded_keys': ['FIAE-2']},
+         ['(project = FIAE) AND key not in ("FIAE-1", "FIAE-2")',
+          '(component = Bar) AND key not in ("FIAE-1", "FIAE-2") ORDER BY rank']),
+    ))
+    @patch('planning_poker_jira.models.JiraConnection.get_client', Mock())
+    def test_get_queries(self, form_data, expected_queries, jira_connection):
+        form = ImportStoriesForm(jira_connection,
+                                 dict(form_data, jql_query='project = FIAE\n\ncomponent = Bar ORDER BY rank'))
+        assert form.is_valid()
+        assert form.get_queries() == expected_queries
+        assert form.get_query_string() == '\n'.join(expected_queries)
@@ -0,0 +1,153 @@
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+from django.utils import timezone
+from jira import JIRAError
+from requests.exceptions import ConnectionError
+
+from planning_poker_jira import jobs
+from planning_poker_jira.jobs import _recover_jobs
+from planning_poker_jira.models import ExportJob, ImportJob, SavedQuery
+
+
+@pytest.fixture(autouse=True)
+def reset_executor():
+    jobs._executor = jobs._description_executor = None
+    yield
+    for executor in (jobs._executor, jobs._description_executor):
+        if executor is not None:
+            executor.shutdown()
+    jobs._executor = jobs._description_executor = None
+
+
+@pytest.fixture
+def import_job(jira_connection):
+    return ImportJob.objects.create(connection=jira_connection, jql_query='project = FIAE')
+
+
+def test_get_executor(settings):
+    settings.JIRA_JOB_WORKERS = 3
+    executor = jobs.get_executor()
+    assert executor._max_workers == 3
+    assert jobs.get_executor() is executor
+    # The jobs of previous processes are recovered once.
+    jobs._recover_jobs.assert_called_once_with()
+
+
+def test_recover_jobs(jira_connection, import_job, settings):
+    settings.JIRA_JOB_TIMEOUT = 60
+    stale_job = ExportJob.objects.create(connection=jira_connection, status=ExportJob.Status.RUNNING,
+                                         started_at=timezone.now() - timedelta(hours=1))
+    finished_job = ImportJob.objects.create(connection=jira_connection, status=ImportJob.Status.SUCCEEDED)
+    mock_executor = Mock()
+    with patch.object(jobs, 'get_executor', return_value=mock_executor):
+        jobs.recover_jobs()
+    mock_executor.submit.assert_called_once_with(jobs.run_job, ImportJob, import_job.pk)
+    stale_job.refresh_from_db()
+    assert stale_job.status == ExportJob.Status.FAILED
+    finished_job.refresh_from_db()
+    assert finished_job.status == ImportJob.Status.SUCCEEDED
+
+
+def test_recover_jobs_disabled(import_job, settings):
+    settings.JIRA_JOB_WORKERS = 0
+    jobs.recover_jobs()
+    import_job.refresh_from_db()
+    assert import_job.status == ImportJob.Status.PENDING
+
+
+@pytest.mark.parametrize('side_effect, expected_messages', (
+    (None, []),
+    (ValueError(), ['Could not recover the jobs of previous processes.']),
+))
+@patch('planning_poker_jira.jobs.connection')
+@patch('planning_poker_jira.jobs.recover_jobs')
+def test_recover_jobs_on_worker(mock_recover_jobs, mock_connection, side_effect, expected_messages, caplog):
+    mock_recover_jobs.side_effect = side_effect
+    _recover_jobs()
+    mock_recover_jobs.assert_called_once_with()
+    mock_connection.close.assert_called_once_with()
+    assert caplog.messages == expected_messages
+
+
+def test_get_executor_disabled(settings):
+    settings.JIRA_JOB_WORKERS = 0
+    assert jobs.get_executor() is None
+
+
+def test_get_description_executor(settings):
+    settings.JIRA_DESCRIPTION_WORKERS = 2
+    executor = jobs.get_description_executor()
+    assert executor._max_workers == 2
+    assert jobs.get_description_executor() is executor
+    assert executor is not jobs.get_executor()
+
+
+@pytest.mark.parametrize('job_workers, description_workers', ((0, 1), (2, 0)))
+def test_get_description_executor_disabled(settings, job_workers, description_workers):
+    settings.JIRA_JOB_WORKERS = job_workers
+    settings.JIRA_DESCRIPTION_WORKERS = description_workers
+    assert jobs.get_description_executor() is None
+
+
+def test_enqueue(import_job, django_capture_on_commit_callbacks):
+    mock_executor = Mock()
+    with patch.object(jobs, 'get_executor', return_value=mock_executor):
+        with django_capture_on_commit_callbacks(execute=True):
+            jobs.enqueue(import_job)
+            # The job is only submitted once the transaction which created it was committed.
+            mock_executor.submit.assert_not_called()
+    mock_executor.submit.assert_called_once_with(jobs.run_job, ImportJob, import_job.pk)
+
+
+def test_enqueue_disabled(import_job, settings, django_capture_on_commit_callbacks):
+    settings.JIRA_JOB_WORKERS = 0
+    with django_capture_on_commit_callbacks() as callbacks:
+        jobs.enqueue(import_job)
+    assert callbacks == []
+
+
+@patch('planning_poker_jira.jobs.connection')
+@patch('planning_poker_jira.models.ExportJob.run', autospec=True)
+@patch('planning_poker_jira.models.ImportJob.run', autospec=True)
+def test_run_job(mock_import_run, mock_export_run, mock_connection, import_job):
+    jobs.run_job(ImportJob, import_job.pk)
+    jobs.run_job(ExportJob, import_job.pk)
+    mock_import_run.assert_called_once_with(import_job)
+    mock_export_run.assert_not_called()
+    assert mock_connection.close.call_count == 2
+
+
+@patch('planning_poker_jira.jobs.connection')
+@patch('planning_poker_jira.jobs.load_active_story_descriptions')
+def test_load_descriptions(mock_load_active_story_descriptions, mock_connection):
+    jobs.load_descriptions(42)
+    mock_load_active_story_descriptions.assert_called_once_with(42)
+    mock_connection.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize('side_effect, logged', (
+    (None, False),
+    (ConnectionError(), False),
+    (JIRAError(), False),
+    (KeyError(), True),
+))
+@patch('planning_poker_jira.jobs.connection')
+@patch('planning_poker_jira.models.SavedQuery.sync', autospec=True)
+def test_sync_saved_query(mock_sync, mock_connection, jira_connection, side_effect, logged):
+    saved_query = SavedQuery.objects.create(connection=jira_connection, jql_query='project = FIAE')
+    mock_sync.side_effect = side_effect
+    with patch.object(jobs.logger, 'exception') as mock_exception:
+        jobs.sync_saved_query(saved_query.pk, remove_missing=True)
+    mock_sync.assert_called_once_with(saved_query, remove_missing=True)
+    assert mock_exception.called is logged
+    mock_connection.close.assert_called_once_with()
+
+
+@patch('planning_poker_jira.jobs.connection')
+@patch('planning_poker_jira.models.SavedQuery.sync')
+def test_sync_deleted_saved_query(mock_sync, mock_connection, db):
+    jobs.sync_saved_query(42)
+    mock_sync.assert_not_called()
+    mock_connection.close.assert_called_once_with()
@@ -1,7 +1,24 @@
-from unittest.mock import Mock, patch
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import Mock, call, patch
 
 import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from jira import Issue, JIRAError
+from requests.exceptions import ConnectionError, RequestException
+
+from planning_poker.models import PokerSession, Story
+from planning_poker_jira.clients import CircuitBreakerOpen
+from planning_poker_jira.models import (BackgroundJob, DeferredDescription, ExportJob, FieldProjection, ImportedStory,
+                                        ImportJob, ImportResult, IssuePreview, IssueRecord, JiraConnection, SavedQuery,
+                                        load_active_story_descriptions, load_deferred_descriptions)
+from planning_poker_jira.utils import get_error_text
+
+from .fake_jira import FakeJira
 
 try:
     from contextlib import nullcontext as does_not_raise
@@ -11,15 +28,170 @@ except ImportError:
     from contextlib import suppress as does_not_raise
 
 
+def expected_headers(**overrides):
+    return {
+        'Cache-Control': 'no-cache',
+        'Content-Type': 'application/json',
+        'X-Atlassian-Token': 'no-check',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        **overrides
+    }
+
+
+def issue(key, summary='write tests', description='<p>foo</p>'):
+    return Issue(None, None, {'key': key, 'fields': {'summary': summary},
+                              'renderedFields': {'description': description}})
+
+
+def search_result(issues, total, max_results=50):
+    return {'startAt': 0, 'maxResults': max_results, 'total': total, 'issues': [issue.raw for issue in issues]}
+
+
+class TestFieldProjection:
+    @pytest.mark.parametrize('projection, expected_fields, expected_expand', (
+        (FieldProjection(), ['summary', 'description'], 'renderedFields'),
+        (FieldProjection('raw'), ['summary', 'description'], None),
+        (FieldProjection('none'), ['summary'], None),
+        (FieldProjection('none', 'customfield_10002'), ['summary', 'customfield_10002'], None),
+        (FieldProjection('lazy'), ['summary'], None),
+    ))
+    def test_search_parameters(self, projection, expected_fields, expected_expand):
+        assert projection.fields == expected_fields
+        assert projection.expand == expected_expand
+
+    @pytest.mark.parametrize('projection, expected_story_fields', (
+        (FieldProjection(), ['title', 'description']),
+        (FieldProjection('none'), ['title']),
+        (FieldProjection('raw', 'customfield_10002'), ['title', 'description', 'story_points']),
+        (FieldProjection('lazy'), ['title']),
+    ))
+    def test_story_fields(self, projection, expected_story_fields):
+        assert projection.story_fields == expected_story_fields
+
+    @pytest.mark.parametrize('projection, raw_issue, expected_description, expected_story_points', (
+        (FieldProjection(), {'fields': {'summary': 'foo'}, 'renderedFields': {'description': '<p>bar</p>'}},
+         '<p>bar</p>', None),
+        (FieldProjection(), {'fields': {'summary': 'foo'}, 'renderedFields': {'description': None}}, '', None),
+        (FieldProjection('raw'), {'fields': {'summary': 'foo', 'description': '*bar*'}}, '*bar*', None),
+        (FieldProjection('none', 'customfield_10002'), {'fields': {'summary': 'foo', 'customfield_10002': 5.0}}, '',
+         5),
+        (FieldProjection('none', 'customfield_10002'), {'fields': {'summary': 'foo', 'customfield_10002': None}}, '',
+         None),
+    ))
+    def test_create_story(self, projection, raw_issue, expected_description, expected_story_points):
+        story = projection.create_story(Issue(None, None, dict(raw_issue, key='FIAE-1')), _order=3)
+        assert (story.ticket_number, story.title, story.description, story.story_points, story._order) == (
+            'FIAE-1', 'foo', expected_description, expected_story_points, 3
+        )
+
+        record = projection.create_record(dict(raw_issue, key='FIAE-1'))
+        assert (record.key, record.summary, record.description, record.story_points) == (
+            'FIAE-1', 'foo', expected_description, expected_story_points
+        )
+
+    @pytest.mark.parametrize('story_points', (0.5, 4, 100, -1, 'many', [5]))
+    def test_create_record_invalid_story_points(self, story_points, caplog):
+        record = FieldProjection('none', 'customfield_10002').create_record(
+            {'key': 'FIAE-1', 'fields': {'summary': 'foo', 'customfield_10002': story_points}}
+        )
+        assert record.story_points is None
+        assert caplog.messages == [
+            'The story points "{}" of "FIAE-1" are not one of the available story points and were skipped.'.format(
+                story_points
+            )
+        ]
+
+    @pytest.mark.parametrize('story_points, expected_story_points', ((8, 8), (13.0, 13), ('21', 21)))
+    def test_create_record_story_points(self, story_points, expected_story_points):
+        record = FieldProjection('none', 'customfield_10002').create_record(
+            {'key': 'FIAE-1', 'fields': {'summary': 'foo', 'customfield_10002': story_points}}
+        )
+        assert record.story_points == expected_story_points
+
+    def test_create_page(self):
+        page = FieldProjection('none').create_page({
+            'startAt': 50, 'maxResults': 50, 'total': 51, 'issues': [{'key': 'FIAE-51', 'fields': {'summary': 'foo'}}]
+        })
+        assert [(record.key, record.summary) for record in page] == [('FIAE-51', 'foo')]
+        assert (page.startAt, page.maxResults, page.total) == (50, 50, 51)
+
+    def test_issue_record_slots(self):
+        with pytest.raises(AttributeError):
+            IssueRecord('FIAE-1', 'foo').fields = {}
+
+
 class TestJiraConnection:
     @patch('planning_poker_jira.models.JIRA')
     def test_get_client(self, mock_jira, jira_connection):
         jira_connection.get_client()
         mock_jira.assert_called_with(
-            jira_connection.api_url, basic_auth=(jira_connection.username, jira_connection.password), timeout=(3.05, 7),
-            max_retries=0
+            jira_connection.api_url, options={'headers': expected_headers()},
+            basic_auth=(jira_connection.username, jira_connection.password), get_server_info=True, timeout=(3.05, 7),
+            max_retries=0, proxies=None
         )
 
+    @patch('planning_poker_jira.models.JIRA')
+    def test_get_client_transport_options(self, mock_jira, jira_connection):
+        jira_connection.pool_connections = 2
+        jira_connection.pool_maxsize = 25
+        jira_connection.keep_alive = False
+        jira_connection.compression = False
+        jira_connection.proxy_url = 'http://proxy:3128'
+        client = jira_connection.get_client()
+        _, kwargs = mock_jira.call_args
+        assert kwargs['options'] == {'headers': expected_headers(**{'Accept-Encoding': 'identity',
+                                                                    'Connection': 'close'})}
+        assert kwargs['proxies'] == {'http': 'http://proxy:3128', 'https': 'http://proxy:3128'}
+        assert [mount_call.args[0] for mount_call in client._session.mount.call_args_list] == ['http://', 'https://']
+        adapter = client._session.mount.call_args.args[1]
+        assert (adapter._pool_connections, adapter._pool_maxsize) == (2, 25)
+
+    def test_get_client_key(self, jira_connection):
+        key = jira_connection.get_client_key()
+        jira_connection.pool_maxsize = 25
+        assert jira_connection.get_client_key() != key
+
+    def test_get_transport_options(self, jira_connection):
+        assert jira_connection.get_transport_options() == {
+            'pool_connections': 10, 'pool_maxsize': 10, 'keep_alive': True, 'compression': True, 'proxy_url': ''
+        }
+
+    @patch('planning_poker_jira.models.JIRA')
+    def test_get_client_deferred(self, mock_jira, jira_connection):
+        client = jira_connection.get_client(verify=False)
+        mock_jira.assert_not_called()
+        client.search_issues('project=FIAE')
+        _, kwargs = mock_jira.call_args
+        assert not kwargs['get_server_info']
+        mock_jira.return_value.search_issues.assert_called_once_with('project=FIAE')
+        jira_connection.get_client(verify=False).search_issues('project=FIAE')
+        assert mock_jira.call_count == 1
+        # The unverified client is never handed out to callers which expect a verified one.
+        jira_connection.get_client()
+        assert mock_jira.call_count == 2
+        _, kwargs = mock_jira.call_args
+        assert kwargs['get_server_info']
+
+    @patch('planning_poker_jira.models.JIRA')
+    def test_get_client_pooled(self, mock_jira, jira_connection):
+        assert jira_connection.get_client() is jira_connection.get_client()
+        mock_jira.assert_called_once()
+        jira_connection.password = 'evenmoresupersecret'
+        jira_connection.get_client()
+        assert mock_jira.call_count == 2
+
+    @pytest.mark.parametrize('invalidate', (
+        lambda connection: connection.save(),
+        lambda connection: connection.delete(),
+    ))
+    @patch('planning_poker_jira.models.JIRA')
+    def test_get_client_invalidated(self, mock_jira, invalidate, jira_connection):
+        jira_connection.get_client()
+        invalidate(jira_connection)
+        jira_connection.get_client()
+        assert mock_jira.call_count == 2
+
     @patch('planning_poker_jira.models.JIRA')
     @pytest.mark.parametrize(
         'expectation, side_effect, expected_result',
@@ -28,7 +200,7 @@ class TestJiraConnection:
             (
                 does_not_raise(),
                 [
-                    [
+                    search_result([
                         Issue(
                             None,
                             None,
@@ -47,7 +219,7 @@ class TestJiraConnection:
                                 'key': 'FIAE-2'
                             }
                         ),
-                    ]
+                    ], total=2)
                 ],
                 [
                     {'ticket_number': 'FIAE-1', 'title': 'write tests', 'description': 'foo'},
@@ -64,8 +236,769 @@ class TestJiraConnection:
         mock_client.search_issues.side_effect = side_effect
 
         with expectation:
-            jira_connection.create_stories('project=FIAE', poker_session)
+            result = jira_connection.create_stories('project=FIAE', poker_session)
+            assert result == ImportResult(num_imported=2, total=2)
         assert list(poker_session.stories.values('ticket_number', 'title', 'description')) == expected_result
         mock_client.search_issues.assert_called_with(
-            jql_str='project=FIAE', expand='renderedFields', fields=['summary', 'description']
+            jql_str='project=FIAE', startAt=0, maxResults=100, expand='renderedFields',
+            fields=['summary', 'description'], json_result=True
+        )
+
+    @pytest.mark.parametrize('description_format, import_story_points, expected_projection', (
+        (None, None, FieldProjection('raw', 'testfield')),
+        ('none', False, FieldProjection('none', None)),
+    ))
+    def test_get_field_projection(self, description_format, import_story_points, expected_projection,
+                                  jira_connection):
+        jira_connection.description_format = 'raw'
+        jira_connection.import_story_points = True
+        assert jira_connection.get_field_projection(description_format, import_story_points) == expected_projection
+
+    def test_create_stories_projection(self, jira_connection, poker_session):
+        mock_client = Mock()
+        mock_client.search_issues.return_value = search_result([
+            Issue(None, None, {'key': 'FIAE-1', 'fields': {'summary': 'foo', 'testfield': 3}})
+        ], total=1)
+        projection = FieldProjection('none', 'testfield')
+        jira_connection.create_stories('project=FIAE', poker_session, mock_client, projection)
+        assert mock_client.search_issues.call_args.kwargs['fields'] == ['summary', 'testfield']
+        assert mock_client.search_issues.call_args.kwargs['expand'] is None
+        assert list(poker_session.stories.values_list('title', 'description', 'story_points')) == [('foo', '', 3)]
+
+    def test_create_stories_paginated(self, jira_connection, poker_session, stories, settings):
+        settings.JIRA_PAGE_SIZE = 2
+        stories[0].poker_session = poker_session
+        stories[0].save()
+        pages = {
+            0: search_result([issue('FIAE-3'), issue('FIAE-4')], total=5),
+            2: search_result([issue('FIAE-5'), issue('FIAE-6')], total=5),
+            4: search_result([issue('FIAE-7')], total=5),
+        }
+        mock_client = Mock()
+        mock_client.search_issues.side_effect = lambda startAt, **kwargs: pages[startAt]
+        result = jira_connection.create_stories('project=FIAE', poker_session, mock_client)
+        assert result == ImportResult(num_imported=5, total=5)
+        assert sorted(search_call.kwargs['startAt'] for search_call in mock_client.search_issues.call_args_list) == [
+            0, 2, 4
+        ]
+        assert list(poker_session.stories.values_list('ticket_number', '_order')) == [
+            ('FIAE-1', 0), ('FIAE-3', 1), ('FIAE-4', 2), ('FIAE-5', 3), ('FIAE-6', 4), ('FIAE-7', 5)
+        ]
+
+    def test_create_stories_concurrent(self, jira_connection, poker_session):
+        # Another import appends a story to the poker session while the pages are being imported.
+        pages = {
+            0: search_result([issue('FIAE-1'), issue('FIAE-2')], total=3),
+            2: search_result([issue('FIAE-3')], total=3),
+        }
+        mock_client = Mock()
+        mock_client.search_issues.side_effect = lambda startAt, **kwargs: pages[startAt]
+        progress_callback = Mock(side_effect=lambda result: jira_connection._store_stories(
+            [issue('OTHER-{}'.format(result.num_imported))], FieldProjection('none'), poker_session
+        ))
+        jira_connection.create_stories('project=FIAE', poker_session, mock_client,
+                                       progress_callback=progress_callback)
+        assert list(poker_session.stories.values_list('ticket_number', '_order')) == [
+            ('FIAE-1', 0), ('FIAE-2', 1), ('OTHER-2', 2), ('FIAE-3', 3), ('OTHER-3', 4)
+        ]
+
+    def test_store_stories_batches(self, jira_connection, poker_session, settings):
+        settings.JIRA_BULK_CREATE_BATCH_SIZE = 3
+        issues = (issue('FIAE-{}'.format(number)) for number in range(1, 9))
+        with CaptureQueriesContext(connection) as context:
+            assert jira_connection._store_stories(issues, FieldProjection('none'), poker_session) == 8
+        assert sum(query['sql'].startswith('INSERT INTO "planning_poker_story"')
+                   for query in context.captured_queries) == 3
+        assert list(poker_session.stories.values_list('_order', flat=True)) == list(range(8))
+
+    @pytest.mark.parametrize('atomic, expected_stories', ((False, ['FIAE-1', 'FIAE-2']), (True, [])))
+    def test_create_stories_atomic(self, jira_connection, poker_session, atomic, expected_stories):
+        mock_client = Mock()
+        mock_client.search_issues.side_effect = [search_result([issue('FIAE-1'), issue('FIAE-2')], total=3),
+                                                 ConnectionError()]
+        with pytest.raises(ConnectionError):
+            jira_connection.create_stories('project=FIAE', poker_session, mock_client, atomic=atomic)
+        assert list(poker_session.stories.values_list('ticket_number', flat=True)) == expected_stories
+
+    @pytest.mark.parametrize('orders, expected_order_start', (([], 0), ([0, 1], 2), ([0, 7, 3], 8)))
+    def test_get_order_start(self, jira_connection, poker_session, django_assert_num_queries, orders,
+                             expected_order_start):
+        Story.objects.bulk_create([Story(ticket_number='FIAE-{}'.format(order), title='Story', _order=order,
+                                         poker_session=poker_session) for order in orders])
+        # The poker session is locked before the highest order is aggregated.
+        with django_assert_num_queries(2):
+            assert jira_connection._get_order_start(poker_session) == expected_order_start
+
+    def test_get_order_start_without_poker_session(self, jira_connection, stories, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            assert jira_connection._get_order_start() == 2
+
+    def test_create_stories_capped_page_size(self, jira_connection, poker_session):
+        pages = {
+            0: search_result([issue('FIAE-1'), issue('FIAE-2')], total=3, max_results=2),
+            2: search_result([issue('FIAE-3')], total=3, max_results=2),
+        }
+        mock_client = Mock()
+        mock_client.search_issues.side_effect = lambda startAt, **kwargs: pages[startAt]
+        assert jira_connection.create_stories('project=FIAE', poker_session, mock_client) == ImportResult(3, 3)
+        assert mock_client.search_issues.call_args.kwargs['maxResults'] == 2
+
+    def test_create_stories_truncated(self, jira_connection, poker_session):
+        # Issues which are deleted while the pages are being fetched lead to a shorter result than announced.
+        mock_client = Mock()
+        mock_client.search_issues.side_effect = [search_result([issue('FIAE-1')], total=3), search_result([], total=2)]
+        result = jira_connection.create_stories('project=FIAE', poker_session, mock_client)
+        assert result == ImportResult(num_imported=1, total=3)
+
+    def test_create_stories_no_results(self, jira_connection, poker_session):
+        mock_client = Mock()
+        mock_client.search_issues.return_value = search_result([], total=0)
+        assert jira_connection.create_stories('project=FIAE', poker_session, mock_client) == ImportResult(0, 0)
+
+    @pytest.mark.parametrize('side_effect', (None, JIRAError(status_code=404), ConnectionError(), RequestException()))
+    def test_export_story_points(self, side_effect, jira_connection, stories):
+        mock_client = Mock()
+        mock_client._get_url.side_effect = lambda path: 'http://test_url/rest/api/2/' + path
+        mock_client._session.put.side_effect = side_effect
+        results = jira_connection.export_story_points(stories, mock_client)
+        assert [story for story, _ in results] == stories
+        assert [error for _, error in results] == [side_effect] * len(stories)
+        # The issues are updated without fetching them first.
+        mock_client.issue.assert_not_called()
+        mock_client._session.put.assert_called_with(
+            'http://test_url/rest/api/2/issue/FIAE-2', data='{"fields": {"testfield": null}}'
+        )
+
+    def test_export_story_points_concurrently(self, jira_connection):
+        jira_connection.num_workers = 4
+        stories = [Story(ticket_number='FIAE-{}'.format(number), story_points=number) for number in range(8)]
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def put(url, data):
+            id = url.rsplit('/', 1)[1]
+            with lock:
+                running.append(id)
+                max_running.append(len(running))
+            # The earlier stories take longer, so they finish last.
+            time.sleep((8 - int(id.split('-')[1])) / 200)
+            with lock:
+                running.remove(id)
+            if id == 'FIAE-2':
+                raise JIRAError(404)
+            return Mock()
+
+        mock_client = Mock()
+        mock_client._get_url.side_effect = lambda path: 'http://test_url/rest/api/2/' + path
+        mock_client._session.put.side_effect = put
+        progress_callback = Mock()
+        results = jira_connection.export_story_points(stories, mock_client, progress_callback)
+        assert [(story, getattr(error, 'status_code', None)) for story, error in results] == [
+            (story, 404 if story.ticket_number == 'FIAE-2' else None) for story in stories
+        ]
+        assert [call_args[0] for call_args in progress_callback.call_args_list] == results
+        assert 1 < max(max_running) <= 4
+
+
+class TestJiraConnectionWithFakeJira:
+    def test_create_stories(self, fake_jira, fake_jira_connection, poker_session):
+        assert fake_jira_connection.create_stories('project = FAKE', poker_session) == ImportResult(10, 10)
+        assert list(poker_session.stories.values_list('ticket_number', 'title')) == [
+            (key, issue['summary']) for key, issue in fake_jira.issues.items()
+        ]
+        assert poker_session.stories.first().description.startswith('<p>Description of FAKE-1')
+        assert set(ImportedStory.objects.values_list('connection', flat=True)) == {fake_jira_connection.pk}
+        assert ImportedStory.objects.count() == 10
+
+    def test_create_stories_upsert(self, fake_jira, fake_jira_connection, poker_session):
+        fake_jira_connection.create_stories('key in (FAKE-1, FAKE-2)', poker_session)
+        fake_jira.update_issue('FAKE-2', summary='Changed summary')
+        # Stories which were imported before they were linked to their connection.
+        ImportedStory.objects.filter(story__ticket_number='FAKE-1').delete()
+        result = fake_jira_connection.create_stories('project = FAKE', poker_session, upsert=True)
+        assert result == ImportResult(num_imported=8, total=10, num_updated=1)
+        assert list(poker_session.stories.values_list('ticket_number', 'title')) == [
+            (key, issue['summary']) for key, issue in fake_jira.issues.items()
+        ]
+        assert ImportedStory.objects.count() == 10
+
+    @pytest.mark.parametrize('upsert', (False, True))
+    def test_create_stories_page_and_batch_size(self, fake_jira, fake_jira_connection, poker_session, upsert):
+        with CaptureQueriesContext(connection) as context:
+            result = fake_jira_connection.create_stories('project = FAKE', poker_session, upsert=upsert, page_size=3,
+                                                         batch_size=4)
+        assert result == ImportResult(10, 10)
+        assert fake_jira.count_requests('GET', 'search') == 4
+        # One insert per batch of each page.
+        assert sum(query['sql'].startswith('INSERT INTO "planning_poker_story"')
+                   for query in context.captured_queries) == 4
+        assert poker_session.stories.count() == 10
+
+    def test_create_stories_multiple_queries(self, fake_jira, fake_jira_connection, poker_session, settings):
+        settings.JIRA_PAGE_SIZE = 2
+        progress_callback = Mock()
+        result = fake_jira_connection.create_stories(
+            ['key in (FAKE-7, FAKE-8, FAKE-9)', 'key in (FAKE-2, FAKE-8)', 'key in (FAKE-1, FAKE-2)'], poker_session,
+            progress_callback=progress_callback
+        )
+        assert result == ImportResult(num_imported=5, total=5)
+        assert list(poker_session.stories.values_list('ticket_number', flat=True)) == [
+            'FAKE-7', 'FAKE-8', 'FAKE-9', 'FAKE-2', 'FAKE-1'
+        ]
+        assert progress_callback.call_args_list == [
+            call(ImportResult(2, 3)), call(ImportResult(3, 3)), call(ImportResult(4, 4)), call(ImportResult(5, 5))
+        ]
+        assert fake_jira.count_requests('GET', 'search') == 4
+
+    def test_create_stories_multiple_queries_streamed(self, fake_jira, fake_jira_connection, poker_session):
+        num_searches = []
+        fake_jira_connection.create_stories(
+            ['key in (FAKE-1)', 'key in (FAKE-2)', 'key in (FAKE-3)'], poker_session,
+            progress_callback=lambda result: num_searches.append(fake_jira.count_requests('GET', 'search'))
+        )
+        # Each page is imported before the next query is sent.
+        assert num_searches == [1, 2, 3]
+
+    def test_count_issues(self, fake_jira, fake_jira_connection):
+        assert fake_jira_connection.count_issues('project = FAKE') == 10
+        assert fake_jira_connection.count_issues('key in (FAKE-1, FAKE-2)') == 2
+
+    @pytest.mark.parametrize('page, expected_page, expected_keys', (
+        (1, 1, ['FAKE-1', 'FAKE-2', 'FAKE-3', 'FAKE-4']),
+        (3, 3, ['FAKE-9', 'FAKE-10']),
+        (0, 1, ['FAKE-1', 'FAKE-2', 'FAKE-3', 'FAKE-4']),
+        (42, 3, ['FAKE-9', 'FAKE-10']),
+    ))
+    def test_preview_issues(self, fake_jira, fake_jira_connection, settings, page, expected_page, expected_keys):
+        settings.JIRA_PREVIEW_PAGE_SIZE = 4
+        preview = fake_jira_connection.preview_issues('project = FAKE', page=page)
+        assert (preview.total, preview.page, preview.page_size, preview.num_pages) == (10, expected_page, 4, 3)
+        assert preview.issues == [(key, 'Summary of {}'.format(key)) for key in expected_keys]
+        assert fake_jira.count_requests('GET', 'search') == 2
+
+    def test_preview_issues_no_match(self, fake_jira, fake_jira_connection):
+        assert fake_jira_connection.preview_issues('key in (NOPE-1)') == IssuePreview(0, 1, 50, [])
+        assert fake_jira.count_requests('GET', 'search') == 1
+
+    @pytest.mark.parametrize('use_cache, expected_requests', ((True, 3), (False, 6)))
+    def test_create_stories_use_cache(self, fake_jira, fake_jira_connection, poker_session, settings, use_cache,
+                                      expected_requests):
+        settings.JIRA_PAGE_SIZE = 4
+        fake_jira_connection.create_stories('project = FAKE', poker_session, use_cache=use_cache)
+        result = fake_jira_connection.create_stories('project = FAKE', poker_session, use_cache=use_cache)
+        assert result == ImportResult(10, 10)
+        assert fake_jira.count_requests('GET', 'search') == expected_requests
+        assert poker_session.stories.last().description.startswith('<p>Description of FAKE-10')
+
+    def test_create_stories_progress_callback(self, fake_jira_connection, poker_session, settings):
+        settings.JIRA_PAGE_SIZE = 4
+        progress_callback = Mock()
+        fake_jira_connection.create_stories('project = FAKE', poker_session, progress_callback=progress_callback)
+        assert progress_callback.call_args_list == [
+            call(ImportResult(4, 10)), call(ImportResult(8, 10)), call(ImportResult(10, 10))
+        ]
+
+    def test_create_stories_large_backlog(self, fake_jira_connection, poker_session, settings):
+        settings.JIRA_PAGE_SIZE = 1000
+        with FakeJira(num_issues=5000, description_size=10, max_results_limit=500) as fake_jira:
+            fake_jira_connection.api_url = fake_jira.url
+            result = fake_jira_connection.create_stories('project = FAKE', poker_session)
+        assert result == ImportResult(num_imported=5000, total=5000)
+        assert fake_jira.count_requests('GET', 'search') == 10
+        assert poker_session.stories.count() == 5000
+        assert poker_session.stories.last().ticket_number == 'FAKE-5000'
+
+    def test_create_stories_concurrently(self, fake_jira_connection, poker_session):
+        fake_jira_connection.num_workers = 4
+        with FakeJira(num_issues=100, latency=0.1, max_results_limit=10) as fake_jira:
+            fake_jira_connection.api_url = fake_jira.url
+            client = fake_jira_connection.get_client()
+            result = fake_jira_connection.create_stories('project = FAKE', poker_session, client)
+        assert result == ImportResult(num_imported=100, total=100)
+        assert list(poker_session.stories.values_list('ticket_number', flat=True)) == list(fake_jira.issues)
+        # The first page is fetched on its own, the other nine pages by up to four workers at the same time.
+        assert fake_jira.count_requests('GET', 'search') == 10
+        assert 1 < fake_jira.max_concurrent_requests <= 4
+
+    def test_export_story_points(self, fake_jira, fake_jira_connection):
+        stories = [Story(ticket_number='FAKE-1', story_points=5), Story(ticket_number='MISSING-1', story_points=8)]
+        client = fake_jira_connection.get_client()
+        num_requests = len(fake_jira.requests)
+        results = fake_jira_connection.export_story_points(stories, client)
+        assert [getattr(error, 'status_code', None) for _, error in results] == [None, 404]
+        assert get_error_text(results[1][1], connection=fake_jira_connection) == \
+            'The story does probably not exist inside "{}".'.format(fake_jira_connection)
+        assert fake_jira.issues['FAKE-1']['customfield_10002'] == 5
+        # A single request per story.
+        assert sorted(fake_jira.requests[num_requests:]) == [('PUT', 'issue/FAKE-1'), ('PUT', 'issue/MISSING-1')]
+
+    def test_export_story_points_progress_callback(self, fake_jira_connection):
+        stories = [Story(ticket_number='FAKE-1', story_points=5), Story(ticket_number='MISSING-1', story_points=8)]
+        progress_callback = Mock()
+        fake_jira_connection.export_story_points(stories, progress_callback=progress_callback)
+        assert [(story, getattr(error, 'status_code', None)) for (story, error), _ in
+                progress_callback.call_args_list] == [(stories[0], None), (stories[1], 404)]
+
+    def test_error_injection(self, fake_jira, fake_jira_connection):
+        fake_jira.error_every = 1
+        fake_jira.error_status = 429
+        with pytest.raises(JIRAError) as exc_info:
+            fake_jira_connection.get_client()
+        assert exc_info.value.status_code == 429
+
+    def test_circuit_breaker(self, fake_jira, fake_jira_connection, settings):
+        settings.JIRA_CIRCUIT_BREAKER_THRESHOLD = 2
+        client = fake_jira_connection.get_client()
+        fake_jira.error_every = 1
+        for _ in range(2):
+            with pytest.raises(JIRAError):
+                client.search_issues('project = FAKE')
+        num_requests = len(fake_jira.requests)
+        with pytest.raises(CircuitBreakerOpen):
+            client.search_issues('project = FAKE')
+        with pytest.raises(CircuitBreakerOpen):
+            JiraConnection(api_url=fake_jira.url, username='otheruser').get_client()
+        assert len(fake_jira.requests) == num_requests
+
+
+class TestApplyIssueChanges:
+    @staticmethod
+    def raw_issue(key, summary, description='', story_points=None):
+        return {'key': key, 'fields': {'summary': summary, 'description': description, 'testfield': story_points}}
+
+    def test_update(self, jira_connection, poker_session, imported_stories):
+        jira_connection.description_format = 'raw'
+        jira_connection.import_story_points = True
+        story = Story.objects.create(ticket_number='FIAE-1', title='Write tests', poker_session=poker_session)
+        ImportedStory.objects.create(story=story, connection=jira_connection)
+        result = jira_connection.apply_issue_changes([
+            self.raw_issue('FIAE-1', 'Write better tests', 'Better tests need to be written.', 5),
+            self.raw_issue('FIAE-2', 'Write more tests', 'More tests need to be written.'),
+            self.raw_issue('FIAE-3', 'Unknown issue'),
+        ])
+        assert result == (2, 0)
+        updated_stories = Story.objects.filter(ticket_number='FIAE-1')
+        assert list(updated_stories.values_list('title', 'description', 'story_points')) == [
+            ('Write better tests', 'Better tests need to be written.', 5)
+        ] * 2
+        assert Story.objects.get(ticket_number='FIAE-2').title == 'Write more tests'
+
+    def test_update_rendered_description(self, jira_connection, imported_stories):
+        cache.set(jira_connection._get_description_cache_key('FIAE-1'), '<p>Old</p>')
+        result = jira_connection.apply_issue_changes([
+            self.raw_issue('FIAE-1', 'Write tests', '*New*'),
+            self.raw_issue('FIAE-2', 'Write even more tests', '*New*'),
+        ], changed_description_keys={'FIAE-1'})
+        assert result == (1, 0)
+        assert list(Story.objects.values_list('title', 'description')) == [
+            ('Write tests', 'Tests need to be written.'), ('Write even more tests', 'More tests need to be written.')
+        ]
+        # The rendered description is loaded on demand.
+        assert list(DeferredDescription.objects.values_list('story__ticket_number', 'connection')) == [
+            ('FIAE-1', jira_connection.pk)
+        ]
+        assert cache.get(jira_connection._get_description_cache_key('FIAE-1')) is None
+
+    def test_delete(self, jira_connection, poker_session, imported_stories):
+        Story.objects.filter(ticket_number='FIAE-1').update(poker_session=poker_session)
+        poker_session.active_story = Story.objects.get(ticket_number='FIAE-1')
+        poker_session.save()
+        assert jira_connection.apply_issue_changes([], ['FIAE-1', 'FIAE-2']) == (0, 1)
+        poker_session.refresh_from_db()
+        assert poker_session.active_story is None
+        assert Story.objects.filter(poker_session=None).count() == 2
+
+    def test_stories_of_other_connections(self, jira_connection, poker_session, stories):
+        other_connection = JiraConnection.objects.create(api_url='https://other.example.com')
+        ImportedStory.objects.bulk_create([ImportedStory(story=story, connection=other_connection)
+                                           for story in Story.objects.all()])
+        Story.objects.filter(ticket_number='FIAE-2').update(poker_session=poker_session)
+        assert jira_connection.apply_issue_changes([self.raw_issue('FIAE-1', 'Changed')], ['FIAE-2']) == (0, 0)
+        assert list(Story.objects.values_list('title', 'poker_session')) == [
+            ('Write tests', None), ('Write more tests', poker_session.pk)
+        ]
+
+
+class TestSavedQuery:
+    @pytest.fixture
+    def saved_query(self, fake_jira_connection, poker_session):
+        return SavedQuery.objects.create(connection=fake_jira_connection, poker_session=poker_session,
+                                         jql_query='project = FAKE ORDER BY key')
+
+    def test_get_delta_query(self, saved_query):
+        now = timezone.now()
+        assert saved_query.get_delta_query(now) == 'project = FAKE ORDER BY key'
+        saved_query.last_synced_at = now - timedelta(minutes=10, seconds=1)
+        assert saved_query.get_delta_query(now) == '(project = FAKE) AND updated >= "-12m" ORDER BY key'
+
+    def test_sync(self, fake_jira, saved_query, poker_session):
+        assert saved_query.sync() == ImportResult(num_imported=10, total=10)
+        assert saved_query.last_synced_at is not None
+        assert list(poker_session.stories.values_list('ticket_number', flat=True)) == list(fake_jira.issues)
+
+        # Pretend the last synchronization was a while ago and nothing changed since then.
+        saved_query.last_synced_at -= timedelta(minutes=10)
+        fake_jira.updated_at = {key: time.time() - 3600 for key in fake_jira.updated_at}
+        fake_jira.update_issue('FAKE-2', summary='Changed summary')
+        fake_jira.update_issue('FAKE-11', summary='New issue')
+        result = saved_query.sync()
+        assert result == ImportResult(num_imported=1, total=2, num_updated=1)
+        assert poker_session.stories.get(ticket_number='FAKE-2').title == 'Changed summary'
+        assert poker_session.stories.last().ticket_number == 'FAKE-11'
+        assert poker_session.stories.count() == 11
+
+    def test_sync_stats(self, fake_jira, saved_query):
+        saved_query.last_sync_error = 'Failed to connect to server.'
+        saved_query.sync()
+        saved_query.refresh_from_db()
+        assert (saved_query.last_sync_num_imported, saved_query.last_sync_num_updated,
+                saved_query.last_sync_num_removed, saved_query.last_sync_error) == (10, 0, 0, '')
+        assert saved_query.last_sync_duration > timedelta(0)
+
+    def test_sync_error(self, fake_jira, saved_query, poker_session):
+        saved_query.sync()
+        fake_jira.error_every = 1
+        fake_jira.error_status = 400
+        with pytest.raises(JIRAError):
+            saved_query.sync()
+        saved_query.refresh_from_db()
+        assert saved_query.last_sync_error == 'Injected error'
+        assert saved_query.last_sync_num_imported == 10
+        assert poker_session.stories.count() == 10
+
+    def test_sync_unchanged(self, fake_jira, saved_query, poker_session):
+        saved_query.sync()
+        assert saved_query.sync() == ImportResult(num_imported=0, total=10, num_updated=0)
+        assert poker_session.stories.count() == 10
+
+    def test_sync_remove_missing(self, fake_jira, saved_query, poker_session):
+        saved_query.sync()
+        poker_session.active_story = poker_session.stories.get(ticket_number='FAKE-3')
+        poker_session.save()
+        del fake_jira.issues['FAKE-3']
+        assert saved_query.sync(remove_missing=True).num_removed == 1
+        poker_session.refresh_from_db()
+        assert poker_session.active_story is None
+        assert not poker_session.stories.filter(ticket_number='FAKE-3').exists()
+        assert Story.objects.filter(ticket_number='FAKE-3', poker_session=None).exists()
+
+    def test_sync_keeps_descriptions_if_not_imported(self, fake_jira, saved_query, poker_session):
+        saved_query.sync()
+        saved_query.connection.description_format = 'none'
+        fake_jira.update_issue('FAKE-1', summary='Changed summary')
+        saved_query.sync()
+        story = poker_session.stories.get(ticket_number='FAKE-1')
+        assert (story.title, story.description.startswith('<p>Description')) == ('Changed summary', True)
+
+
+class TestImportJob:
+    @pytest.fixture
+    def import_job(self, fake_jira_connection, poker_session):
+        return ImportJob.objects.create(connection=fake_jira_connection, poker_session=poker_session,
+                                        jql_query='project = FAKE', password='override')
+
+    def test_run(self, import_job, poker_session, settings):
+        settings.JIRA_PAGE_SIZE = 3
+        import_job.run()
+        import_job.refresh_from_db()
+        assert (import_job.status, import_job.num_pages, import_job.num_imported, import_job.total) == (
+            ImportJob.Status.SUCCEEDED, 4, 10, 10
+        )
+        assert import_job.is_finished
+        assert import_job.started_at <= import_job.finished_at
+        assert import_job.password == ''
+        assert poker_session.stories.count() == 10
+
+    def test_run_options(self, import_job, poker_session):
+        import_job.description_format = 'none'
+        import_job.upsert = True
+        import_job.run()
+        import_job.status = ImportJob.Status.PENDING
+        import_job.save()
+        import_job.run()
+        assert import_job.num_updated == 0
+        assert set(poker_session.stories.values_list('description', flat=True)) == {''}
+        assert poker_session.stories.count() == 10
+
+    def test_run_multiple_queries(self, import_job, poker_session):
+        import_job.jql_query = 'key in (FAKE-4, FAKE-5)\nkey in (FAKE-5, FAKE-2)\n'
+        import_job.run()
+        assert (import_job.num_imported, import_job.total) == (3, 3)
+        assert list(poker_session.stories.values_list('ticket_number', flat=True)) == ['FAKE-4', 'FAKE-5', 'FAKE-2']
+
+    @pytest.mark.parametrize('use_cache, password, expected_requests', (
+        (True, 'override', 1),
+        (False, 'override', 2),
+        # The pages fetched with other credentials are not shared.
+        (True, '', 2),
+    ))
+    def test_run_use_cache(self, fake_jira, import_job, use_cache, password, expected_requests):
+        import_job.use_cache = use_cache
+        import_job.run()
+        import_job.status = ImportJob.Status.PENDING
+        import_job.password = password
+        import_job.save()
+        import_job.run()
+        assert fake_jira.count_requests('GET', 'search') == expected_requests
+
+    @pytest.mark.parametrize('error, expected_error', (
+        (JIRAError(status_code=400, text='Error in the JQL Query'), 'Error in the JQL Query'),
+        (ValueError(), 'Encountered an unknown exception.'),
+    ))
+    def test_run_failed(self, import_job, error, expected_error):
+        with patch.object(JiraConnection, 'create_stories', side_effect=error):
+            import_job.run()
+        import_job.refresh_from_db()
+        assert (import_job.status, import_job.error, import_job.password) == (
+            ImportJob.Status.FAILED, expected_error, ''
+        )
+
+    def test_str(self, import_job):
+        assert str(import_job) == 'project = FAKE'
+
+    def test_run_claimed(self, import_job):
+        ImportJob.objects.filter(pk=import_job.pk).update(status=ImportJob.Status.RUNNING)
+        with patch.object(JiraConnection, 'create_stories') as mock_create_stories:
+            import_job.run()
+        mock_create_stories.assert_not_called()
+        assert import_job.status == ImportJob.Status.PENDING
+
+    @pytest.mark.parametrize('started_before, timeout, expected_status', (
+        (7200, 3600, ImportJob.Status.FAILED),
+        (60, 3600, ImportJob.Status.RUNNING),
+        (7200, 0, ImportJob.Status.RUNNING),
+    ))
+    @patch('planning_poker_jira.models.send_progress_event')
+    def test_fail_stale_jobs(self, mock_send_progress_event, import_job, settings, started_before, timeout,
+                             expected_status):
+        settings.JIRA_JOB_TIMEOUT = timeout
+        ImportJob.objects.filter(pk=import_job.pk).update(
+            status=ImportJob.Status.RUNNING, started_at=timezone.now() - timedelta(seconds=started_before)
+        )
+        stale_jobs = ImportJob.fail_stale_jobs()
+        import_job.refresh_from_db()
+        assert import_job.status == expected_status
+        if expected_status == ImportJob.Status.FAILED:
+            assert stale_jobs == [import_job]
+            assert (import_job.error, import_job.password) == ('The job did not finish within 3600 seconds.', '')
+            assert import_job.finished_at is not None
+            assert mock_send_progress_event.call_args[0][1] == 'finished'
+        else:
+            assert stale_jobs == []
+            assert import_job.password == 'override'
+
+    def test_fail_stale_jobs_finished_in_the_meantime(self, import_job):
+        ImportJob.objects.filter(pk=import_job.pk).update(
+            status=ImportJob.Status.RUNNING, started_at=timezone.now() - timedelta(days=1)
         )
+        now = timezone.now()
+        calls = []
+
+        def finish_job():
+            calls.append(now)
+            if len(calls) == 2:
+                # The worker finishes the job after it was selected as stale.
+                ImportJob.objects.filter(pk=import_job.pk).update(status=ImportJob.Status.SUCCEEDED)
+            return now
+
+        with patch('planning_poker_jira.models.timezone.now', side_effect=finish_job):
+            assert ImportJob.fail_stale_jobs() == []
+        import_job.refresh_from_db()
+        assert (import_job.status, import_job.error) == (ImportJob.Status.SUCCEEDED, '')
+
+    @patch('planning_poker_jira.models.send_progress_event')
+    def test_run_progress_events(self, mock_send_progress_event, import_job, settings):
+        settings.JIRA_PAGE_SIZE = 5
+        import_job.run()
+        group_name = 'planning_poker_jira.importjob.{}'.format(import_job.pk)
+        assert [(args[0], args[1], args[2]['num_imported']) for args, _ in
+                mock_send_progress_event.call_args_list] == [
+            (group_name, 'page_imported', 5), (group_name, 'page_imported', 10), (group_name, 'finished', 10)
+        ]
+        assert mock_send_progress_event.call_args[0][2]['status'] == 'succeeded'
+
+    @pytest.mark.parametrize('username, password, expected_credentials', (
+        ('', '', ('testuser', 'supersecret')),
+        ('other', '', ('other', 'supersecret')),
+        ('', 'override', ('testuser', 'override')),
+    ))
+    @patch('planning_poker_jira.models.JiraConnection._create_client')
+    def test_get_client(self, mock_create_client, fake_jira_connection, username, password, expected_credentials):
+        job = ImportJob(connection=fake_jira_connection, username=username, password=password)
+        with patch.object(JiraConnection, 'get_client', autospec=True) as mock_get_client:
+            job.get_client()
+        connection = mock_get_client.call_args[0][0]
+        assert (connection.username, connection.password) == expected_credentials
+
+
+class TestExportJob:
+    @pytest.fixture
+    def export_job(self, fake_jira_connection):
+        stories = [Story.objects.create(ticket_number=ticket_number, title='foo', story_points=story_points)
+                   for ticket_number, story_points in (('FAKE-1', 3), ('MISSING-1', 5), ('FAKE-2', 8))]
+        export_job = ExportJob.objects.create(connection=fake_jira_connection, num_stories=len(stories))
+        export_job.stories.set(stories)
+        return export_job
+
+    @patch('planning_poker_jira.models.send_progress_event')
+    def test_run(self, mock_send_progress_event, fake_jira, export_job):
+        export_job.run()
+        export_job.refresh_from_db()
+        assert (export_job.status, export_job.num_exported, export_job.num_failed) == (ExportJob.Status.SUCCEEDED, 2, 1)
+        failure = ('"MISSING-1: foo" could not be exported. The story does probably not exist inside "{}".'
+                   .format(fake_jira.url))
+        assert export_job.failures == failure
+        assert [fake_jira.issues[key]['customfield_10002'] for key in ('FAKE-1', 'FAKE-2')] == [3, 8]
+        events = [(args[1], args[2].get('story'), args[2].get('failure')) for args, _ in
+                  mock_send_progress_event.call_args_list]
+        assert events == [
+            ('story_exported', 'FAKE-1: foo', None),
+            ('story_exported', 'MISSING-1: foo', failure),
+            ('story_exported', 'FAKE-2: foo', None),
+            ('finished', None, None),
+        ]
+
+    def test_get_progress(self, export_job):
+        export_job.failures = 'foo\nbar'
+        assert 'failures' not in export_job.get_progress()
+        assert export_job.get_progress(include_details=True)['failures'] == ['foo', 'bar']
+
+    def test_str(self, export_job, fake_jira):
+        assert str(export_job) == fake_jira.url
+
+
+class TestBackgroundJob:
+    def test_perform(self):
+        with pytest.raises(NotImplementedError):
+            BackgroundJob.perform(Mock(), Mock())
+
+    def test_get_progress_elapsed(self, jira_connection):
+        job = ImportJob(connection=jira_connection, started_at=timezone.now() - timedelta(seconds=90),
+                        finished_at=timezone.now())
+        assert 89 < job.get_progress()['elapsed'] < 91
+
+
+@pytest.mark.parametrize('preview, expected_num_pages, expected_has_previous, expected_has_next', (
+    (IssuePreview(0, 1, 50, []), 1, False, False),
+    (IssuePreview(120, 1, 50, []), 3, False, True),
+    (IssuePreview(120, 2, 50, []), 3, True, True),
+    (IssuePreview(100, 2, 50, []), 2, True, False),
+))
+def test_issue_preview(preview, expected_num_pages, expected_has_previous, expected_has_next):
+    assert (preview.num_pages, preview.has_previous, preview.has_next) == (
+        expected_num_pages, expected_has_previous, expected_has_next
+    )
+
+
+class TestDeferredDescriptions:
+    @pytest.fixture
+    def lazy_stories(self, fake_jira_connection, poker_session):
+        fake_jira_connection.description_format = 'lazy'
+        fake_jira_connection.create_stories('project = FAKE', poker_session)
+        return poker_session.stories.all()
+
+    def test_import(self, fake_jira, lazy_stories):
+        assert set(lazy_stories.values_list('description', flat=True)) == {''}
+        assert DeferredDescription.objects.count() == 10
+
+    def test_load_descriptions(self, fake_jira, fake_jira_connection, lazy_stories, settings):
+        settings.JIRA_PAGE_SIZE = 4
+        num_searches = fake_jira.count_requests('GET', 'search')
+        stories = list(lazy_stories)
+        assert fake_jira_connection.load_descriptions(stories) == 10
+        # Three batches of at most four issues.
+        assert fake_jira.count_requests('GET', 'search') == num_searches + 3
+        assert stories[0].description.startswith('<p>Description of FAKE-1')
+        assert lazy_stories.get(ticket_number='FAKE-10').description.startswith('<p>Description of FAKE-10')
+        assert not DeferredDescription.objects.exists()
+
+    def test_load_descriptions_cached(self, fake_jira, fake_jira_connection, lazy_stories, poker_session):
+        fake_jira_connection.load_descriptions(lazy_stories[:2])
+        num_requests = len(fake_jira.requests)
+        other_session = PokerSession.objects.create(poker_date=poker_session.poker_date, name='other')
+        fake_jira_connection.create_stories('key in (FAKE-1, FAKE-2)', other_session)
+        assert fake_jira_connection.load_descriptions(other_session.stories.all()) == 2
+        # Only the import itself was sent to the jira backend.
+        assert len(fake_jira.requests) == num_requests + 1
+
+    def test_load_descriptions_cached_for_other_credentials(self, fake_jira, fake_jira_connection, lazy_stories):
+        fake_jira_connection.load_descriptions(lazy_stories[:2])
+        num_searches = fake_jira.count_requests('GET', 'search')
+        fake_jira_connection.password = 'otherpassword'
+        assert fake_jira_connection.load_descriptions(lazy_stories[:2]) == 2
+        assert fake_jira.count_requests('GET', 'search') == num_searches + 1
+
+    def test_load_descriptions_deleted_issue(self, fake_jira, fake_jira_connection, lazy_stories):
+        del fake_jira.issues['FAKE-1']
+        assert fake_jira_connection.load_descriptions(lazy_stories) == 9
+        assert lazy_stories.get(ticket_number='FAKE-1').description == ''
+        assert not DeferredDescription.objects.exists()
+
+    def test_load_deferred_descriptions(self, fake_jira, lazy_stories, stories):
+        stories = list(lazy_stories[:3]) + [Story.objects.get(ticket_number='FIAE-1')]
+        assert load_deferred_descriptions(stories) == 3
+        assert DeferredDescription.objects.count() == 7
+
+    @patch('planning_poker_jira.models.send_story_changed_event')
+    def test_active_story(self, mock_send_story_changed_event, fake_jira, lazy_stories, poker_session, settings):
+        settings.JIRA_DESCRIPTION_PREFETCH = 2
+        poker_session.active_story = lazy_stories.get(ticket_number='FAKE-4')
+        poker_session.save()
+        assert load_active_story_descriptions(poker_session.pk) == 3
+        assert list(lazy_stories.exclude(description='').values_list('ticket_number', flat=True)) == [
+            'FAKE-4', 'FAKE-5', 'FAKE-6'
+        ]
+        poker_session_id, active_story = mock_send_story_changed_event.call_args[0]
+        assert poker_session_id == poker_session.pk
+        assert active_story.description.startswith('<p>Description of FAKE-4')
+        num_requests = len(fake_jira.requests)
+        poker_session.active_story = lazy_stories.get(ticket_number='FAKE-5')
+        poker_session.save()
+        # Only FAKE-7 and FAKE-8 have to be loaded.
+        assert load_active_story_descriptions(poker_session.pk) == 2
+        assert len(fake_jira.requests) == num_requests + 1
+        assert DeferredDescription.objects.count() == 5
+        # The participants already got the description of FAKE-5.
+        mock_send_story_changed_event.assert_called_once()
+
+    @patch('planning_poker_jira.models.send_story_changed_event')
+    def test_active_story_changed_in_the_meantime(self, mock_send_story_changed_event, fake_jira, lazy_stories,
+                                                  poker_session):
+        poker_session.active_story = lazy_stories.first()
+        poker_session.save()
+
+        def load_descriptions(stories):
+            PokerSession.objects.filter(pk=poker_session.pk).update(active_story=lazy_stories.last())
+            return load_deferred_descriptions(stories)
+
+        with patch('planning_poker_jira.models.load_deferred_descriptions', side_effect=load_descriptions):
+            assert load_active_story_descriptions(poker_session.pk) == 6
+        mock_send_story_changed_event.assert_not_called()
+
+    def test_active_story_not_deferred(self, fake_jira, poker_session):
+        poker_session.active_story = Story.objects.create(ticket_number='FAKE-1', title='Summary of FAKE-1',
+                                                          poker_session=poker_session)
+        poker_session.save()
+        assert load_active_story_descriptions(poker_session.pk) == 0
+        poker_session.active_story = None
+        poker_session.save()
+        assert load_active_story_descriptions(poker_session.pk) == 0
+        assert load_active_story_descriptions(0) == 0
+        assert fake_jira.requests == []
+
+    def test_active_story_error(self, fake_jira, lazy_stories, poker_session, caplog):
+        fake_jira.error_every = 1
+        poker_session.active_story = lazy_stories.first()
+        poker_session.save()
+        assert load_active_story_descriptions(poker_session.pk) == 0
+        assert caplog.messages[-1] == 'Could not load the description of "FAKE-1: Summary of FAKE-1".'
+        assert DeferredDescription.objects.count() == 10
+
+    def test_upsert(self, fake_jira, fake_jira_connection, lazy_stories, poker_session):
+        fake_jira_connection.load_descriptions(lazy_stories)
+        fake_jira.update_issue('FAKE-1', summary='Changed summary', description='Changed description')
+        fake_jira_connection.create_stories('project = FAKE', poker_session, upsert=True)
+        assert list(DeferredDescription.objects.values_list('story__ticket_number', flat=True)) == ['FAKE-1']
+        fake_jira_connection.load_descriptions(lazy_stories)
+        assert lazy_stories.get(ticket_number='FAKE-1').description == '<p>Changed description</p>'
@@ -0,0 +1,31 @@
+from unittest.mock import patch
+
+import pytest
+
+from planning_poker.models import Story
+from planning_poker_jira import jobs
+from planning_poker_jira.models import DeferredDescription
+from planning_poker_jira.receivers import load_active_story_description
+
+
+class TestLoadActiveStoryDescription:
+    @pytest.fixture
+    def deferred_story(self, jira_connection, stories):
+        story = Story.objects.get(ticket_number='FIAE-1')
+        DeferredDescription.objects.create(story=story, connection=jira_connection)
+        return story
+
+    @patch('planning_poker_jira.receivers.get_description_executor')
+    @patch('planning_poker_jira.receivers.submit')
+    def test_submit(self, mock_submit, mock_get_description_executor, poker_session, deferred_story):
+        poker_session.active_story = deferred_story
+        poker_session.save()
+        mock_submit.assert_called_once_with(mock_get_description_executor.return_value, jobs.load_descriptions,
+                                            poker_session.pk)
+
+    @pytest.mark.parametrize('raw, active_story', ((True, 'FIAE-1'), (False, None), (False, 'FIAE-2')))
+    @patch('planning_poker_jira.receivers.submit')
+    def test_skipped(self, mock_submit, poker_session, deferred_story, raw, active_story):
+        poker_session.active_story = Story.objects.filter(ticket_number=active_story).first()
+        load_active_story_description(type(poker_session), poker_session, raw=raw)
+        mock_submit.assert_not_called()
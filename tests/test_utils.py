@@ -1,8 +1,18 @@
+import argparse
+import re
+import threading
+import time
+from unittest.mock import Mock, patch
+
 import pytest
 from jira import JIRAError
 from requests.exceptions import ConnectionError, RequestException
 
-from planning_poker_jira.utils import get_error_text
+from planning_poker.models import Story
+from planning_poker_jira.clients import CircuitBreakerOpen
+from planning_poker_jira.utils import (add_jql_condition, combine_jql_queries, format_jql_list, get_error_text,
+                                       map_concurrently, positive_int, send_progress_event, send_story_changed_event,
+                                       split_jql_queries)
 
 
 @pytest.mark.parametrize('error, context, expected_result', [
@@ -15,8 +25,135 @@ from planning_poker_jira.utils import get_error_text
     (ConnectionError(), {}, 'Failed to connect to server.'),
     (ConnectionError(), {'api_url': 'https://foo.bar'}, 'Failed to connect to server. '
                                                         'Is "https://foo.bar" the correct API URL?'),
+    (CircuitBreakerOpen('https://foo.bar', 12.3), {}, 'The Jira backend at "https://foo.bar" failed repeatedly and is '
+                                                      'considered to be unavailable. Try again in 13 seconds.'),
     (RequestException(), {}, 'There was an ambiguous error with your request. Check if all your data is correct.'),
     (Exception(), {}, 'Encountered an unknown exception.'),
 ])
 def test_get_error_text(error, context, expected_result):
     assert get_error_text(error, **context) == expected_result
+
+
+@pytest.mark.parametrize('query_string, expected_result', [
+    ('project = FOO', '(project = FOO) AND updated >= "-5m"'),
+    ('project = FOO OR key = BAR-1 order by rank', '(project = FOO OR key = BAR-1) AND updated >= "-5m" ORDER BY rank'),
+    ('ORDER BY created DESC', 'updated >= "-5m" ORDER BY created DESC'),
+])
+def test_add_jql_condition(query_string, expected_result):
+    assert add_jql_condition(query_string, 'updated >= "-5m"') == expected_result
+
+
+def test_format_jql_list():
+    assert format_jql_list(['FOO-1', 'FOO-2']) == '("FOO-1", "FOO-2")'
+
+
+def test_split_jql_queries():
+    assert split_jql_queries('project = FOO\r\n\n  component = Bar ORDER BY rank  \n ') == [
+        'project = FOO', 'component = Bar ORDER BY rank'
+    ]
+
+
+@pytest.mark.parametrize('queries, expected_result', [
+    (['project = FOO ORDER BY rank'], 'project = FOO ORDER BY rank'),
+    (['project = FOO ORDER BY rank', 'key = BAR-1 OR key = BAR-2'], '(project = FOO) OR (key = BAR-1 OR key = BAR-2)'),
+    (['project = FOO', 'ORDER BY created'], ''),
+])
+def test_combine_jql_queries(queries, expected_result):
+    assert combine_jql_queries(queries) == expected_result
+
+
+class TestMapConcurrently:
+    def test_order(self):
+        # The later items finish first.
+        results = map_concurrently(lambda item: time.sleep((5 - item) / 100) or item, range(5), 5)
+        assert list(results) == [0, 1, 2, 3, 4]
+
+    def test_bounded(self):
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def function(item):
+            with lock:
+                running.append(item)
+                max_running.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(item)
+            return item
+
+        assert list(map_concurrently(function, range(20), 3)) == list(range(20))
+        assert max(max_running) <= 3
+
+    def test_scheduled_ahead(self):
+        function = Mock(side_effect=lambda item: item)
+        results = map_concurrently(function, range(100), 2)
+        assert next(results) == 0
+        assert function.call_count <= 5
+        results.close()
+
+    def test_exception(self):
+        def function(item):
+            if item == 2:
+                raise ValueError()
+            return item
+
+        results = map_concurrently(function, range(10), 2)
+        assert [next(results), next(results)] == [0, 1]
+        with pytest.raises(ValueError):
+            next(results)
+
+
+class TestSendProgressEvent:
+    @patch('planning_poker_jira.utils.get_channel_layer')
+    def test_send(self, mock_get_channel_layer):
+        sent_messages = []
+
+        async def group_send(group_name, message):
+            sent_messages.append((group_name, message))
+
+        mock_get_channel_layer.return_value.group_send = group_send
+        send_progress_event('group', 'finished', {'foo': 'bar'})
+        assert sent_messages == [('group', {'type': 'job.progress', 'event': 'finished', 'data': {'foo': 'bar'}})]
+
+    @patch('planning_poker_jira.utils.get_channel_layer', Mock(return_value=None))
+    def test_no_channel_layer(self):
+        send_progress_event('group', 'finished', {})
+
+    @patch('planning_poker_jira.utils.get_channel_layer')
+    def test_error(self, mock_get_channel_layer, caplog):
+        async def group_send(group_name, message):
+            raise ConnectionError()
+
+        mock_get_channel_layer.return_value.group_send = group_send
+        send_progress_event('group', 'finished', {})
+        assert caplog.messages == ['Could not send the "finished" event to "group".']
+
+
+@pytest.mark.parametrize('value, expected', (('1', 1), ('42', 42)))
+def test_positive_int(value, expected):
+    assert positive_int(value) == expected
+
+
+@pytest.mark.parametrize('value', ('0', '-3', '1.5', 'many'))
+def test_positive_int_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError, match='^{} is not a positive integer.$'.format(re.escape(value))):
+        positive_int(value)
+
+
+@patch('planning_poker_jira.utils.get_channel_layer')
+def test_send_story_changed_event(mock_get_channel_layer, stories):
+    sent_messages = []
+
+    async def group_send(group_name, message):
+        sent_messages.append((group_name, message))
+
+    mock_get_channel_layer.return_value.group_send = group_send
+    story = Story.objects.get(ticket_number='FIAE-1')
+    send_story_changed_event(42, story)
+    assert sent_messages == [('poker_session_42', {
+        'type': 'send_json',
+        'event': 'story_changed',
+        'data': {'id': story.id, 'story_label': 'FIAE-1: Write tests', 'description': 'Tests need to be written.',
+                 'votes': {}},
+    })]
@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import json
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+
+from planning_poker.models import Story
+from planning_poker_jira.models import PendingIssueChange
+
+from .test_webhooks import issue_payload
+
+
+@pytest.fixture
+def webhook_connection(jira_connection, settings):
+    settings.JIRA_WEBHOOK_DELAY = 0
+    jira_connection.webhook_secret = 'secret'
+    jira_connection.save()
+    return jira_connection
+
+
+def post_webhook(client, connection, payload, **kwargs):
+    url = reverse('planning_poker_jira:webhook', args=[connection.pk])
+    return client.post(url, payload if isinstance(payload, str) else json.dumps(payload),
+                       content_type='application/json', **kwargs)
+
+
+class TestWebhookView:
+    def test_secret_parameter(self, client, webhook_connection, imported_stories):
+        response = post_webhook(client, webhook_connection, issue_payload('jira:issue_updated', 'FIAE-1', 'Changed'),
+                                QUERY_STRING='secret=secret')
+        assert response.status_code == 202
+        assert Story.objects.get(ticket_number='FIAE-1').title == 'Changed'
+
+    def test_signature(self, client, webhook_connection, imported_stories):
+        body = json.dumps(issue_payload('jira:issue_deleted', 'FIAE-1'))
+        signature = 'sha256=' + hmac.new(b'secret', body.encode(), hashlib.sha256).hexdigest()
+        response = post_webhook(client, webhook_connection, body, HTTP_X_HUB_SIGNATURE=signature)
+        assert response.status_code == 202
+        assert not PendingIssueChange.objects.exists()
+
+    def test_delay(self, client, webhook_connection, imported_stories, settings, django_capture_on_commit_callbacks):
+        settings.JIRA_WEBHOOK_DELAY = 60
+        with patch('planning_poker_jira.views.schedule_pending_issue_changes') as mock_schedule, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = post_webhook(client, webhook_connection,
+                                    issue_payload('jira:issue_updated', 'FIAE-1', 'Changed'),
+                                    QUERY_STRING='secret=secret')
+        assert response.status_code == 202
+        # The change is stored before the webhook is acknowledged.
+        assert PendingIssueChange.objects.get().issue_key == 'FIAE-1'
+        assert Story.objects.get(ticket_number='FIAE-1').title == 'Write tests'
+        mock_schedule.assert_called_once_with()
+
+    def test_ignored_event(self, client, webhook_connection):
+        response = post_webhook(client, webhook_connection, {'webhookEvent': 'jira:issue_created'},
+                                QUERY_STRING='secret=secret')
+        assert response.status_code == 204
+
+    @pytest.mark.parametrize('secret, kwargs', (
+        ('secret', {'QUERY_STRING': 'secret=wrong'}),
+        ('secret', {'HTTP_X_HUB_SIGNATURE': 'sha256=wrong'}),
+        ('secret', {}),
+        ('', {'QUERY_STRING': 'secret='}),
+        ('secret', {'QUERY_STRING': 'secret=%C3%BC'}),
+        ('secret', {'HTTP_X_HUB_SIGNATURE': 'sha256=\u00fc'}),
+        ('s\u00fc', {'QUERY_STRING': 'secret=secret'}),
+    ))
+    def test_forbidden(self, client, webhook_connection, secret, kwargs):
+        webhook_connection.webhook_secret = secret
+        webhook_connection.save()
+        response = post_webhook(client, webhook_connection, issue_payload('jira:issue_updated', 'FIAE-1'), **kwargs)
+        assert response.status_code == 403
+
+    @pytest.mark.parametrize('body', ('{', '[]', '{"webhookEvent": "jira:issue_updated", "issue": ["x"]}'))
+    def test_bad_request(self, client, webhook_connection, body):
+        response = post_webhook(client, webhook_connection, body, QUERY_STRING='secret=secret')
+        assert response.status_code == 400
+
+    def test_non_ascii_secret(self, client, webhook_connection, imported_stories):
+        webhook_connection.webhook_secret = 's\u00fc'
+        webhook_connection.save()
+        response = post_webhook(client, webhook_connection, issue_payload('jira:issue_updated', 'FIAE-1', 'Changed'),
+                                QUERY_STRING='secret=s%C3%BC')
+        assert response.status_code == 202
+
+    def test_not_found(self, client, db):
+        response = client.post(reverse('planning_poker_jira:webhook', args=[0]), '{}', content_type='application/json')
+        assert response.status_code == 404
+
+    def test_get_not_allowed(self, client, webhook_connection):
+        response = client.get(reverse('planning_poker_jira:webhook', args=[webhook_connection.pk]))
+        assert response.status_code == 405
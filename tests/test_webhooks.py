@@ -0,0 +1,131 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from planning_poker.models import Story
+from planning_poker_jira import webhooks
+from planning_poker_jira.models import JiraConnection, PendingIssueChange
+from planning_poker_jira.webhooks import (ISSUE_DELETED, ISSUE_UPDATED, apply_pending_issue_changes,
+                                          schedule_pending_issue_changes, store_issue_change)
+
+
+def issue_payload(event, key, summary='Write tests', timestamp=1, changed_fields=()):
+    return {
+        'timestamp': timestamp,
+        'webhookEvent': event,
+        'issue': {'key': key, 'fields': {'summary': summary, 'description': 'Tests need to be written.'}},
+        'changelog': {'items': [{'field': field} for field in changed_fields]},
+    }
+
+
+@pytest.fixture
+def timer():
+    yield
+    if webhooks._timer is not None:
+        webhooks._timer.cancel()
+        webhooks._timer = None
+
+
+class TestStoreIssueChange:
+    def test_coalesce(self, jira_connection):
+        assert store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'First', timestamp=1,
+                                                                 changed_fields=['description']))
+        assert store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Third', timestamp=3))
+        # Arrived late, so it is superseded by the third change.
+        assert store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Second', timestamp=2))
+        assert store_issue_change(jira_connection, issue_payload(ISSUE_DELETED, 'FIAE-2'))
+        changes = {change.issue_key: change for change in PendingIssueChange.objects.all()}
+        assert len(changes) == 2
+        assert (changes['FIAE-1'].event, changes['FIAE-1'].get_issue()['fields']['summary'],
+                changes['FIAE-1'].timestamp, changes['FIAE-1'].description_changed) == (ISSUE_UPDATED, 'Third', 3, True)
+        assert (changes['FIAE-2'].event, changes['FIAE-2'].description_changed) == (ISSUE_DELETED, False)
+
+    @pytest.mark.parametrize('payload', (
+        {'webhookEvent': 'jira:issue_created', 'issue': {'key': 'FIAE-1'}},
+        {'webhookEvent': ISSUE_UPDATED},
+        {},
+    ))
+    def test_ignored(self, jira_connection, payload):
+        assert not store_issue_change(jira_connection, payload)
+        assert not PendingIssueChange.objects.exists()
+
+    @pytest.mark.parametrize('payload', (
+        {'webhookEvent': ISSUE_UPDATED, 'issue': ['FIAE-1']},
+        {'webhookEvent': ISSUE_UPDATED, 'issue': {'key': ['FIAE-1']}},
+        {'webhookEvent': ISSUE_UPDATED, 'issue': {'key': 'FIAE-{}'.format('1' * 200)}},
+        {'webhookEvent': ISSUE_UPDATED, 'issue': {'key': 'FIAE-1'}, 'timestamp': '1'},
+        {'webhookEvent': ISSUE_UPDATED, 'issue': {'key': 'FIAE-1'}, 'changelog': ['description']},
+        {'webhookEvent': ISSUE_UPDATED, 'issue': {'key': 'FIAE-1'}, 'changelog': {'items': ['description']}},
+    ))
+    def test_malformed(self, jira_connection, payload):
+        with pytest.raises(ValueError, match='^The payload of the "jira:issue_updated" webhook is malformed.$'):
+            store_issue_change(jira_connection, payload)
+        assert not PendingIssueChange.objects.exists()
+
+
+class TestApplyPendingIssueChanges:
+    def test_apply(self, jira_connection, imported_stories):
+        store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Write better tests',
+                                                          changed_fields=['description']))
+        store_issue_change(jira_connection, issue_payload(ISSUE_DELETED, 'FIAE-2'))
+        with patch.object(JiraConnection, 'apply_issue_changes', return_value=(1, 1)) as mock_apply_issue_changes:
+            assert apply_pending_issue_changes() == (1, 1)
+        updated_issues, deleted_keys, changed_description_keys = mock_apply_issue_changes.call_args[0]
+        assert [issue['fields']['summary'] for issue in updated_issues] == ['Write better tests']
+        assert (deleted_keys, changed_description_keys) == (['FIAE-2'], {'FIAE-1'})
+        assert not PendingIssueChange.objects.exists()
+
+    def test_apply_connections(self, jira_connection, imported_stories):
+        other_connection = JiraConnection.objects.create(api_url='https://other.example.com')
+        store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Write better tests'))
+        store_issue_change(other_connection, issue_payload(ISSUE_UPDATED, 'FIAE-2', 'Changed'))
+        assert apply_pending_issue_changes([jira_connection.pk]) == (1, 0)
+        assert list(Story.objects.values_list('title', flat=True)) == ['Write better tests', 'Write more tests']
+        assert list(PendingIssueChange.objects.values_list('connection', flat=True)) == [other_connection.pk]
+
+    def test_keep_changes_stored_in_the_meantime(self, jira_connection, imported_stories):
+        store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'First', timestamp=1))
+
+        def apply_issue_changes(*args):
+            store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1', 'Second', timestamp=2))
+            return 1, 0
+
+        with patch.object(JiraConnection, 'apply_issue_changes', side_effect=apply_issue_changes):
+            apply_pending_issue_changes()
+        assert PendingIssueChange.objects.get().get_issue()['fields']['summary'] == 'Second'
+
+    def test_error(self, jira_connection, caplog):
+        store_issue_change(jira_connection, issue_payload(ISSUE_UPDATED, 'FIAE-1'))
+        with patch.object(JiraConnection, 'apply_issue_changes', side_effect=ValueError()):
+            assert apply_pending_issue_changes() == (0, 0)
+        assert caplog.messages == [
+            'Could not apply the issue changes reported by the webhooks of "{}".'.format(jira_connection)
+        ]
+        # The change is retried the next time.
+        assert PendingIssueChange.objects.exists()
+
+
+class TestSchedulePendingIssueChanges:
+    def test_schedule(self, timer, settings):
+        settings.JIRA_WEBHOOK_DELAY = 0.01
+        mock_executor = Mock()
+        with patch('planning_poker_jira.webhooks.get_executor', return_value=mock_executor):
+            schedule_pending_issue_changes()
+            scheduled_timer = webhooks._timer
+            schedule_pending_issue_changes()
+            assert webhooks._timer is scheduled_timer
+            scheduled_timer.join(1)
+        mock_executor.submit.assert_called_once_with(webhooks._run_pending_issue_changes)
+        assert webhooks._timer is None
+
+    def test_without_executor(self, timer):
+        with patch('planning_poker_jira.webhooks.get_executor', return_value=None):
+            schedule_pending_issue_changes()
+        assert webhooks._timer is None
+
+    @patch('planning_poker_jira.webhooks.connection')
+    @patch('planning_poker_jira.webhooks.apply_pending_issue_changes')
+    def test_run(self, mock_apply_pending_issue_changes, mock_connection):
+        webhooks._run_pending_issue_changes()
+        mock_apply_pending_issue_changes.assert_called_once_with()
+        mock_connection.close.assert_called_once_with()